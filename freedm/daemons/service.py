@@ -229,9 +229,8 @@ class DaemonService(Service):
                     # Update state
                     state = current_state
                     try:
-                        # Check if connection is still alive and sleep
-                        session.poll()
-                        time.sleep(2)
+                        # Wait for incoming requests (instead of polling and sleeping) which also detects a closed connection
+                        session.poll(timeout=2)
                     except EOFError:
                         break
                 else:
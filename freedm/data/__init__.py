@@ -9,4 +9,6 @@ from freedm.data.store import DataStore
 from freedm.data.object import DataObject
 from freedm.data.inifile import IniFileStore
 from freedm.data.memory import MemoryStore
-from freedm.data.sql import SQLStore
\ No newline at end of file
+from freedm.data.sql import SQLStore
+from freedm.data.log import LogStore
+from freedm.data.query import Query
\ No newline at end of file
@@ -0,0 +1,141 @@
+'''
+This module defines a read-through cache for the raw values which data stores read from their backends
+@author: Thomas Wanderer
+'''
+
+# Imports
+import time
+import threading
+from collections import OrderedDict
+from typing import Iterable, Tuple, Any
+
+# free.dm Imports
+from freedm.data.token import compileToken, splitToken, INDEX, COLLECTION, WILDCARD
+
+
+class ValueCache(object):
+    '''
+    A cache of raw backend values by token with a time-to-live, a maximal number of entries (evicting
+    the least recently used entry) and negative caching of tokens not found in the backend (cached as ``None``).
+    Changing a token invalidates conservatively all cached tokens whose values might contain it:
+    - the token itself, its parent tokens and its sub tokens
+    - tokens of the same domain addressing several items ("[]" or "+" keys)
+    - tokens of the same domain not starting with an item ID if the token starts with one (e.g. the column
+      token "users.name" of SQL stores if "users.45.name" changed)
+    Values read from the backend while the cache was invalidated are not cached (See py:attr::generation).
+    Domain names are not case-sensitive, so tokens are cached by their domain in lower case.
+    '''
+
+    def __init__(self, ttl: float=60.0, size: int=1024, negative: bool=True):
+        '''
+        :param float ttl: The number of seconds a value is cached
+        :param int size: The maximal number of cached values
+        :param bool negative: ``True`` if missing values should be cached as well
+        '''
+        self.ttl        = ttl
+        self.size       = size
+        self.negative   = negative
+        self.stats      = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.__entries: OrderedDict = OrderedDict()
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {len(self.__entries)}/{self.size} values>'
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def generation(self) -> int:
+        '''The number of invalidations (Take it before reading a value from the backend and pass it to py:function::put)'''
+        return self.__generation
+
+    @staticmethod
+    def __normalize(token: str) -> str:
+        '''
+        Returns a token with its domain in lower case
+        '''
+        domain, key = splitToken(token)
+        return f'{domain.lower()}.{key}' if key else domain.lower()
+
+    def __contains__(self, token: str) -> bool:
+        '''
+        Checks if a token is cached (Without counting a hit or miss)
+        '''
+        entry = self.__entries.get(self.__normalize(token))
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def get(self, token: str) -> Tuple[bool, Any]:
+        '''
+        Looks up a cached value
+        :param str token: The token
+        :returns: ``True`` and the value if cached (``None`` for a missing value), else ``False`` and ``None``
+        :rtype: tuple
+        '''
+        token = self.__normalize(token)
+        with self.__lock:
+            entry = self.__entries.get(token)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.__entries[token]
+                self.stats['misses'] += 1
+                return False, None
+            self.__entries.move_to_end(token)
+            self.stats['hits'] += 1
+            return True, entry[1]
+
+    def put(self, token: str, value: Any, generation: int=None) -> None:
+        '''
+        Caches a value
+        :param str token: The token
+        :param object value: The value (``None`` if the token is missing in the backend)
+        :param int generation: The generation the value was read at (The value is outdated if invalidated meanwhile)
+        '''
+        if value is None and not self.negative:
+            return
+        token = self.__normalize(token)
+        with self.__lock:
+            if generation is not None and generation != self.__generation:
+                return
+            self.__entries[token] = (time.monotonic() + self.ttl, value)
+            self.__entries.move_to_end(token)
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, token: str=None) -> None:
+        '''
+        Removes the cached values affected by the change of a token
+        :param str token: The changed token (A domain name invalidates the whole domain, by default all values are removed)
+        '''
+        with self.__lock:
+            self.__generation += 1
+            if token is None:
+                self.__entries.clear()
+                return
+            domain, key = splitToken(self.__normalize(token))
+            indexed = key != '' and compileToken(key)[0].kind == INDEX
+            for cached in list(self.__entries):
+                cached_domain, cached_key = splitToken(cached)
+                if cached_domain != domain:
+                    continue
+                if (
+                    key == ''
+                    or cached_key == ''
+                    or cached_key == key
+                    or cached_key.startswith(f'{key}.')
+                    or key.startswith(f'{cached_key}.')
+                    or any(step.kind in (COLLECTION, WILDCARD) for step in compileToken(cached_key))
+                    or (indexed and compileToken(cached_key)[0].kind != INDEX)
+                    ):
+                    del self.__entries[cached]
+
+    def invalidateMany(self, tokens: Iterable[str]) -> None:
+        '''
+        Removes the cached values affected by the change of several tokens
+        :param list tokens: The changed tokens
+        '''
+        for token in tokens:
+            self.invalidate(token)
@@ -0,0 +1,138 @@
+'''
+This module defines the change log tracking the changed key tokens of a data object
+@author: Thomas Wanderer
+'''
+
+# Imports
+import threading
+from typing import Iterator, Iterable, List, Dict, Any
+
+
+class ChangeLog(object):
+    '''
+    A set of changed key tokens kept in a trie of their keys. Tokens are recorded only once and the
+    log reduces them to the minimal set of tokens covering all changes (e.g. "user" covers "user.1.name",
+    while "user.1" does not cover "user.10"). Tokens addressing all elements of a collection ("[]")
+    or all sub data-structures ("+") are recorded as change of the collection itself.
+    The log is thread-safe, so it can be reduced and reset atomically while other threads record changes.
+    '''
+
+    # Marks a trie node as changed token
+    _END = None
+
+    def __init__(self, tokens: Iterable[str]=()):
+        '''
+        :param list tokens: The initially changed tokens
+        '''
+        self.__lock = threading.Lock()
+        self.__tokens: Dict[str, None] = {}
+        self.__trie: Dict[Any, Any] = {}
+        self.extend(tokens)
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {len(self.__tokens)} tokens>'
+
+    def __len__(self) -> int:
+        return len(self.__tokens)
+
+    def __bool__(self) -> bool:
+        return len(self.__tokens) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        with self.__lock:
+            return iter(list(self.__tokens))
+
+    def __contains__(self, token: str) -> bool:
+        return self.__normalize(token) in self.__tokens
+
+    @staticmethod
+    def __normalize(token: str) -> str:
+        '''
+        Truncates a token at its first collection ("[]") or wildcard ("+") key
+        '''
+        if '[]' in token or '+' in token:
+            keys = []
+            for key in token.split('.'):
+                if key in ('[]', '+'):
+                    break
+                keys.append(key)
+            return '.'.join(keys)
+        return token
+
+    def add(self, token: str) -> None:
+        '''
+        Records a changed token (only once)
+        :param str token: The key token
+        '''
+        token = self.__normalize(token)
+        with self.__lock:
+            if token in self.__tokens:
+                return
+            self.__tokens[token] = None
+            node = self.__trie
+            if token != '':
+                for key in token.split('.'):
+                    node = node.setdefault(key, {})
+            node[self._END] = True
+
+    def extend(self, tokens: Iterable[str]) -> None:
+        '''
+        Records several changed tokens
+        :param list tokens: The key tokens
+        '''
+        for token in tokens:
+            self.add(token)
+
+    def discard(self, token: str) -> None:
+        '''
+        Removes a token (e.g. after its value has been synced). Changes of its sub tokens stay recorded.
+        :param str token: The key token
+        '''
+        token = self.__normalize(token)
+        with self.__lock:
+            if token not in self.__tokens:
+                return
+            del self.__tokens[token]
+            # Unmark the token's node and prune the branch if no other token uses it
+            path = [self.__trie]
+            keys = token.split('.') if token != '' else []
+            for key in keys:
+                path.append(path[-1][key])
+            path[-1].pop(self._END, None)
+            for index in range(len(keys), 0, -1):
+                if path[index]:
+                    break
+                del path[index - 1][keys[index - 1]]
+
+    def clear(self) -> None:
+        '''
+        Removes all tokens
+        '''
+        with self.__lock:
+            self.__tokens.clear()
+            self.__trie.clear()
+
+    def reduce(self, reset: bool=False) -> List[str]:
+        '''
+        Returns the sorted minimal list of tokens covering all changes. A change of the whole data is
+        returned as the empty token.
+        :param bool reset: If set to ``True``, then the log will be reset (emptied) at once
+        :returns: The covering tokens
+        :rtype: list
+        '''
+        with self.__lock:
+            reduced = []
+            stack = [('', self.__trie)]
+            while stack:
+                token, node = stack.pop()
+                if self._END in node:
+                    reduced.append(token)
+                    continue
+                for key, child in node.items():
+                    stack.append((f'{token}.{key}' if token else key, child))
+            if reset:
+                self.__tokens.clear()
+                self.__trie.clear()
+        reduced.sort()
+        return reduced
@@ -0,0 +1,174 @@
+'''
+This module defines secondary indexes over the collections of a data object
+@author: Thomas Wanderer
+'''
+
+# Imports
+import bisect
+import threading
+from numbers import Number
+from typing import Optional, Tuple, List, Dict, Set, Any
+
+
+class Index(object):
+    '''
+    A secondary index of the items of a collection (A dictionary or list of items, e.g. "user.active")
+    by the value of one of their keys (e.g. "name"). The index maps each value to the keys of the items
+    having this value and keeps the values sorted, so items are found by value in O(1) and by a range of
+    values in O(log n) instead of scanning the collection. Only string, numeric and boolean values are indexed.
+    The index gets updated incrementally by the data object whenever one of its items changes.
+    '''
+
+    def __init__(self, collection: str, field: str):
+        '''
+        :param str collection: The key token of the collection ("[]" keys addressing all items are ignored)
+        :param str field: The key token of the indexed value within each item
+        '''
+        self.collection = '.'.join(key for key in collection.split('.') if key != '[]')
+        self.field      = field
+        self.__items: Dict[str, Tuple[int, Any]] = {}
+        self.__values: Dict[Tuple[int, Any], Set[str]] = {}
+        self.__sorted: List[Tuple[int, Any]] = []
+        self.__lock = threading.RLock()
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.collection} by {self.field} ({len(self.__items)} items)>'
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    @staticmethod
+    def getSortKey(value: Any) -> Optional[Tuple[int, Any]]:
+        '''
+        Returns the sort key of a value (Booleans are ordered before numbers and numbers before strings) or ``None``
+        if the value cannot be indexed (Booleans are no numbers here, so ``True`` and ``1`` are different values)
+        '''
+        if isinstance(value, bool):
+            return (0, value)
+        elif isinstance(value, Number) and not isinstance(value, complex):
+            return (1, value)
+        elif isinstance(value, str):
+            return (2, value)
+        return None
+
+    def __getItems(self, data: Any) -> Dict[str, Any]:
+        '''
+        Returns the items of the collection by their keys
+        '''
+        try:
+            collection = data.getValue(self.collection)
+        except LookupError:
+            return {}
+        if isinstance(collection, dict):
+            return {str(key): item for key, item in collection.items()}
+        elif isinstance(collection, list):
+            return {str(key): item for key, item in enumerate(collection)}
+        return {}
+
+    def __getValue(self, item: Any) -> Optional[Tuple[int, Any]]:
+        '''
+        Returns the sort key of the indexed value of an item
+        '''
+        try:
+            for key in self.field.split('.'):
+                item = item[int(key)] if isinstance(item, list) else item[key]
+        except (LookupError, TypeError, ValueError):
+            return None
+        return self.getSortKey(item)
+
+    def __add(self, key: str, value: Tuple[int, Any]) -> None:
+        self.__items[key] = value
+        keys = self.__values.get(value)
+        if keys is None:
+            keys = self.__values[value] = set()
+            bisect.insort(self.__sorted, value)
+        keys.add(key)
+
+    def __remove(self, key: str) -> None:
+        value = self.__items.pop(key, None)
+        if value is None:
+            return
+        keys = self.__values[value]
+        keys.discard(key)
+        if not keys:
+            del self.__values[value]
+            del self.__sorted[bisect.bisect_left(self.__sorted, value)]
+
+    def build(self, data: Any) -> None:
+        '''
+        Indexes all items of the collection
+        :param py:class::freedm.data.objects.DataObject data: The data object
+        '''
+        with self.__lock:
+            self.__items.clear()
+            self.__values.clear()
+            self.__sorted.clear()
+            for key, item in self.__getItems(data).items():
+                value = self.__getValue(item)
+                if value is not None:
+                    self.__add(key, value)
+
+    def refresh(self, data: Any, token: Optional[str]) -> None:
+        '''
+        Updates the index after a value of the data object changed
+        :param py:class::freedm.data.objects.DataObject data: The data object
+        :param str token: The changed key token (``None`` if the whole data changed)
+        '''
+        # The whole collection might have changed
+        if token is None or token == '' or token == self.collection or self.collection.startswith(f'{token}.'):
+            self.build(data)
+        # An item of the collection changed
+        elif token.startswith(f'{self.collection}.'):
+            key = token[len(self.collection) + 1:].split('.', 1)[0]
+            with self.__lock:
+                self.__remove(key)
+                try:
+                    item = data.getValue(f'{self.collection}.{key}')
+                except LookupError:
+                    return
+                value = self.__getValue(item)
+                if value is not None:
+                    self.__add(key, value)
+
+    def find(self, value: Any) -> List[str]:
+        '''
+        Returns the tokens of the items having a value
+        :param value: The value
+        :returns: The item tokens
+        :rtype: list
+        '''
+        sortkey = self.getSortKey(value)
+        with self.__lock:
+            keys = sorted(self.__values.get(sortkey, ())) if sortkey is not None else []
+        return [f'{self.collection}.{key}' for key in keys]
+
+    def range(self, low: Any=None, high: Any=None, inclusive: bool=True) -> List[str]:
+        '''
+        Returns the tokens of the items whose value lies within a range, ordered by value. If only one bound
+        is provided, the range is limited to the values of its type (e.g. only numbers if the bound is a number).
+        :param low: The lower bound (By default the lowest value of the upper bound's type)
+        :param high: The upper bound (By default the highest value of the lower bound's type)
+        :param bool inclusive: ``True`` if items with a value equal to the upper bound should be included
+        :returns: The item tokens
+        :rtype: list
+        '''
+        lower = self.getSortKey(low) if low is not None else None
+        upper = self.getSortKey(high) if high is not None else None
+        # Values which cannot be indexed do not bound any indexed value
+        if (low is not None and lower is None) or (high is not None and upper is None):
+            return []
+        with self.__lock:
+            # A single bound limits the range to the values of its type
+            if lower is None:
+                start = bisect.bisect_left(self.__sorted, (upper[0],)) if upper is not None else 0
+            else:
+                start = bisect.bisect_left(self.__sorted, lower)
+            if upper is None:
+                end = bisect.bisect_left(self.__sorted, (lower[0] + 1,)) if lower is not None else len(self.__sorted)
+            elif inclusive:
+                end = bisect.bisect_right(self.__sorted, upper)
+            else:
+                end = bisect.bisect_left(self.__sorted, upper)
+            keys = [key for value in self.__sorted[start:end] for key in sorted(self.__values[value])]
+        return [f'{self.collection}.{key}' for key in keys]
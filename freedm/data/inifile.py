@@ -6,16 +6,22 @@ This module provides a DataStore based on INI-files
 # Imports
 import os
 import json
+import hashlib
+import tempfile
+import threading
 from configparser import SafeConfigParser
+from collections import Counter
 from pathlib import Path
-from typing import Union, Any, Type
+from typing import Optional, Union, Tuple, List, Dict, Any, Type
 
 # free.dm Imports
+from freedm import models
 from freedm.data.store import DataStore
 from freedm.data.object import DataObject
+from freedm.data.snapshot import writeSnapshot, readSnapshot
 from freedm.utils.filesystem import FilesystemObserver
 from freedm.utils.types import TypeChecker as checker
-from freedm.utils.aio import runConcurrently
+from freedm.utils.aio import run_concurrently
 
 
 class IniFileStore(DataStore):
@@ -35,6 +41,34 @@ class IniFileStore(DataStore):
     _default_name: str = 'Config'
     _default_filetype: str = 'ini'
     description: str = 'A persistent INI file store'
+    
+    # The signatures (modification time, size and content hash) of the loaded INI files by domain
+    __signatures: Dict[str, Tuple[int, int, str]] = None
+    
+    # Lazy loading: The INI files are only indexed on startup and parsed on first access (or by "warmup")
+    _lazy: bool = False
+    __index: Dict[str, Tuple[int, int]] = None
+    __history: Counter = None
+    __writing: threading.Lock = None
+    
+    # Snapshots: The parsed data of each INI file is kept as binary snapshot, which is used instead of parsing the unchanged file
+    _snapshot: bool = False
+    
+    # Init
+    def __init__(self, *args, lazy: bool=None, snapshot: bool=None, **kwargs):
+        '''
+        :param bool lazy: ``True`` if the INI files should be loaded on first access instead of on startup
+        :param bool snapshot: ``True`` if unchanged INI files should be loaded from snapshots (Deserialized on access)
+        '''
+        # The loading mode must be known before the path gets set
+        if isinstance(lazy, bool):
+            self._lazy = lazy
+        if isinstance(snapshot, bool):
+            self._snapshot = snapshot
+        self.__index = {}
+        self.__history = Counter()
+        self.__writing = threading.Lock()
+        super().__init__(*args, **kwargs)
                 
     @DataStore.path.setter
     def path(self, path: Union[str, Path]):
@@ -48,16 +82,43 @@ class IniFileStore(DataStore):
             # Then load all file backends
             self.__loadFiles()
             
-    # Private method to load all backend files
+    # Private method to index and load all backend files
     def __loadFiles(self) -> None:
-        # Gather INI files to load
+        # Index the INI files (size and modification time)
         files = []
-        for file in os.listdir(self.path):
-            if file.endswith(f'.{self.filetype}'):
-                files.append(str(os.path.splitext(file)[0]))
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(f'.{self.filetype}') and entry.is_file():
+                domain = str(os.path.splitext(entry.name)[0])
+                stat = entry.stat()
+                self.__index[domain.lower()] = (stat.st_size, stat.st_mtime_ns)
+                files.append(domain)
         
-        # Load INI files concurrently
-        runConcurrently(self.loadDomain, files)
+        # Load INI files concurrently (unless they are loaded on first access)
+        if not self._lazy:
+            run_concurrently(self.loadDomain, files, executor=self.executor)
+    
+    def getIndexedDomains(self) -> Dict[str, Tuple[int, int]]:
+        '''
+        Returns the domains of all INI files found in the store's path, also those not yet loaded
+        :returns: The size and modification time of each domain's INI file
+        :rtype: dict
+        '''
+        return dict(self.__index)
+    
+    def warmup(self, domains: List[str]=None) -> List[str]:
+        '''
+        Preloads domains which are not yet loaded (e.g. in lazy mode after startup) concurrently in the store's 
+        executor (At most "_sync_max_threads" files at once). By default all indexed domains get loaded, the 
+        domains accessed most often first, then the most recently modified domains.
+        :param list domains: The domains to load in this order (By default all indexed domains)
+        :returns: The loaded domains
+        :rtype: list
+        '''
+        if domains is None:
+            domains = sorted(self.__index, key=lambda domain: (-self.__history[domain], -self.__index[domain][1]))
+        domains = [domain.lower() for domain in domains if domain.lower() not in self._data]
+        run_concurrently(self.loadDomain, domains, executor=self.executor)
+        return [domain for domain in domains if domain in self._data]
         
     # Private method to setup path observer
     def __observeFiles(self) -> None:
@@ -65,9 +126,8 @@ class IniFileStore(DataStore):
             # Create a subclass implementing the FilesystemObserver's abstract event methods
             class Observer(FilesystemObserver):
                 def onFileModified(self, event, store=self):
-                    # Update domain data object
-                    store.loadDomain(str(os.path.splitext(os.path.basename(event.src_path))[0]))
-                    print('STORE DATA =', store._data)
+                    # Update the changed values of the domain data object
+                    store.reloadDomain(str(os.path.splitext(os.path.basename(event.src_path))[0]))
                     
                 def onFileCreated(self, event, store=self):
                     # As "onFileModified" is fired thereafter we do nothing here
@@ -75,21 +135,26 @@ class IniFileStore(DataStore):
                     
                 def onFileDeleted(self, event, store=self):
                     # Unload domain data object
-                    store.unloadDomain(str(os.path.splitext(os.path.basename(event.src_path))[0]))
-                    print('STORE DATA =', store._data)
+                    domain = str(os.path.splitext(os.path.basename(event.src_path))[0])
+                    store.unloadDomain(domain)
+                    # Remove the domain from the index
+                    if store._lazy:
+                        store.reloadDomain(domain)
                     
                 def onFileMoved(self, event, store=self):
                     # Get domain names from files
                     src, src_type = os.path.splitext(os.path.basename(event.src_path))
                     dest, dest_type = os.path.splitext(os.path.basename(event.dest_path))
                     
-                    # Unload old domain data object
+                    # Unload old domain data object (and remove it from the index)
                     if src_type.endswith(store.filetype) and src != dest:
                         store.unloadDomain(str(src))
-                    # Load new ddomain data object
+                        if store._lazy:
+                            store.reloadDomain(str(src))
+                    # Reload the new domain data object like a modified file (So the store's own writes, which
+                    # atomically replace the file, are recognized by their signature and lazy stores only index it)
                     if dest_type.endswith(store.filetype):
-                        store.loadDomain(str(dest))
-                    print('STORE DATA =', store._data)
+                        store.reloadDomain(str(dest))
             
             # Set the observer as handle and start
             if self._iohandle is None and self.path is not None:
@@ -111,77 +176,302 @@ class IniFileStore(DataStore):
                 raise e
             
     # Implement data setters & getter
-    def _setRaw(self, domain: Type[DataObject], token: str, value: Any) -> None:
-        # TODO: Implement sill
-#         if self.synced and self._iohandle:
-#             with self._iohandle._watchdog.interruptObserver():
-#                 with open(os.path.join(self.path, domain), 'w') as f:
-                    pass
-                    #f.write('TODO: INIFILE DATA')
+    def _setRaw(self, domain: Type[DataObject], token: str, value: Any) -> bool:
+        # The INI file is written as a whole
+        return self._setRawBatch(domain, {token: value})
+    
+    def _setRawBatch(self, domain: Type[DataObject], values: Dict[str, Any]) -> bool:
+        # Write all values with one file write. The file then represents all changes of the data object
+        self._syncDomain(domain, self.path)
+        return True
     
     def _getRaw(self, domain: Type[DataObject], token: str) -> Any:
-        print('## GETTNG R-A-W !!!', token)
+        # INI files are loaded as a whole, so there are no raw values apart from the data object
+        self.logger.debug(f'No raw value "{token}" in INI file of store "{self}"')
     
     # Implement domain loading and unloading
     def _loadDomain(self, domain: str, path: str) -> None:
+        # Read the INI file
+        inifile, content, signature = self.__readFile(domain, path)
+        
+        # Create data object (From the snapshot of the file's content if available)
+        data = None
+        if self._snapshot and signature:
+            data = readSnapshot(self.__getSnapshotFile(inifile), source=signature[2], backend=str(inifile))
+        if data is None:
+            data = DataObject(backend=str(inifile), **self.__parseFile(inifile, content))
+            if self._snapshot and signature:
+                self.__writeSnapshot(inifile, data, signature[2])
+        self.__getSignatures()[domain] = signature
+        if signature:
+            self.__index[domain] = (signature[1], signature[0])
+        self.__history[domain] += 1
+        return data
+    
+    def reloadDomain(self, domain: str) -> Optional[List[str]]:
+        '''
+        Reloads the INI file of a domain after it changed (e.g. when the file observer reported a modification) and updates
+        only the changed values of the domain data object. The file is only read if its modification time or size changed
+        and it is only parsed if its content changed, so repeated modification events of one change are cheap.
+        :param str domain: The data domain
+        :returns: The tokens of the changed values (``None`` if the file could not be reloaded)
+        :rtype: list
+        '''
         try:
-            # Check that we have a FS path for the INI file
-            if not path: raise UserWarning(f'No INI file location provided!')
+            domain = domain.lower()
             
-            # The backend file
-            inifile = path.joinpath(f'{domain}.{self.filetype}')
+            # Load domains which are not yet loaded entirely (In lazy mode just update their index)
+            dataobject = self._data.get(domain)
+            if not isinstance(dataobject, DataObject) and self._lazy:
+                try:
+                    stat = os.stat(Path(self.path).joinpath(f'{domain}.{self.filetype}'))
+                    self.__index[domain] = (stat.st_size, stat.st_mtime_ns)
+                except FileNotFoundError:
+                    self.__index.pop(domain, None)
+                return []
+            elif not isinstance(dataobject, DataObject):
+                dataobject = self.loadDomain(domain)
+                tokens = None if dataobject is None else [domain + '.' + section for section in dataobject]
+                self._notifyChanges(tokens or [])
+                return tokens
+            if dataobject.syncing:
+                return []
             
-            # Read the data from file & convert values
-            parser = SafeConfigParser()
-            parser.read(inifile)
-            inidata = {}
-            for s in parser.sections():
-                items = []
-                # Handle each item
-                for item in parser.items(s):
-                    # Try to convert item values automatically
-                    try:
-                        k, v = item
-                        if v is not None:
-                            # Get integers from config file
-                            if v.isdigit():
-                                v = parser.getint(s, k)
-                            # Get floats from config file
-                            elif checker.isFloat(v):
-                                v = parser.getfloat(s, k)
-                            # Get booleans from config file
-                            elif v in ('1', 'yes', 'true', 'on', '0', 'no', 'false', 'off'):
-                                v = parser.getboolean(s, k)
-                            # Get nested JSON objects from config file
-                            elif v.startswith('{') and v.endswith('}'):
-                                v = json.loads(v)
-                            # Get nested JSON objects from config file
-                            elif v.startswith('[') and v.endswith(']'):
-                                v = json.loads(v)
-                            # Get wrapped values as string
-                            elif v[0] in ('"', '\'') and v[-1] in ('"', "'"):
-                                v = v[1:-1]
-                        items.append((k, v))  
-                    except Exception as e:
-                        print(e.__class__.__name__)
-                        if e.__class__.__name__ in ('json.JSONDecodeError', 'ValueError'):
-                            raise UserWarning(f'File "{inifile}" cannot be JSON-decoded ({e})!')
-                        else:
-                            items.append(item)
-                # Re-add all items & sections 
-                inidata.update({s:dict(items)})
-            
-            # Create data object
-            if isinstance(inidata, dict):
-                data = DataObject(backend=inifile, **inidata)
-                return data
-        except FileNotFoundError:
-            raise UserWarning(f'File "{inifile}" does not exist. Please create this file!')
+            # Check if the file changed (Waiting for an own write to record the signature of the written file)
+            with self.__writing:
+                signatures = self.__getSignatures()
+                previous = signatures.get(domain)
+                inifile = Path(self.path).joinpath(f'{domain}.{self.filetype}')
+                try:
+                    stat = os.stat(inifile)
+                    if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                        return []
+                except FileNotFoundError:
+                    pass
+                inifile, content, signature = self.__readFile(domain, self.path)
+                if previous and signature and previous[2] == signature[2]:
+                    signatures[domain] = signature
+                    return []
+                
+                # Parse and validate the file, then update the changed values
+                inidata = self.__parseFile(inifile, content)
+                if inidata and not isinstance(models.getValidatedValue(domain, DataObject(**inidata)), DataObject):
+                    raise UserWarning('Not a valid DataObject')
+                changed = dataobject.updateSections(inidata)
+                for section in models.getValidatedSections(domain, inidata):
+                    dataobject.markValidated(section)
+                signatures[domain] = signature
+            tokens = [f'{domain}.{token}' for token in changed]
+            self.invalidateCache(tokens)
+            self._notifyChanges(tokens)
+            if tokens:
+                self.logger.debug(f'Reloaded data domain "{domain}" of store "{self}" (Changed: {", ".join(tokens)})')
+            return tokens
         except Exception as e:
-            raise e
+            self.logger.warn(f'Failed to reload data domain "{domain}" ({e})')
+            return None
+    
+    def __getSignatures(self) -> Dict[str, Tuple[int, int, str]]:
+        '''
+        Returns the signatures of the loaded INI files of this store instance
+        '''
+        if self.__signatures is None:
+            self.__signatures = {}
+        return self.__signatures
+    
+    @staticmethod
+    def __getSnapshotFile(inifile: Path) -> Path:
+        '''
+        Returns the (hidden) snapshot file of an INI file
+        '''
+        return inifile.with_name(f'.{inifile.name}.snapshot')
+    
+    def __writeSnapshot(self, inifile: Path, data: DataObject, source: str) -> None:
+        '''
+        Writes the snapshot of an INI file's data (A failure only costs parsing the file on the next load)
+        :param Path inifile: The INI file
+        :param py:class::freedm.data.objects.DataObject data: The data
+        :param str source: The hash of the INI file content
+        '''
+        try:
+            writeSnapshot(self.__getSnapshotFile(inifile), data, source)
+        except Exception as e:
+            self.logger.warn(f'Failed to write snapshot of "{inifile}" ({e})')
+    
+    def __readFile(self, domain: str, path: str) -> Tuple[Path, bytes, Optional[Tuple[int, int, str]]]:
+        '''
+        Reads the INI file of a domain
+        :param str domain: The data domain
+        :param str path: The file system location (folder)
+        :returns: The file, its content and its signature (modification time, size and content hash)
+        '''
+        # Check that we have a FS path for the INI file
+        if not path: raise UserWarning(f'No INI file location provided!')
+        
+        # The backend file (A missing file represents an empty domain)
+        inifile = Path(path).joinpath(f'{domain}.{self.filetype}')
+        try:
+            with open(inifile, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                content = f.read()
+        except FileNotFoundError:
+            return inifile, b'', None
+        return inifile, content, (stat.st_mtime_ns, stat.st_size, hashlib.sha1(content).hexdigest())
+    
+    def __parseFile(self, inifile: Path, content: bytes) -> Dict[str, Any]:
+        '''
+        Parses the content of an INI file and converts its values
+        :param Path inifile: The INI file
+        :param bytes content: The file content
+        :returns: The data by section
+        :rtype: dict
+        '''
+        # Read the data from file & convert values
+        parser = SafeConfigParser()
+        parser.read_string(content.decode(), source=str(inifile))
+        inidata = {}
+        for s in parser.sections():
+            items = []
+            # Handle each item
+            for item in parser.items(s):
+                # Try to convert item values automatically
+                try:
+                    k, v = item
+                    if v is not None:
+                        # Get integers from config file
+                        if v.isdigit() or (v.startswith('-') and v[1:].isdigit()):
+                            v = parser.getint(s, k)
+                        # Get floats from config file
+                        elif checker.is_float(v) or (v.startswith('-') and checker.is_float(v[1:])):
+                            v = parser.getfloat(s, k)
+                        # Get booleans from config file
+                        elif v in ('1', 'yes', 'true', 'on', '0', 'no', 'false', 'off'):
+                            v = parser.getboolean(s, k)
+                        # Get nested JSON objects from config file
+                        elif v.startswith('{') and v.endswith('}'):
+                            v = json.loads(v)
+                        # Get nested JSON objects from config file
+                        elif v.startswith('[') and v.endswith(']'):
+                            v = json.loads(v)
+                        # Get wrapped values as string
+                        elif v[0] in ('"', '\'') and v[-1] in ('"', "'"):
+                            v = v[1:-1]
+                    items.append((k, v))  
+                except Exception as e:
+                    if e.__class__.__name__ in ('json.JSONDecodeError', 'ValueError'):
+                        raise UserWarning(f'File "{inifile}" cannot be JSON-decoded ({e})!')
+                    else:
+                        items.append(item)
+            # Re-add all items & sections 
+            inidata.update({s:dict(items)})
+        return inidata
         
     def _unloadDomain(self, domain: str, path: str) -> None:
         pass
     
     def _syncDomain(self, domain: Type[DataObject], path: str) -> None:
-        print('TODO: Implement or get rid of this _syncDomain method')
\ No newline at end of file
+        # Write all changes with one file write
+        tainted = domain.getTainted(reset=True)
+        try:
+            self.__writeFile(domain)
+        except Exception:
+            # Keep the changes to be synced again
+            for token in tainted:
+                domain.setTainted('' if token == '*' else token)
+            raise
+    
+    def __writeFile(self, dataobject: DataObject) -> None:
+        '''
+        Writes the data of a domain to its INI file. The data is written to a temporary file first, which
+        then atomically replaces the INI file, so readers never see a partially written file. The signature
+        of the written file is recorded, so the file observer does not reload the store's own changes.
+        :param py:class::freedm.data.objects.DataObject dataobject: The domain data object
+        '''
+        if not dataobject._backend:
+            raise UserWarning('No INI file location known')
+        inifile = Path(dataobject._backend)
+        domain = os.path.splitext(inifile.name)[0].lower()
+        content = self.__serializeData(dataobject).encode()
+        with self.__writing:
+            handle, temporary = tempfile.mkstemp(prefix=f'.{inifile.name}.', dir=inifile.parent)
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary, inifile)
+            except BaseException:
+                try:
+                    os.unlink(temporary)
+                except FileNotFoundError:
+                    pass
+                raise
+            # Make the rename durable
+            try:
+                directory = os.open(inifile.parent, os.O_RDONLY)
+                try:
+                    os.fsync(directory)
+                finally:
+                    os.close(directory)
+            except OSError:
+                pass
+            stat = os.stat(inifile)
+            self.__getSignatures()[domain] = signature = (stat.st_mtime_ns, stat.st_size, hashlib.sha1(content).hexdigest())
+            self.__index[domain] = (stat.st_size, stat.st_mtime_ns)
+            if self._snapshot:
+                self.__writeSnapshot(inifile, dataobject, signature[2])
+        self.logger.debug(f'Wrote data domain "{domain}" of store "{self}" to "{inifile}"')
+    
+    def __serializeData(self, data: Dict[str, Any]) -> str:
+        '''
+        Serializes the data of a domain to INI. Each section must be a dictionary. The values are written 
+        in the format they are converted back when loading the file (Nested values JSON encoded, strings
+        which would be converted to other types quoted, "%" escaped for the value interpolation)
+        :param dict data: The data
+        :returns: The INI file content
+        :rtype: str
+        '''
+        lines = []
+        for section, items in data.items():
+            if not isinstance(items, dict):
+                self.logger.warn(f'Cannot write value "{section}" to INI file (Only sections of keys can be written)')
+                continue
+            lines.append(f'[{section}]')
+            for key, value in items.items():
+                if value is None:
+                    continue
+                lines.append(f'{key} = {self.__serializeValue(value)}')
+            lines.append('')
+        return '\n'.join(lines)
+    
+    @staticmethod
+    def __serializeValue(value: Any) -> str:
+        '''
+        Serializes a value to its INI representation
+        :param value: The value
+        :returns: The INI value
+        :rtype: str
+        '''
+        if isinstance(value, bool):
+            text = 'true' if value else 'false'
+        elif isinstance(value, (int, float)):
+            text = repr(value)
+        elif isinstance(value, (dict, list, tuple)):
+            text = json.dumps(value)
+        else:
+            text = str(value)
+            # Quote strings which would be converted to other types or lose whitespace
+            unsigned = text[1:] if text.startswith('-') else text
+            if (
+                text == ''
+                or text != text.strip()
+                or unsigned.isdigit()
+                or checker.is_float(unsigned)
+                or text.lower() in ('1', 'yes', 'true', 'on', '0', 'no', 'false', 'off')
+                or (text[0] in '{[' and text[-1] in '}]')
+                or (text[0] in ('"', '\'') and text[-1] in ('"', '\''))
+                ):
+                text = f'"{text}"'
+            # Continue multi-line values on indented lines
+            text = text.replace('\n', '\n\t')
+        return text.replace('%', '%%')
\ No newline at end of file
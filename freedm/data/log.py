@@ -0,0 +1,218 @@
+'''
+This module provides a DataStore based on append-only log files
+@author: Thomas Wanderer
+'''
+
+# Imports
+import os
+import json
+import zlib
+import struct
+import threading
+from pathlib import Path
+from typing import Iterator, Tuple, List, Dict, Any, Type, BinaryIO
+
+# free.dm Imports
+from freedm.data.store import DataStore
+from freedm.data.object import DataObject
+from freedm.data.snapshot import writeSnapshot, readSnapshot
+
+
+# The record header: The length and the CRC32 checksum of the record's payload
+RECORD = struct.Struct('<II')
+
+
+def encodeRecord(token: str, value: Any) -> bytes:
+    '''
+    Encodes a set operation as checksummed log record
+    :param str token: The key token
+    :param object value: The value
+    :returns: The record
+    :rtype: bytes
+    '''
+    payload = json.dumps([token, value], separators=(',', ':')).encode()
+    return RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decodeRecords(content: bytes) -> Iterator[Tuple[int, str, Any]]:
+    '''
+    Decodes the log records of a file content. Decoding stops at the first incomplete or corrupt record
+    (e.g. a record torn by a crash while writing it).
+    :param bytes content: The file content
+    :returns: The end offset, the key token and the value of each valid record
+    :rtype: iterator
+    '''
+    offset = 0
+    while offset + RECORD.size <= len(content):
+        length, checksum = RECORD.unpack_from(content, offset)
+        start, end = offset + RECORD.size, offset + RECORD.size + length
+        payload = content[start:end]
+        if end > len(content) or zlib.crc32(payload) != checksum:
+            return
+        try:
+            token, value = json.loads(payload)
+        except ValueError:
+            return
+        offset = end
+        yield offset, token, value
+
+
+class LogStore(DataStore):
+    '''
+    A data store which persists each set value as record appended to a log file per domain
+    ("<domain>.<filetype>"). Appending a record is a constant-time write regardless of the domain's size,
+    so this store suits frequently changing run-time data (e.g. sessions or counters).
+    Each record is checksummed. On loading a domain its snapshot ("<domain>.<filetype>.snapshot") is
+    memory-mapped and then its log is replayed; a record torn by a crash ends the replay and gets cut off
+    the log. Once a log holds more than "compact" records, the domain is compacted: its data is written as
+    a new snapshot (See py:module::freedm.data.snapshot) and the log is emptied. As replaying a record
+    twice yields the same data, a crash while compacting loses no data.
+    In synced mode each value set is appended immediately, otherwise the changed values are appended
+    on syncing a domain.
+    '''
+    # Attributes
+    _persistent: bool = True
+    _writable: bool = True
+    _default_name: str = 'State'
+    _default_filetype: str = 'log'
+    description: str = 'A persistent append-only log store'
+
+    # Durability and compaction
+    _fsync: bool = True
+    _compact_records: int = 1000
+    __records: Dict[str, int] = None
+    __writing: threading.Lock = None
+
+    # Init
+    def __init__(self, *args, fsync: bool=None, compact: int=None, **kwargs):
+        '''
+        :param bool fsync: ``True`` if each append should be flushed to disk (Otherwise appends survive only process crashes)
+        :param int compact: The number of log records after which a domain gets compacted into a snapshot
+        '''
+        if isinstance(fsync, bool):
+            self._fsync = fsync
+        if isinstance(compact, int):
+            self._compact_records = compact
+        self.__records = {}
+        self.__writing = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def __getFiles(self, domain: str) -> Tuple[Path, Path]:
+        '''
+        Returns the log file and the snapshot file of a domain
+        '''
+        if not self.path:
+            raise UserWarning('No storage path set')
+        logfile = Path(self.path).joinpath(f'{domain}.{self.filetype}')
+        return logfile, logfile.with_name(f'{logfile.name}.snapshot')
+
+    @staticmethod
+    def __getDomainName(dataobject: DataObject) -> str:
+        '''
+        Returns the domain name of a data object (Its backend is the log file)
+        '''
+        return os.path.splitext(os.path.basename(dataobject._backend))[0]
+
+    def __getHandle(self, dataobject: DataObject) -> BinaryIO:
+        '''
+        Returns the open log file of a domain (Reopened if its handle was released)
+        '''
+        handle = dataobject._iohandle
+        if handle is None or handle.closed:
+            handle = dataobject._iohandle = open(dataobject._backend, 'ab')
+        return handle
+
+    def __append(self, dataobject: DataObject, records: List[Tuple[str, Any]]) -> None:
+        '''
+        Appends records to the log of a domain with one write (and one flush to disk)
+        '''
+        content = b''.join(encodeRecord(token, value) for token, value in records)
+        domain = self.__getDomainName(dataobject)
+        with self.__writing:
+            handle = self.__getHandle(dataobject)
+            handle.write(content)
+            handle.flush()
+            if self._fsync:
+                os.fsync(handle.fileno())
+            self.__records[domain] = self.__records.get(domain, 0) + len(records)
+            compact = self.__records[domain] >= self._compact_records
+        if compact:
+            self.compactDomain(domain)
+
+    def compactDomain(self, domain: str) -> bool:
+        '''
+        Compacts the log of a loaded domain by writing the domain's data as new snapshot and emptying the log
+        :param str domain: The data domain
+        :returns: ``True`` if the domain has been compacted
+        :rtype: bool
+        '''
+        domain = domain.lower()
+        dataobject = self._data.get(domain)
+        if not isinstance(dataobject, DataObject):
+            return False
+        logfile, snapshot = self.__getFiles(domain)
+        with self.__writing:
+            # Write the snapshot atomically
+            writeSnapshot(snapshot, dataobject)
+            # Then empty the log (Its records are part of the snapshot now)
+            log = self.__getHandle(dataobject)
+            log.truncate(0)
+            if self._fsync:
+                os.fsync(log.fileno())
+            records, self.__records[domain] = self.__records.get(domain, 0), 0
+        self.logger.debug(f'Compacted {records} log records of data domain "{domain}" of store "{self}"')
+        return True
+
+    # Implement data setters & getter
+    def _setRaw(self, domain: Type[DataObject], token: str, value: Any) -> bool:
+        self.__append(domain, [(token, value)])
+        return True
+
+    def _setRawBatch(self, domain: Type[DataObject], values: Dict[str, Any]) -> bool:
+        self.__append(domain, list(values.items()))
+        return True
+
+    def _getRaw(self, domain: Type[DataObject], token: str) -> Any:
+        # All data of a domain is replayed into its data object
+        return None
+
+    # Implement domain loading and unloading
+    def _loadDomain(self, domain: str, path: str) -> None:
+        logfile, snapshot = self.__getFiles(domain)
+
+        # Map the snapshot (Its data is deserialized on access), then replay the log
+        data = readSnapshot(snapshot, backend=str(logfile)) or DataObject(backend=str(logfile))
+        try:
+            content = logfile.read_bytes()
+        except FileNotFoundError:
+            content = b''
+        offset = records = 0
+        for offset, token, value in decodeRecords(content):
+            data.setValue(token, value)
+            records += 1
+        # Cut off a torn record, so further records are appended to valid ones
+        if offset < len(content):
+            self.logger.warn(f'Truncating {len(content) - offset} invalid bytes of log "{logfile}"')
+            with open(logfile, 'r+b') as f:
+                f.truncate(offset)
+        self.__records[domain] = records
+        data.clearTainted()
+        data._iohandle = open(logfile, 'ab')
+        return data
+
+    def _unloadDomain(self, domain: str, path: str) -> None:
+        # The log file gets closed by unloading the domain
+        self.__records.pop(domain, None)
+
+    def _syncDomain(self, domain: Type[DataObject], path: str) -> None:
+        # Append all changed values at once
+        tainted = domain.getTainted(reset=True)
+        tokens = ['' if token == '*' else token for token in tainted]
+        try:
+            if tokens:
+                self.__append(domain, [(token, domain.getValue(token)) for token in tokens])
+        except Exception:
+            # Keep the changes to be synced again
+            for token in tokens:
+                domain.setTainted(token)
+            raise
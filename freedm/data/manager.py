@@ -6,15 +6,17 @@ This module provides data and configuration management
 # Imports
 import os
 import logging
+import asyncio
+from contextlib import contextmanager
 from pathlib import Path
-from typing import ItemsView, Optional, Union, List, Dict, Any, Type
+from typing import ItemsView, Optional, Union, List, Dict, Any, Type, Iterable, Iterator
 from logging import Logger
 
 # free.dm Imports
 from freedm import models
 from freedm.data.store import DataStore
 from freedm.data.object import DataObject
-from freedm.utils.aio import runConcurrently
+from freedm.utils.aio import get_io_executor, IOExecutor
 from freedm.utils.types import TypeChecker as checker
 
 
@@ -81,13 +83,26 @@ class DataManager(object):
         '''The filesystem storage location represented by this class instance'''
         return self.__path
     
+    # The executor running the blocking backend IO of all registered stores (Capped per store)
+    __executor = None
+    @property
+    def executor(self) -> IOExecutor:
+        '''The shared IO executor of the registered stores'''
+        return self.__executor or get_io_executor()
+    
     @property
     def logger(self) -> Logger:
         '''The logger of this class'''
         return logging.getLogger(str(os.getpid()))
     
     # Init
-    def __init__(self, path: Union[str, Path]=None):
+    def __init__(self, path: Union[str, Path]=None, executor: IOExecutor=None):
+        '''
+        :param str path: A file system location (folder)
+        :param py:class::freedm.utils.aio.IOExecutor executor: An optional IO executor for the stores (By default the process-wide IO executor)
+        '''
+        if isinstance(executor, IOExecutor):
+            self.__executor = executor
         try:
             # Set the data location
             if path is not None:
@@ -198,6 +213,7 @@ class DataManager(object):
         if not store.alias in self.__stores.keys():
             # Add the store and set the store's path if empty
             self.__stores[store.alias] = store
+            store.executor = self.executor
             if store.path is None:
                 store.path = self.path
                 # Warn the user from registering same-type stores with the same path
@@ -235,6 +251,7 @@ class DataManager(object):
             store.sync()
             # Remove the store and update setters & getters
             del self.__stores[store.alias]
+            store.executor = None
             self.__updateSettersGetters()
             self.logger.debug(f'Unregistered data store "{alias}" from data manager "{self}"')
             return True
@@ -253,6 +270,14 @@ class DataManager(object):
         for k,s in (None, self._getStore(store),) if store else self.stores:
             s.sync()
     
+    async def asyncSync(self, store: str=None) -> None:
+        '''
+        Asynchronous variant of py:function::sync which syncs the stores without blocking the running loop
+        '''
+        self.logger.debug(f'Syncing persistent data store "{store}" backends...' if store else 'Syncing all persistent data store backends...')
+        stores = [self._getStore(store)] if store else self.getStores()
+        await asyncio.gather(*[s.asyncSync() for s in stores if s])
+    
     def release(self) -> None:
         '''
         Tells each data store to close & release its filesystem handles
@@ -263,15 +288,12 @@ class DataManager(object):
         # Find all stores
         self.logger.debug('Releasing data store backends...')
         
-        # Create release function
-        def storeReleaser(store, errors):
+        # Release the stores one by one (Each store releases its domains concurrently in the shared executor)
+        for store in self.getStores():
             try:
                 store.releaseHandle()
             except Exception as e:
                 errors.append((store, e))
-         
-        # Release stores concurrently    
-        runConcurrently(storeReleaser, self.getStores(), errors)
                           
         # Report any errors
         for e in errors:
@@ -369,4 +391,65 @@ class DataManager(object):
                     default = models.getValidatedValue(token, default)
                 if default is not None:
                     self.logger.info(f'Value "{token}" lookup failed. Using default value "{default}"')
-        return default
\ No newline at end of file
+        return default
+    
+    # Batch value getting and setting
+    def getMany(self, store: str, tokens: Union[Iterable[str], Dict[str, Any]], default: Any=None) -> Dict[str, Any]:
+        '''
+        Returns several data values from the provided store at once (See "get<Store>" for the key tokens).
+        The store and each of its data domains are only looked up once.
+        :param str store: The store alias
+        :param tokens: The key tokens or a dictionary of key tokens and their individual alternative values
+        :param object default: An optional alternative value for all tokens
+        :returns: The values by token (``None`` if a value cannot be found)
+        :rtype: dict
+        '''
+        # Get the data store
+        datastore = self._getStore(store)
+        
+        # Get the values
+        try:
+            if datastore: return datastore.getValues(tokens, default)
+        except Exception as e:
+            self.logger.info(f'Values lookup in store "{store}" failed ({e})')
+        return dict(tokens) if isinstance(tokens, dict) else dict.fromkeys(tokens, default)
+    
+    def setMany(self, store: str, values: Dict[str, Any]) -> bool:
+        '''
+        Adds/Updates several data values in the provided store at once (See "set<Store>" for the key tokens).
+        Either all values are set or - if any value is invalid - none of them.
+        :param str store: The store alias
+        :param dict values: The values by key token
+        :returns: ``True`` if all values could be set
+        :rtype: bool
+        '''
+        # Get the data store
+        datastore = self._getStore(store)
+        
+        # Set the values
+        try:
+            if datastore: return datastore.setValues(values)
+        except Exception as e:
+            self.logger.warn(f'Writing of {len(values)} new values to store "{store}" failed ({e})')
+        return False
+    
+    @contextmanager
+    def update(self, store: str) -> Iterator[Dict[str, Any]]:
+        '''
+        A context manager collecting value updates for the provided store which are set at once
+        (See py:function::setMany) when the context exits. If the context exits with an exception 
+        the collected updates are discarded.
+        
+        Example:
+        
+        with manager.update('config') as values:
+            values['settings.port'] = 80
+            values['settings.host'] = 'localhost'
+        
+        :param str store: The store alias
+        :returns: The dictionary of values by key token to update
+        '''
+        values: Dict[str, Any] = {}
+        yield values
+        if values and not self.setMany(store, values):
+            self.logger.warn(f'Updating {len(values)} values in store "{store}" failed')
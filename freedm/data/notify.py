@@ -0,0 +1,301 @@
+'''
+This module defines subscriptions to changed values of a data store
+@author: Thomas Wanderer
+'''
+
+# Imports
+import os
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Callable, Iterable, List, Dict, Set, Any
+from logging import Logger
+
+# free.dm Imports
+from freedm.data.token import splitToken
+
+
+class Subscription(object):
+    '''
+    A subscription to the changes of all values within a token prefix (e.g. "config" or "config.daemon").
+    Changed tokens are delivered in batches to the subscriber's callback, either on an asyncio loop or
+    in a worker thread of the notifier's executor. Batches of changes pending while the subscriber is still
+    busy are merged, so a subscriber is called once with all tokens changed meanwhile and never concurrently.
+    '''
+
+    @property
+    def logger(self) -> Logger:
+        '''The logger of this class'''
+        return logging.getLogger(str(os.getpid()))
+
+    # Init
+    def __init__(self, notifier: 'ChangeNotifier', prefix: str, callback: Callable[[List[str]], Any], synced: bool=False, loop: asyncio.AbstractEventLoop=None, executor: concurrent.futures.Executor=None):
+        '''
+        :param py:class::ChangeNotifier notifier: The notifier dispatching the changes
+        :param str prefix: The token prefix
+        :param callable callback: A function or coroutine function called with the list of changed tokens
+        :param bool synced: ``True`` if changes should be delivered only after they were synced to the backend
+        :param asyncio.AbstractEventLoop loop: The loop to call the callback on (Otherwise called by the executor)
+        :param concurrent.futures.Executor executor: The executor calling the callback if no loop is set
+        '''
+        self.prefix     = prefix
+        self.callback   = callback
+        self.synced     = synced
+        self.loop       = loop
+        self.executor   = executor
+        self.stats      = {'changes': 0, 'deliveries': 0}
+        self.__notifier = notifier
+        self.__pending: Dict[str, None] = {}
+        self.__scheduled = False
+        self.__lock = threading.Lock()
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.prefix or "*"} ({"after sync" if self.synced else "immediate"})>'
+
+    @property
+    def active(self) -> bool:
+        '''``True`` unless the subscription has been cancelled'''
+        return self.__notifier is not None
+
+    def cancel(self) -> None:
+        '''
+        Cancels the subscription (Pending changes are not delivered anymore)
+        '''
+        notifier, self.__notifier = self.__notifier, None
+        if notifier is not None:
+            notifier.unsubscribe(self)
+        with self.__lock:
+            self.__pending.clear()
+
+    def deliver(self, tokens: Iterable[str]) -> None:
+        '''
+        Schedules the delivery of changed tokens
+        :param list tokens: The changed tokens
+        '''
+        with self.__lock:
+            if not self.active:
+                return
+            for token in tokens:
+                self.__pending[token] = None
+                self.stats['changes'] += 1
+            if self.__scheduled or not self.__pending:
+                return
+            self.__scheduled = True
+        try:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.__drain)
+            else:
+                self.executor.submit(self.__drain)
+        except Exception as e:
+            with self.__lock:
+                self.__scheduled = False
+            # A subscription of a closed loop cannot be delivered anymore
+            if self.loop is not None and self.loop.is_closed():
+                self.logger.debug(f'Cancelling subscription "{self}" as its loop is closed')
+                self.cancel()
+            else:
+                self.logger.warn(f'Delivering changes to subscription "{self}" failed ({e})')
+
+    def __drain(self) -> None:
+        '''
+        Calls the callback with all pending changes until no more changes are pending
+        '''
+        while True:
+            with self.__lock:
+                tokens = list(self.__pending)
+                self.__pending.clear()
+                if not tokens or not self.active:
+                    self.__scheduled = False
+                    return
+            self.stats['deliveries'] += 1
+            try:
+                result = self.callback(tokens)
+                # Coroutine callbacks run as task on the loop (or to their end in the worker thread)
+                if asyncio.iscoroutine(result):
+                    if self.loop is not None:
+                        self.loop.create_task(result)
+                    else:
+                        asyncio.run(result)
+            except Exception as e:
+                self.logger.warn(f'Subscriber of "{self.prefix}" failed handling {len(tokens)} changes ({e})')
+
+
+class ChangeNotifier(object):
+    '''
+    Dispatches the changed tokens of a data store to the subscriptions of token prefixes. The subscriptions
+    are kept in a trie of token keys, so dispatching a token costs one lookup per key of the token instead of
+    testing each subscription. A subscription receives a changed token if the token starts with its prefix or
+    if the token is a parent of its prefix (e.g. "config" if the whole domain changed).
+    Subscriptions to synced changes receive them only once their domain has been synced to its backend
+    (See py:function::flush). The changes of each notification are delivered as one batch per subscription.
+    Subscribers without asyncio loop are called by a dedicated executor of the notifier (Created on the first
+    such subscription), so slow subscribers cannot delay the backend IO of the store or vice versa.
+    '''
+
+    # Init
+    def __init__(self, max_workers: int=4, name: str='notify'):
+        '''
+        :param int max_workers: The maximal number of threads calling subscribers without loop
+        :param str name: The name prefix of these threads
+        '''
+        self.max_workers = max_workers
+        self.name = name
+        self.__executor: concurrent.futures.ThreadPoolExecutor = None
+        self.__root: Dict[str, Any] = {}
+        self.__unsynced: Dict[str, Dict[str, None]] = {}
+        self.__count = 0
+        self.__lock = threading.RLock()
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.__count} subscriptions>'
+
+    def __len__(self) -> int:
+        return self.__count
+
+    @property
+    def executor(self) -> concurrent.futures.Executor:
+        '''The executor calling the subscribers without loop'''
+        with self.__lock:
+            if self.__executor is None:
+                self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self.__executor
+
+    def shutdown(self, wait: bool=True) -> None:
+        '''
+        Shuts down the executor calling the subscribers without loop (Changes pending for them are not delivered anymore)
+        :param bool wait: ``True`` to wait for the running subscribers
+        '''
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    @staticmethod
+    def __getKeys(token: str) -> List[str]:
+        '''
+        Returns the keys of a token (The domain in lower case)
+        '''
+        domain, key = splitToken(token)
+        keys = [domain.lower()] if domain else []
+        return keys + key.split('.') if key else keys
+
+    def subscribe(self, prefix: str, callback: Callable[[List[str]], Any], synced: bool=False, loop: asyncio.AbstractEventLoop=None) -> Subscription:
+        '''
+        Subscribes to the changes of all values within a token prefix
+        :param str prefix: The token prefix (An empty prefix subscribes to all changes)
+        :param callable callback: A function or coroutine function called with the list of changed tokens
+        :param bool synced: ``True`` if changes should be delivered only after they were synced to the backend
+        :param asyncio.AbstractEventLoop loop: The loop to call the callback on (By default the running loop, otherwise a worker thread)
+        :returns: The subscription
+        '''
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        subscription = Subscription(self, prefix, callback, synced=synced, loop=loop, executor=None if loop else self.executor)
+        with self.__lock:
+            node = self.__root
+            for key in self.__getKeys(prefix):
+                node = node.setdefault(key, {})
+            node.setdefault(None, set()).add(subscription)
+            self.__count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        '''
+        Removes a subscription
+        :param py:class::Subscription subscription: The subscription
+        '''
+        with self.__lock:
+            # Remove the subscription and prune the nodes left empty
+            path = [self.__root]
+            for key in self.__getKeys(subscription.prefix):
+                node = path[-1].get(key)
+                if node is None:
+                    return
+                path.append(node)
+            subscriptions = path[-1].get(None, set())
+            if subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            self.__count -= 1
+            if not subscriptions:
+                del path[-1][None]
+            for key, node in zip(reversed(self.__getKeys(subscription.prefix)), reversed(path[:-1])):
+                if node[key]:
+                    break
+                del node[key]
+        if subscription.active:
+            subscription.cancel()
+
+    def match(self, token: str) -> Set[Subscription]:
+        '''
+        Returns the subscriptions affected by a changed token
+        :param str token: The changed token
+        :returns: The subscriptions
+        :rtype: set
+        '''
+        matches = set()
+        with self.__lock:
+            # The subscriptions of the token's parents and of the token itself
+            node = self.__root
+            matches.update(node.get(None, ()))
+            for key in self.__getKeys(token):
+                node = node.get(key)
+                if node is None:
+                    return matches
+                matches.update(node.get(None, ()))
+            # The subscriptions of the token's children
+            nodes = [child for key, child in node.items() if key is not None]
+            while nodes:
+                node = nodes.pop()
+                matches.update(node.get(None, ()))
+                nodes.extend(child for key, child in node.items() if key is not None)
+        return matches
+
+    def notify(self, tokens: Iterable[str], synced: bool=False) -> None:
+        '''
+        Dispatches changed tokens to the subscriptions
+        :param list tokens: The changed tokens
+        :param bool synced: ``True`` if the changes are synced already (Otherwise subscriptions to synced changes receive them on py:function::flush)
+        '''
+        if not self.__count:
+            return
+        batches: Dict[Subscription, List[str]] = {}
+        with self.__lock:
+            for token in tokens:
+                for subscription in self.match(token):
+                    if subscription.synced and not synced:
+                        self.__unsynced.setdefault(splitToken(token)[0].lower(), {})[token] = None
+                    else:
+                        batches.setdefault(subscription, []).append(token)
+        for subscription, batch in batches.items():
+            subscription.deliver(batch)
+
+    def flush(self, domain: str) -> None:
+        '''
+        Delivers the changes of a domain to the subscriptions to synced changes after the domain was synced
+        :param str domain: The data domain
+        '''
+        with self.__lock:
+            tokens = self.__unsynced.pop(domain.lower(), None)
+        if tokens:
+            batches: Dict[Subscription, List[str]] = {}
+            for token in tokens:
+                for subscription in self.match(token):
+                    if subscription.synced:
+                        batches.setdefault(subscription, []).append(token)
+            for subscription, batch in batches.items():
+                subscription.deliver(batch)
+
+    def discard(self, domain: str) -> None:
+        '''
+        Discards the changes of a domain waiting to be synced (e.g. if the domain was unloaded without syncing)
+        :param str domain: The data domain
+        '''
+        with self.__lock:
+            self.__unsynced.pop(domain.lower(), None)
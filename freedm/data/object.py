@@ -4,9 +4,18 @@ This module defines a generic data object
 '''
 
 # Imports
-from collections import deque
+import copy
 from typing import ItemsView, Optional, Union, List, Dict, Any, Type
 
+# free.dm Imports
+from freedm.data.token import compileToken, TokenStep, KEY, INDEX, COLLECTION, WILDCARD
+from freedm.data.changelog import ChangeLog
+from freedm.data.index import Index
+
+
+# A missing value (e.g. of a key added by a change)
+MISSING = object()
+
 
 class DataObject(dict):
     '''
@@ -21,9 +30,20 @@ class DataObject(dict):
     # An IO handle (e.g. file/socket handle)
     _iohandle = None
     
-    # A list of changed tokens
+    # The log of changed tokens
     _changed = None
     
+    # Validation tracking: A generation counter increased by each change, the generation of the last change
+    # by section (the first key of a token), the generation the whole data was replaced and the generation
+    # at which tokens were validated
+    _generation = 0
+    _sections = None
+    _reset = 0
+    _validated = None
+    
+    # The secondary indexes over collections by collection token and indexed key
+    _indexes = None
+    
     # A flag indicating that the object currently is being synced
     _syncing = False
     @property
@@ -50,8 +70,12 @@ class DataObject(dict):
         # Set the data
         super().__init__(*args, **kwargs)
         
-        # Set a new changed queue where we track changes made by setting values
-        self._changed = deque()
+        # Set a new change log where we track changes made by setting values
+        self._changed = ChangeLog()
+        
+        # Set up the validation tracking
+        self._sections = {}
+        self._validated = {}
         
         # Set backend IO handle
         if isinstance(backend, str):
@@ -86,6 +110,206 @@ class DataObject(dict):
                 self._changed = dataobject._changed
             else:
                 self.clearTainted()
+            # Any previous validation is void
+            self.__touch(None)
+            self.__reindex(None)
+    
+    def updateSections(self, data):
+        '''
+        Updates the data structure of this data object by another data structure (e.g. the reloaded data of
+        its backend), but only changes the differing sections and the differing keys of sections which
+        are dictionaries in both structures. The change log is not affected.
+        :param dict data: The new data
+        :returns: The tokens of the changed sections and keys
+        :rtype: list
+        '''
+        changed = []
+        # Remove obsolete sections
+        for section in [section for section in self if section not in data]:
+            del self[section]
+            self.__touch(section)
+            changed.append(section)
+        # Update changed sections (key by key if possible)
+        for section, value in data.items():
+            current = self.get(section)
+            if section in self and current == value:
+                continue
+            if isinstance(current, dict) and isinstance(value, dict):
+                for key in [key for key in current if key not in value]:
+                    del current[key]
+                    changed.append(f'{section}.{key}')
+                for key, item in value.items():
+                    if key not in current or current[key] != item:
+                        current[key] = item
+                        changed.append(f'{section}.{key}')
+            else:
+                self[section] = value
+                changed.append(section)
+            self.__touch(section)
+        for token in changed:
+            self.__reindex(token)
+        return changed
+    
+    def __touch(self, section):
+        '''
+        Tracks a change of the data by increasing the generation
+        :param str section: The changed section or ``None`` if the whole data changed
+        '''
+        self._generation += 1
+        if section is None:
+            self._reset = self._generation
+            self._sections.clear()
+            self._validated.clear()
+        else:
+            self._sections[section] = self._generation
+    
+    def createIndex(self, collection, field):
+        '''
+        Creates a secondary index of the items of a collection by the value of one of their keys, which is 
+        kept up to date on any change made by py:function::setValue (See py:class::freedm.data.index.Index).
+        :param str collection: The key token of the collection (e.g. "user.active" or "user.active.[]")
+        :param str field: The key token of the indexed value within each item (e.g. "name")
+        :returns: The index
+        :rtype: py:class::freedm.data.index.Index
+        '''
+        index = Index(collection, field)
+        if self._indexes is None:
+            self._indexes = {}
+        index = self._indexes.setdefault((index.collection, field), index)
+        index.build(self)
+        return index
+    
+    def dropIndex(self, collection, field):
+        '''
+        Removes a secondary index
+        :param str collection: The key token of the collection
+        :param str field: The key token of the indexed value
+        '''
+        if self._indexes:
+            self._indexes.pop((Index(collection, field).collection, field), None)
+    
+    def getIndex(self, collection, field):
+        '''
+        Returns a secondary index
+        :param str collection: The key token of the collection
+        :param str field: The key token of the indexed value
+        :returns: The index or ``None`` if not created
+        :rtype: py:class::freedm.data.index.Index
+        '''
+        if not self._indexes:
+            return None
+        return self._indexes.get((Index(collection, field).collection, field))
+    
+    def __reindex(self, token):
+        '''
+        Updates the indexes after a change
+        :param str token: The changed token or ``None`` if the whole data changed
+        '''
+        if self._indexes:
+            for index in list(self._indexes.values()):
+                index.refresh(self, token)
+    
+    def markValidated(self, token):
+        '''
+        Marks the current value of the token as validated. Its validation (and the
+        validation of any sub token) stays valid until the token's section changes.
+        :param str token: The key token
+        '''
+        self._validated[token] = self._generation
+    
+    def isValidated(self, token):
+        '''
+        Checks if the value of the token has been validated since it last changed, either by validating
+        the token itself or any of its parent tokens. Changes are tracked per section (The first key of
+        a token), so any change to a section voids the validation of all of its tokens.
+        :param str token: The key token
+        :returns: ``True`` if the value of the token is known to be valid
+        :rtype: bool
+        '''
+        if not self._validated:
+            return False
+        if token == '':
+            changed = self._generation
+        else:
+            changed = max(self._sections.get(token.partition('.')[0], 0), self._reset)
+        while True:
+            generation = self._validated.get(token)
+            if generation is not None and generation >= changed:
+                return True
+            if token == '':
+                return False
+            # Continue with the parent token
+            index = token.rfind('.')
+            token = token[:index] if index != -1 else ''
+    
+    def getSnapshot(self, tokens=None):
+        '''
+        Returns a snapshot of the data affected by changing the provided tokens and of the change log, which
+        allows to roll back these changes by "restoreSnapshot". Only the values the tokens are about to replace
+        are copied (or the collections they add items to), unless a token addresses the whole data.
+        :param list tokens: The key tokens about to be changed or ``None`` to snapshot the whole data
+        :returns: The snapshot
+        '''
+        sections, entries = set(), []
+        for token in (tokens if tokens is not None else ('',)):
+            steps = compileToken(token)
+            if not steps or steps[0].kind != KEY:
+                return None, copy.deepcopy(dict(self)), list(self._changed)
+            sections.add(steps[0].key)
+            entries.append(self.__getUndoEntry(steps))
+        return sections, entries, list(self._changed)
+    
+    def __getUndoEntry(self, steps):
+        '''
+        Returns the location (The keys of a parent and the key within the parent) and a copy of the value a
+        token is about to replace. Setting a token changes the innermost existing value along its keys,
+        so only this value is copied (or the whole collection if the token adds an item to it).
+        :param tuple steps: The compiled token
+        :returns: The keys of the parent, the key and the value (or py:data::MISSING)
+        :rtype: tuple
+        '''
+        path, data = [], self
+        for index, step in enumerate(steps):
+            if step.kind != COLLECTION and isinstance(data, dict):
+                child = data.get(step.key, MISSING)
+                if index == len(steps) - 1 or not isinstance(child, (dict, list)):
+                    return tuple(path), step.key, MISSING if child is MISSING else copy.deepcopy(child)
+                path.append(step.key)
+                data = child
+            else:
+                break
+        # The token changes a list or adds an item to a collection
+        return tuple(path[:-1]), path[-1], copy.deepcopy(data)
+    
+    def restoreSnapshot(self, snapshot):
+        '''
+        Rolls the data and the change log back to a snapshot taken by "getSnapshot"
+        :param tuple snapshot: The snapshot
+        '''
+        sections, entries, changed = snapshot
+        if sections is None:
+            self.clear()
+            self.update(entries)
+            self.__touch(None)
+            self.__reindex(None)
+        else:
+            for path, key, value in reversed(entries):
+                try:
+                    data = self
+                    for parent in path:
+                        data = data[parent]
+                    if value is MISSING:
+                        data.pop(key, None)
+                    else:
+                        data[key] = value
+                except (LookupError, TypeError, AttributeError):
+                    # The parent has been replaced, so the entry of a parent's token restores the value
+                    pass
+            for section in sections:
+                self.__touch(section)
+                self.__reindex(section)
+        self._changed.clear()
+        self._changed.extend(changed)
     
     def clearTainted(self):
         '''
@@ -99,8 +323,7 @@ class DataObject(dict):
         change log (only once, so only if not already set before).
         :param str token: The token whos value changed
         '''
-        if token not in self._changed:
-            self._changed.append(token)
+        self._changed.add(token)
     
     def getTainted(self, reset=False):
         '''
@@ -112,34 +335,12 @@ class DataObject(dict):
         - Changes to "laboratory.1" and "laboratory.2" will return both tokens
         - Changes to "laboratory" and "laboratory.2" will return just the token "laboratory"
         - Changes to "laboratory.[]" and "laboratory.2" will return just the token "laboratory"
+        - Changes to "laboratory.1" and "laboratory.10" will return both tokens
+        The change log is reduced (and reset) atomically, so changes made concurrently are either returned or kept.
         :param bool reset: If set to ``True``, then the change log will be reset (emptied) as well
         '''
-        if reset is True:
-            tokens = [self._changed.popleft() for _c in range(0, len(self._changed))]
-        else:
-            tokens = list(self._changed)
-        
-        if '' in tokens:
-            return ['*']
-        else:
-            reduced = []
-            tokens.sort()
-            for i,v in enumerate(tokens):
-                # Get token relations
-                this = v
-                prev = tokens[i-1] if i != 0 else None
-                
-                # Compare tokens with previous token and already listed tokens
-                if prev is None:
-                    reduced.append(this)
-                else:
-                    if prev in this:
-                        pass
-                    elif reduced[-1] in this:
-                        pass
-                    else:
-                        reduced.append(this)   
-            return reduced
+        tokens = self._changed.reduce(reset=reset is True)
+        return ['*'] if '' in tokens else tokens
                 
     def getValue(self, token, data=None):
         '''
@@ -186,31 +387,45 @@ class DataObject(dict):
         if token == '':
             return data
         
-        # The individual key tokens
-        keys = token.split('.')
+        # Execute the compiled key tokens
+        return self._resolve(compileToken(token), data, token)
+    
+    def _resolve(self, steps, data, token):
+        '''
+        Resolves the compiled steps of a key token in the nested data structure
+        :param tuple steps: The compiled token steps
+        :param data: The data used as entry point
+        :param str token: The original key token (Used for error messages)
+        :returns: The value
+        '''
+        # The whole data structure
+        if not steps:
+            return data
         
         # Try to find the key tokens in the nested dict structure
+        key = None
         try:
-            for index, key in enumerate(keys):
+            for index, step in enumerate(steps):
+                key = step.key
                 
                 # Handle special keys
                 
                 # Check if we need to look for an ID entry, specified by a numeric token key...
-                if key.isdigit():
+                if step.kind == INDEX:
                     if isinstance(data, dict):
                         try:
                             # Try with integer keys
-                            data = data[int(key)]
+                            data = data[step.index]
                         except:
                             # Try with string keys (JSON limitation)
                             data = data[key]
                     elif isinstance(data, list):
-                        data = data[int(key)]
+                        data = data[step.index]
                     else:
                         data = data[key]
                         
                 # Check if we need to find a collection of elements ...
-                elif key == '[]':
+                elif step.kind == COLLECTION:
                     # Transform a "numerical dictionary" in a list
                     if isinstance(data, dict) and len(data.keys()) > 0 and all(k.isdigit() for k in data.keys()):
                         data = [v for k,v in data.items()]
@@ -221,36 +436,25 @@ class DataObject(dict):
                         raise Exception('Key "[]" cannot be resolved as collection')
                 
                 # Retrieve data by wildcard '+'
-                elif key == '+':
+                elif step.kind == WILDCARD:
                     # Identify the previous key
-                    key_prev = keys[index-1] if index-1 >= 0 else None
-                    key_next = keys[index+1] if index+1 < len(keys) else None
+                    step_prev = steps[index-1] if index-1 >= 0 else None
+                    step_next = steps[index+1] if index+1 < len(steps) else None
                     # Transform a "numerical dictionary" into a list
                     if isinstance(data, dict):
                         data = [{k:v} if not k.isdigit() else v for k,v in data.items()]
                     # Handle lists
                     elif isinstance(data, list):
                         try:
-                            if key_prev == '+' or key_prev == '[]':
+                            if step_prev is not None and step_prev.kind in (WILDCARD, COLLECTION):
                                 items = []
                                 for i in data:
-                                    try:
-                                        k2 = next(iter(i))
-                                        path = '.'.join(keys[index+1:])
-                                    except IndexError:
-                                        path = ''
-                                    items.append({k2: self.getValue(path, i[k2])})
+                                    k2 = next(iter(i))
+                                    items.append({k2: self._resolve(steps[index+1:], i[k2], token)})
                                 data = items
                                 break
-                            elif key_next.isdigit():
-                                items = []
-                                for i in data:
-                                    try:
-                                        path = '.'.join(keys[index+1:])
-                                    except IndexError:
-                                        path = ''
-                                    items.append(self.getValue(path, i))
-                                data = items
+                            elif step_next.kind == INDEX:
+                                data = [self._resolve(steps[index+1:], i, token) for i in data]
                                 break
                         except:
                             pass
@@ -287,10 +491,6 @@ class DataObject(dict):
             raise LookupError(f'Token "{token}" lookup failed ({e})')
         
         # Return the data matching the token
-        
-#         from freedm.utils.formatters import printPrettyDict
-#         print(printPrettyDict(data))
-        
         return data
     
     def setValue(self, token, value):
@@ -318,34 +518,38 @@ class DataObject(dict):
             
         :param str token: The key token
         :param value: The value
-        :returns: ``True`` if the value could be set
-        :rtype: bool
+        :returns: The key token set (With collection keys "[]" resolved to the actual item ID)
+        :rtype: str
         '''
         # The uppermost level (root) of the nested data structure to start at
         data = self
         
-        # The individual key tokens
-        keys = token.split('.')
+        # The compiled key tokens (The empty token addresses the whole data domain)
+        steps = compileToken(token) or (TokenStep(KEY, '', None),)
+        
+        # Track the change of the data (Before changing it, as a failing change might leave it partially changed)
+        self.__touch(steps[0].key if steps[0].key != '' else None)
         
         # We reset and rebuild the token which then gets saved to the change log
         token = []
         
         # Try to find the key tokens in the nested dict structure or add them as new data
         try:
-            for index, key in enumerate(keys):
+            for index, step in enumerate(steps):
+                key = step.key
+                
                 # Get index position
                 index_next = index + 1
-                index_prev = index - 1
-                index_last = (len(keys) - index) == 1
+                index_last = (len(steps) - index) == 1
                 
                 # Set the value for the last key or use new dict
                 new_value = value if index_last else {}
                 
                 # Handle numeric keys
-                if key.isdigit() or key == '[]':
+                if step.kind in (INDEX, COLLECTION):
                     # Save the value as part of a collection (list)
                     if isinstance(data, list):
-                        if key == '[]':
+                        if step.kind == COLLECTION:
                             # Update token
                             token.append(str(len(data)))
                             # Append value at next index
@@ -354,7 +558,7 @@ class DataObject(dict):
                             # Update token
                             token.append(key)
                             # Fill list with empty values if it is too short
-                            key = int(key)
+                            key = step.index
                             if len(data) <= key:
                                 for _ in range(len(data), key + 1):
                                     data.append(None)
@@ -366,15 +570,16 @@ class DataObject(dict):
                     # Save the value as part of an object (dict)
                     elif isinstance(data, dict):
                         # Distinguish the next numeric key if we create a new item
-                        if key == '[]':
+                        if step.kind == COLLECTION:
                             try:
                                 key = str(sorted(list(map(int, data.keys()))).pop() + 1)
                             except:
                                 key = '0'
                         # Update token
                         token.append(key)
-                        # Add the value with the correct index key
-                        data.update({key: new_value})
+                        # Add the value with the correct index key (Keep an existing item when setting one of its values)
+                        if index_last or not isinstance(data.get(key), (dict, list)):
+                            data.update({key: new_value})
                     # Save the value in a new dictionary
                     else:
                         # Update token
@@ -404,7 +609,7 @@ class DataObject(dict):
                         break
                     else:
                         # Look ahead if the next key is a numeric identifier
-                        if keys[index_next].isdigit() or keys[index_next] == '[]':
+                        if steps[index_next].kind in (INDEX, COLLECTION):
                             if data.get(key) is None:
                                 data[key] = new_value
                             else:
@@ -425,5 +630,8 @@ class DataObject(dict):
         # Sets the data object as tainted (by adding the key token to the change log).
         self.setTainted(token)
         
-        # Return the result  
-        return True
\ No newline at end of file
+        # Update the indexes of the changed collection items
+        self.__reindex(token)
+        
+        # Return the resolved token (As several threads might set values, the token must not be stored in this object)
+        return token
\ No newline at end of file
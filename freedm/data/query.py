@@ -0,0 +1,286 @@
+'''
+This module defines queries filtering, sorting and projecting the items of data collections
+@author: Thomas Wanderer
+'''
+
+# Imports
+import heapq
+import operator
+import itertools
+from collections import namedtuple
+from typing import Callable, Iterator, Iterable, Optional, Tuple, List, Any
+
+# free.dm Imports
+from freedm.data.token import splitToken
+from freedm.data.index import Index
+
+
+QueryResult = namedtuple('QueryResult',
+    '''
+    token
+    value
+    '''
+    )
+
+
+Predicate = namedtuple('Predicate',
+    '''
+    field
+    operator
+    value
+    '''
+    )
+
+
+def contains(value: Any, item: Any) -> bool:
+    return isinstance(value, (str, list, dict)) and item in value
+
+
+def startswith(value: Any, prefix: str) -> bool:
+    return isinstance(value, str) and value.startswith(prefix)
+
+
+def endswith(value: Any, suffix: str) -> bool:
+    return isinstance(value, str) and value.endswith(suffix)
+
+
+# The comparison operators of predicates
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, values: value in values,
+    'contains': contains,
+    'startswith': startswith,
+    'endswith': endswith
+    }
+
+
+# A missing value of an item
+MISSING = object()
+
+
+def getField(item: Any, keys: Tuple[str, ...]) -> Any:
+    '''
+    Returns the value of a key token within an item
+    :param item: The item
+    :param tuple keys: The keys of the token
+    :returns: The value or py:data::MISSING
+    '''
+    for key in keys:
+        if isinstance(item, dict):
+            item = item.get(key, MISSING)
+        elif isinstance(item, list) and key.isdigit() and int(key) < len(item):
+            item = item[int(key)]
+        else:
+            return MISSING
+        if item is MISSING:
+            return MISSING
+    return item
+
+
+class Query(object):
+    '''
+    A query of the items of a collection (e.g. "user.active" or the rows "users" of a SQL store), built by chaining:
+
+        Query('user.active').where('age', '>=', 18).select('name').orderBy('age', descending=True).limit(10)
+
+    Queries run as a pipeline of generators over the collection, so no intermediate lists are built:
+    The items are filtered by all predicates at once, then sorted (Keeping only the first "limit" items
+    in a heap), then sliced and projected. If the data object has a secondary index of an "==" or
+    range predicate's key (See py:function::freedm.data.objects.DataObject.createIndex), only the
+    items found by the index are scanned. Stores can push queries down to their backend
+    (See py:function::freedm.data.store.DataStore._query).
+    Items missing a key do not match its predicates and are sorted last.
+    '''
+
+    def __init__(self, token: str):
+        '''
+        :param str token: The store token of the collection ("[]" addressing all items is optional)
+        '''
+        self.token = token[:-3] if token.endswith('.[]') else token
+        self.predicates: List[Predicate] = []
+        self.fields: Tuple[str, ...] = ()
+        self.order: List[Tuple[str, bool]] = []
+        self.count: Optional[int] = None
+        self.offset: int = 0
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.token} ({len(self.predicates)} predicates)>'
+
+    # Building
+    def where(self, field: str, op: str, value: Any) -> 'Query':
+        '''
+        Adds a predicate items must match
+        :param str field: The key token within the items
+        :param str op: The operator ("==", "!=", "<", "<=", ">", ">=", "in", "contains", "startswith" or "endswith")
+        :param value: The value to compare with
+        :returns: The query
+        '''
+        if op not in OPERATORS:
+            raise UserWarning(f'Invalid query operator "{op}"')
+        self.predicates.append(Predicate(field, op, value))
+        return self
+
+    def select(self, *fields: str) -> 'Query':
+        '''
+        Projects the items to some of their keys
+        :param str fields: The key tokens within the items
+        :returns: The query
+        '''
+        self.fields = tuple(fields)
+        return self
+
+    def orderBy(self, field: str, descending: bool=False) -> 'Query':
+        '''
+        Sorts the items (Further calls sort items with equal values)
+        :param str field: The key token within the items
+        :param bool descending: ``True`` to sort in descending order
+        :returns: The query
+        '''
+        self.order.append((field, descending))
+        return self
+
+    def limit(self, count: int, offset: int=0) -> 'Query':
+        '''
+        Limits the number of items
+        :param int count: The maximal number of items
+        :param int offset: The number of items to skip
+        :returns: The query
+        '''
+        self.count = count
+        self.offset = offset
+        return self
+
+    # Execution
+    def project(self, item: Any) -> Any:
+        '''
+        Projects an item to the selected keys
+        :param item: The item
+        :returns: The projected item (The item itself if no keys are selected)
+        '''
+        if not self.fields:
+            return item
+        values = {}
+        for field in self.fields:
+            value = getField(item, tuple(field.split('.')))
+            if value is not MISSING:
+                values[field] = value
+        return values
+
+    def __compilePredicates(self) -> Callable[[Any], bool]:
+        '''
+        Compiles the predicates into one test function
+        '''
+        tests = []
+        for field, op, value in self.predicates:
+            def test(item, keys=tuple(field.split('.')), compare=OPERATORS[op], value=value):
+                found = getField(item, keys)
+                if found is MISSING:
+                    return False
+                try:
+                    return compare(found, value)
+                except TypeError:
+                    return False
+            tests.append(test)
+        return lambda item: all(test(item) for test in tests)
+
+    def __scan(self, data: Any, collection: str) -> Iterator[Tuple[str, Any]]:
+        '''
+        Yields the (relative) tokens and the candidate items of the collection
+        '''
+        # Use a secondary index if available (Unless the index cannot hold the value, e.g. ``None``, lists or dicts)
+        for field, op, value in self.predicates:
+            index = data.getIndex(collection, field) if hasattr(data, 'getIndex') else None
+            if index is None or op not in ('==', '<', '<=', '>', '>=') or Index.getSortKey(value) is None:
+                continue
+            if op == '==':
+                tokens = index.find(value)
+            elif op in ('>', '>='):
+                tokens = index.range(low=value)
+            else:
+                tokens = index.range(high=value)
+            for token in tokens:
+                token = token.lstrip('.')
+                try:
+                    yield token, data.getValue(token)
+                except LookupError:
+                    pass
+            return
+
+        # Otherwise scan the collection
+        try:
+            items = data.getValue(collection) if collection else data
+        except LookupError:
+            return
+        prefix = f'{collection}.' if collection else ''
+        if isinstance(items, dict):
+            for key, item in items.items():
+                yield f'{prefix}{key}', item
+        elif isinstance(items, list):
+            for key, item in enumerate(items):
+                yield f'{prefix}{key}', item
+
+    def __sort(self, results: Iterable[QueryResult]) -> Iterable[QueryResult]:
+        '''
+        Sorts the results (Keeping only the first "offset + limit" results if limited)
+        '''
+        def sortKey(field: str, descending: bool) -> Callable[[QueryResult], Tuple]:
+            keys = tuple(field.split('.'))
+            def key(result):
+                value = getField(result.value, keys)
+                # Missing values last, numbers before strings, anything else compared by its text
+                if value is MISSING or value is None:
+                    return (0,) if descending else (3,)
+                if isinstance(value, (int, float)):
+                    return (1, value)
+                return (2, value if isinstance(value, str) else str(value))
+            return key
+        keys = [sortKey(field, descending) for field, descending in self.order]
+        directions = {descending for _field, descending in self.order}
+
+        # One sort direction: Sort by a combined key (In a heap if limited)
+        if len(directions) == 1:
+            descending = directions.pop()
+            combined = lambda result: tuple(key(result) for key in keys)
+            if self.count is not None:
+                select = heapq.nlargest if descending else heapq.nsmallest
+                return select(self.offset + self.count, results, key=combined)
+            return sorted(results, key=combined, reverse=descending)
+
+        # Mixed sort directions: Sort stable by each key, starting with the least significant one
+        results = list(results)
+        for key, (_field, descending) in reversed(list(zip(keys, self.order))):
+            results.sort(key=key, reverse=descending)
+        return results
+
+    def execute(self, data: Any) -> Iterator[QueryResult]:
+        '''
+        Runs the query over a domain's data object
+        :param py:class::freedm.data.objects.DataObject data: The data object of the query token's domain
+        :returns: The store tokens and the (projected) values of the matching items
+        :rtype: iterator
+        '''
+        domain, collection = splitToken(self.token)
+        return self.run(self.__scan(data, collection), domain)
+
+    def run(self, items: Iterable[Tuple[str, Any]], prefix: str) -> Iterator[QueryResult]:
+        '''
+        Runs the query over a stream of items (e.g. the rows read from a database cursor)
+        :param iterable items: The tokens and the items
+        :param str prefix: The token prefixed to the tokens of the items (e.g. the domain)
+        :returns: The store tokens and the (projected) values of the matching items
+        :rtype: iterator
+        '''
+        test = self.__compilePredicates()
+        results = (QueryResult(f'{prefix}.{token}', item) for token, item in items if test(item))
+        if self.order:
+            results = self.__sort(results)
+        if self.offset or self.count is not None:
+            results = itertools.islice(results, self.offset, None if self.count is None else self.offset + self.count)
+        for token, item in results:
+            yield QueryResult(token, self.project(item))
@@ -0,0 +1,277 @@
+'''
+This module defines a binary snapshot format for data domains, which is memory-mapped on loading and deserialized lazily
+@author: Thomas Wanderer
+'''
+
+# Imports
+import os
+import copy
+import json
+import mmap
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Union, Tuple, Dict, Any
+
+# free.dm Imports
+from freedm.data.object import DataObject
+
+
+# The snapshot header: Magic, format version, offset of the root node and length of the source signature
+HEADER = struct.Struct('<4sHQI')
+MAGIC = b'FDMS'
+VERSION = 1
+
+# The nodes: A dictionary (its key count, then per key the key length, the key and the offset of the value node)
+# or a JSON encoded value (its length and the JSON data)
+DICT = b'D'
+VALUE = b'J'
+COUNT = struct.Struct('<I')
+ENTRY = struct.Struct('<IQ')
+
+
+def writeSnapshot(path: Union[str, Path], data: Dict[str, Any], source: str='') -> None:
+    '''
+    Writes the data of a domain as snapshot file (atomically replacing an existing snapshot). Each dictionary
+    is written as node which is deserialized on its own on first access, any other value as JSON.
+    :param str path: The snapshot file
+    :param dict data: The data
+    :param str source: An optional signature of the data source (e.g. the hash of the file the data was read from)
+    '''
+    path = Path(path)
+    source = source.encode()
+    body = bytearray()
+    start = HEADER.size + len(source)
+
+    # Write the child nodes before their parent node, so the parent knows their offsets
+    def writeNode(value: Any) -> int:
+        if isinstance(value, dict):
+            entries = [(str(key).encode(), writeNode(item)) for key, item in value.items()]
+            offset = start + len(body)
+            body.extend(DICT + COUNT.pack(len(entries)))
+            for key, child in entries:
+                body.extend(ENTRY.pack(len(key), child) + key)
+        else:
+            content = json.dumps(value, separators=(',', ':')).encode()
+            offset = start + len(body)
+            body.extend(VALUE + COUNT.pack(len(content)) + content)
+        return offset
+    root = writeNode(dict(data.items()))
+
+    # Replace the snapshot atomically
+    handle, temporary = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, root, len(source)) + source)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class Snapshot(object):
+    '''
+    A memory-mapped snapshot file. The mapping stays valid while lazy data refers to it, even if the
+    snapshot file gets replaced in the meantime.
+    '''
+
+    def __init__(self, path: Union[str, Path]):
+        '''
+        :param str path: The snapshot file
+        '''
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        with open(self.path, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.root, length = HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise UserWarning(f'Invalid snapshot file "{self.path}"')
+        self.source = self.__map[HEADER.size:HEADER.size + length].decode()
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.path}>'
+
+    def readEntries(self, offset: int) -> Iterator[Tuple[str, int]]:
+        '''
+        Reads the keys of a dictionary node and the offsets of their values
+        :param int offset: The offset of the node
+        :returns: The keys and value offsets
+        :rtype: iterator
+        '''
+        if self.__map[offset:offset + 1] != DICT:
+            raise UserWarning(f'No dictionary node at offset {offset} of snapshot "{self.path}"')
+        count, = COUNT.unpack_from(self.__map, offset + 1)
+        position = offset + 1 + COUNT.size
+        for _ in range(count):
+            length, child = ENTRY.unpack_from(self.__map, position)
+            position += ENTRY.size
+            yield self.__map[position:position + length].decode(), child
+            position += length
+
+    def readValue(self, offset: int) -> Any:
+        '''
+        Reads a node (A dictionary node as lazy dictionary)
+        :param int offset: The offset of the node
+        :returns: The value
+        '''
+        kind = self.__map[offset:offset + 1]
+        if kind == DICT:
+            return LazyDict(self, offset)
+        length, = COUNT.unpack_from(self.__map, offset + 1)
+        start = offset + 1 + COUNT.size
+        return json.loads(self.__map[start:start + length])
+
+
+class Pending(object):
+    '''
+    The placeholder of a value not yet read from a snapshot
+    '''
+    __slots__ = ('offset',)
+
+    def __init__(self, offset: int):
+        self.offset = offset
+
+
+class LazyDict(dict):
+    '''
+    A dictionary read from a snapshot. Its keys are known immediately, but each value is deserialized
+    only on its first access. Any access to the values (e.g. iterating its items, copying or comparing it)
+    deserializes them first, so the placeholders of pending values never leave the dictionary.
+    '''
+
+    def __init__(self, snapshot: Snapshot, offset: int):
+        '''
+        :param py:class::Snapshot snapshot: The snapshot
+        :param int offset: The offset of the dictionary node
+        '''
+        dict.__init__(self)
+        self._load(snapshot, offset)
+
+    def _load(self, snapshot: Snapshot, offset: int) -> None:
+        '''
+        Sets the keys of a dictionary node with placeholders for their values
+        '''
+        self._snapshot = snapshot
+        for key, child in snapshot.readEntries(offset):
+            dict.__setitem__(self, key, Pending(child))
+
+    def _materialize(self, key: Any=None) -> None:
+        '''
+        Deserializes a pending value (By default all pending values)
+        '''
+        keys = [key] if key is not None else list(dict.keys(self))
+        for key in keys:
+            value = dict.get(self, key)
+            if isinstance(value, Pending):
+                with self._snapshot.lock:
+                    value = dict.get(self, key)
+                    if isinstance(value, Pending):
+                        dict.__setitem__(self, key, self._snapshot.readValue(value.offset))
+
+    @property
+    def pending(self) -> int:
+        '''The number of values not yet deserialized'''
+        return sum(1 for value in dict.values(self) if isinstance(value, Pending))
+
+    def __getitem__(self, key):
+        self._materialize(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._materialize(key)
+        return super().get(key, default)
+
+    def pop(self, key, *args):
+        self._materialize(key)
+        return super().pop(key, *args)
+
+    def setdefault(self, key, default=None):
+        self._materialize(key)
+        return super().setdefault(key, default)
+
+    def popitem(self):
+        self._materialize()
+        return super().popitem()
+
+    def items(self):
+        self._materialize()
+        return super().items()
+
+    def values(self):
+        self._materialize()
+        return super().values()
+
+    def __iter__(self):
+        # Defining the iterator prevents merging the placeholders by dict.update() or dict()
+        return super().__iter__()
+
+    def copy(self):
+        self._materialize()
+        return dict(super().items())
+
+    def __eq__(self, other):
+        self._materialize()
+        if isinstance(other, LazyDict):
+            other._materialize()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __or__(self, other):
+        return self.copy() | other
+
+    def __repr__(self):
+        self._materialize()
+        return super().__repr__()
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+class LazyDataObject(LazyDict, DataObject):
+    '''
+    A data object read from a memory-mapped snapshot. The data is deserialized subtree by subtree on first
+    access (See py:class::LazyDict), so large domains are available immediately after loading.
+    '''
+
+    def __init__(self, snapshot: Snapshot, backend: str=None, handle: Any=None):
+        '''
+        :param py:class::Snapshot snapshot: The snapshot
+        :param str backend: The backend descriptor of the data object
+        :param handle: An optional IO handle of the data object
+        '''
+        DataObject.__init__(self, backend=backend, handle=handle)
+        self._load(snapshot, snapshot.root)
+
+    def __deepcopy__(self, memo):
+        return DataObject(backend=self._backend, **LazyDict.__deepcopy__(self, memo))
+
+
+def readSnapshot(path: Union[str, Path], source: str=None, backend: str=None) -> Optional[LazyDataObject]:
+    '''
+    Memory-maps a snapshot file as lazy data object
+    :param str path: The snapshot file
+    :param str source: The expected signature of the data source (The snapshot is ignored if it was written from another source)
+    :param str backend: The backend descriptor of the data object
+    :returns: The data object (``None`` if no valid snapshot exists)
+    :rtype: py:class::LazyDataObject
+    '''
+    try:
+        snapshot = Snapshot(path)
+    except (FileNotFoundError, ValueError, struct.error, UserWarning):
+        return None
+    if source is not None and snapshot.source != source:
+        return None
+    return LazyDataObject(snapshot, backend=backend)
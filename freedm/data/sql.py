@@ -3,9 +3,197 @@ This module provides a DataStore based on a SQL database
 @author: Thomas Wanderer
 '''
 
+# Imports
+import re
+import json
+import queue
+import sqlite3
+import threading
+import functools
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple, List, Dict, Any, Type
+
 # free.dm Imports
 from freedm.data.store import DataStore
 from freedm.data.object import DataObject
+from freedm.data.token import compileToken, joinSteps, splitToken, INDEX, COLLECTION, WILDCARD
+from freedm.data.query import Query, QueryResult
+
+
+# The declared column types by Python type (Any other value is stored JSON encoded)
+COLUMN_TYPES = ((bool, 'BOOLEAN'), (int, 'INTEGER'), (float, 'REAL'), (str, 'TEXT'), (bytes, 'BLOB'))
+
+
+# The SQL conditions of query operators and their number of parameters (Text operators are only pushed down for text columns)
+CONDITIONS = {
+    '==': ('{column} = ?', 1),
+    '!=': ('{column} != ?', 1),
+    '<': ('{column} < ?', 1),
+    '<=': ('{column} <= ?', 1),
+    '>': ('{column} > ?', 1),
+    '>=': ('{column} >= ?', 1),
+    'startswith': ('substr({column}, 1, length(?)) = ?', 2),
+    'endswith': ('substr({column}, -length(?)) = ?', 2),
+    'contains': ('instr({column}, ?) > 0', 1)
+    }
+
+
+class ConnectionPool(object):
+    '''
+    A small pool of SQLite connections. Connections are opened on demand up to the pool size and
+    are reused afterwards. Each connection writes in WAL journal mode, so readers do not block the
+    writer, and keeps a cache of its prepared statements.
+    '''
+
+    def __init__(self, database: str, size: int=4, timeout: float=10.0, statements: int=256):
+        '''
+        :param str database: The database file (or ":memory:")
+        :param int size: The maximal number of connections
+        :param float timeout: The number of seconds to wait for a connection or a database lock
+        :param int statements: The number of prepared statements cached per connection
+        '''
+        self.database   = str(database)
+        self.size       = 1 if self.database == ':memory:' else max(1, size)
+        self.timeout    = timeout
+        self.statements = statements
+        self.__idle     = queue.LifoQueue()
+        self.__slots    = threading.BoundedSemaphore(self.size)
+        self.__closed   = False
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.database} ({self.size} connections)>'
+
+    def __open(self) -> sqlite3.Connection:
+        '''
+        Opens a new connection (In autocommit mode, transactions are started explicitly)
+        '''
+        connection = sqlite3.connect(self.database, timeout=self.timeout, isolation_level=None, check_same_thread=False, cached_statements=self.statements)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        '''
+        Borrows a connection from the pool
+        '''
+        if self.__closed:
+            raise UserWarning(f'Connection pool of database "{self.database}" is closed')
+        if not self.__slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f'No connection to database "{self.database}" available')
+        try:
+            try:
+                connection = self.__idle.get_nowait()
+            except queue.Empty:
+                connection = self.__open()
+            try:
+                yield connection
+            finally:
+                if self.__closed:
+                    connection.close()
+                else:
+                    self.__idle.put(connection)
+        finally:
+            self.__slots.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        '''
+        Borrows a connection and runs a write transaction, which is committed on success and rolled back on any error
+        '''
+        with self.connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            else:
+                connection.execute('COMMIT')
+
+    def close(self) -> None:
+        '''
+        Closes all idle connections (Borrowed connections are closed when returned)
+        '''
+        self.__closed = True
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@functools.lru_cache(maxsize=1024)
+def quoteIdentifier(identifier: str) -> str:
+    '''
+    Quotes a table or column name. Only alphanumeric names are accepted, as names are taken from key tokens.
+    :param str identifier: The table or column name
+    :returns: The quoted identifier
+    :rtype: str
+    '''
+    if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', identifier):
+        raise UserWarning(f'Invalid SQL table or column name "{identifier}"')
+    return f'"{identifier}"'
+
+
+@functools.lru_cache(maxsize=1024)
+def getSelectStatement(table: str, column: str=None, row: bool=False) -> str:
+    '''
+    Returns the (cached) statement selecting the rows or a column of a table
+    :param str table: The table
+    :param str column: An optional column (By default all columns)
+    :param bool row: ``True`` to select only the row with a given ID
+    :returns: The SQL statement
+    :rtype: str
+    '''
+    columns = f'"id", {quoteIdentifier(column)}' if column else '*'
+    condition = ' WHERE "id" = ?' if row else ''
+    return f'SELECT {columns} FROM {quoteIdentifier(table)}{condition} ORDER BY "id"'
+
+
+@functools.lru_cache(maxsize=1024)
+def getUpsertStatement(table: str, columns: Tuple[str, ...]) -> str:
+    '''
+    Returns the (cached) statement inserting a row or updating the given columns of an existing row
+    :param str table: The table
+    :param tuple columns: The columns
+    :returns: The SQL statement
+    :rtype: str
+    '''
+    names = ''.join(f', {quoteIdentifier(column)}' for column in columns)
+    placeholders = ', ?' * len(columns)
+    if columns:
+        update = 'UPDATE SET ' + ', '.join(f'{quoteIdentifier(column)} = excluded.{quoteIdentifier(column)}' for column in columns)
+    else:
+        update = 'NOTHING'
+    return f'INSERT INTO {quoteIdentifier(table)} ("id"{names}) VALUES (?{placeholders}) ON CONFLICT ("id") DO {update}'
+
+
+@functools.lru_cache(maxsize=256)
+def getQueryStatement(table: str, columns: Tuple[str, ...], conditions: Tuple[Tuple[str, str, int], ...], order: Tuple[Tuple[str, bool], ...], limited: bool) -> str:
+    '''
+    Returns the (cached) statement running a query. Rows with NULL values are sorted last as by py:class::freedm.data.query.Query.
+    :param str table: The table
+    :param tuple columns: The selected columns (By default all columns)
+    :param tuple conditions: The column, the operator and the number of compared values (of "in" conditions) of each condition
+    :param tuple order: The column and the direction of each sort key (``True`` if descending)
+    :param bool limited: ``True`` if the rows are limited (by a row count and an offset)
+    :returns: The SQL statement
+    :rtype: str
+    '''
+    names = ', '.join(['"id"', *[quoteIdentifier(column) for column in columns]]) if columns else '*'
+    clauses = []
+    for column, op, count in conditions:
+        if op == 'in':
+            clauses.append(f'{quoteIdentifier(column)} IN ({", ".join("?" * count)})')
+        else:
+            clauses.append(CONDITIONS[op][0].format(column=quoteIdentifier(column)))
+    where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+    sorting = ''.join(f'{quoteIdentifier(column)} IS NULL, {quoteIdentifier(column)} {"DESC" if descending else "ASC"}, ' for column, descending in order)
+    limit = ' LIMIT ? OFFSET ?' if limited else ''
+    return f'SELECT {names} FROM {quoteIdentifier(table)}{where} ORDER BY {sorting}"id"{limit}'
 
 
 class SQLStore(DataStore):
@@ -13,49 +201,397 @@ class SQLStore(DataStore):
     A data store which reads and writes its data from and to a SQL Database.
     This store translates tokens into tables and rows. Data tokens therefore must be
     of a minimal length of one token and will be dissected into "db_table" and "db_table_column".
-    Any further subtokens will lead to a try to deserialize the found column data as JSON and 
+    Any further subtokens will lead to a try to deserialize the found column data as JSON and
     look up the token within this data structure.
-    
+
     Examples:
     - store.getValue('users') will return all user objects in the db_table "users"
     - store.getValue('users.name') will return all user names from the db_table "users" column "name"
-    - store.getValue('users.settings.key') will try to deserialize the data as JSON from the db_table "users" column "data" and return the element "key"
+    - store.getValue('users.name.key') will try to deserialize the data as JSON from the db_table "users" column "name" of all users and return their elements "key"
     - store.getValue('users.45') will return the user's data with id=45 from the db_table "users"
     - store.getValue('users.45.name') will return the name of the user with id=45 from the db_table "users" column "name"
-    
-    This store supports the synced mode to autoload a DB table's data and to be 
-    notified when changes are written to the database.
+    - store.getValue('users.45.settings.key') will return the element "key" of the JSON data in column "settings" of the user with id=45
+
+    Each data domain is a table with an integer primary key "id". Tables and columns are created when values
+    are set for the first time. Structured values (dictionaries and lists) are stored as JSON encoded columns.
+    Rows and columns are never deleted by setting values.
+
+    In synced mode a domain's table is loaded entirely and each value set is written to the database immediately.
+    Otherwise domains are loaded empty and values are read through from the database on access, so tables may hold
+    far more data than is kept in memory. Syncing a domain writes all changed rows and columns in one transaction.
+    Queries of whole tables (See py:class::freedm.data.query.Query) are translated into SQL statements, so the
+    rows are filtered, sorted and limited by the database. Predicates not translatable into SQL are checked
+    on the rows streamed from the database cursor.
+    Only SQLite databases are supported yet.
     '''
     # Attributes
     _persistent: bool = True
     _writable: bool = True
-    _default_name: str = 'pgSQL'
-    description: str = 'A persistent PostgreSQL database store'
-    
-    # Set up a file monitoring observer
-    def __init__(self, *args, address: str=None, port: int=None, user: str=None, password: str=None, **kwargs):
-        '''
-        Creates a new instance of a INI file based data store. This class supports
-        a default dynamic reading/writing of INI files or keeping the datastore with its
-        file backend in sync at all time making manual syncs unnecessary.
+    _default_name: str = 'SQL'
+    _default_filetype: str = 'sqlite'
+    description: str = 'A persistent SQL database store'
+
+    # The database and the declared column types by table
+    __database: str = None
+    __schema: Dict[str, Dict[str, str]] = None
+    __schema_lock: threading.RLock = None
+    __pool_size: int = 4
+
+    # Set up the database connection
+    def __init__(self, *args, database: str=None, pool: int=None, address: str=None, port: int=None, user: str=None, password: str=None, **kwargs):
+        '''
+        Creates a new instance of a SQL database based data store.
+        :param database str: The database file (By default "<alias>.<filetype>" in the store's path or an in-memory database without path)
+        :param pool int: The maximal number of database connections
         :param address str: The address of the database
         :param port int: The port of the database
         :param user str: The database user's name
         :param password str: The database user's password
-        ''' 
+        '''
+        self.__database = database
+        self.__schema = {}
+        self.__schema_lock = threading.RLock()
+        if isinstance(pool, int):
+            self.__pool_size = pool
+        self.address = address
+        self.port = port
+        self.user = user
+        self.password = password
+
         # Init the store
         super().__init__(*args, **kwargs)
-        
-        # Unset path information
-        self.path = False
-        
+
         # Create database connection
         if self.synced:
             self.__connect()
-            
-    def __connect(self) -> None:
+
+    @property
+    def database(self) -> str:
+        '''The database file'''
+        if self.__database:
+            return str(self.__database)
+        elif self.path:
+            return str(Path(self.path).joinpath(f'{self.alias.lower()}.{self.filetype}'))
+        return ':memory:'
+
+    def __connect(self) -> ConnectionPool:
+        '''
+        Opens the database and sets the iohandle
+        '''
+        with self.__schema_lock:
+            if self._iohandle is None:
+                self._iohandle = ConnectionPool(self.database, size=self.__pool_size)
+                self.logger.debug(f'Opened database "{self.database}" of store "{self}"')
+            return self._iohandle
+
+    # Table schema
+    def __getColumns(self, table: str, connection: sqlite3.Connection=None) -> Dict[str, str]:
+        '''
+        Returns the (cached) declared types of the columns of a table
+        :param str table: The table
+        :param sqlite3.Connection connection: An optional connection to use
+        :returns: The column types by column (Empty if the table does not exist)
+        :rtype: dict
+        '''
+        with self.__schema_lock:
+            columns = self.__schema.get(table)
+            if columns is None:
+                statement = f'PRAGMA table_info({quoteIdentifier(table)})'
+                if connection is None:
+                    with self.__connect().connection() as connection:
+                        rows = connection.execute(statement).fetchall()
+                else:
+                    rows = connection.execute(statement).fetchall()
+                columns = {row[1]: (row[2] or '').upper() for row in rows}
+                # Tables not yet existing might be created by other connections
+                if columns:
+                    self.__schema[table] = columns
+            return columns
+
+    def __addColumns(self, connection: sqlite3.Connection, table: str, values: Dict[str, Any]) -> None:
+        '''
+        Creates a table and its missing columns (Typed by the values to be stored) within a write transaction
+        '''
+        with self.__schema_lock:
+            columns = self.__getColumns(table, connection)
+            if not columns:
+                connection.execute(f'CREATE TABLE IF NOT EXISTS {quoteIdentifier(table)} ("id" INTEGER PRIMARY KEY)')
+                columns = self.__schema[table] = {'id': 'INTEGER'}
+            for column, value in values.items():
+                if column not in columns:
+                    kind = next((kind for cls, kind in COLUMN_TYPES if isinstance(value, cls)), 'JSON')
+                    connection.execute(f'ALTER TABLE {quoteIdentifier(table)} ADD COLUMN {quoteIdentifier(column)} {kind}')
+                    columns[column] = kind
+
+    @staticmethod
+    def __encode(value: Any) -> Any:
+        '''
+        Converts a value to a column value
+        '''
+        if isinstance(value, bool):
+            return int(value)
+        elif isinstance(value, (dict, list, tuple)):
+            return json.dumps(value)
+        return value
+
+    @staticmethod
+    def __decode(value: Any, kind: str) -> Any:
+        '''
+        Converts a column value back by its declared column type
+        '''
+        if value is None:
+            return None
+        elif kind == 'JSON' and isinstance(value, str):
+            return json.loads(value)
+        elif kind == 'BOOLEAN':
+            return bool(value)
+        return value
+
+    def __decodeRow(self, row: Tuple[Any, ...], names: List[str], columns: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        '''
+        Converts a selected row to its ID and its column values (NULL columns are left out)
+        '''
+        values = {name: self.__decode(value, columns.get(name, '')) for name, value in zip(names, row) if value is not None}
+        return values.pop('id'), values
+
+    @staticmethod
+    def __getTable(domain: DataObject) -> str:
+        '''
+        Returns the table of a domain data object (Its backend is "<database>#<table>")
+        '''
+        return domain._backend.rpartition('#')[2]
+
+    # Implement data setters & getter
+    def _setRaw(self, domain: Type[DataObject], token: str, value: Any) -> bool:
+        return self._setRawBatch(domain, {token: value})
+
+    def _setRawBatch(self, domain: Type[DataObject], values: Dict[str, Any]) -> bool:
+        # Collect the columns to be set by row ID and the changes within JSON columns
+        table = self.__getTable(domain)
+        rows: Dict[int, Dict[str, Any]] = {}
+        patches: List[Tuple[int, str, str, Any]] = []
+        for token, value in values.items():
+            steps = compileToken(token)
+            if not steps:
+                for row, data in value.items():
+                    rows.setdefault(int(row), {}).update(data)
+            elif steps[0].kind != INDEX:
+                raise UserWarning(f'Cannot set value "{token}" (Tokens must start with a row ID)')
+            elif len(steps) == 1:
+                if not isinstance(value, dict):
+                    raise UserWarning(f'Cannot set value "{token}" (Rows must be dictionaries)')
+                rows.setdefault(steps[0].index, {}).update(value)
+            elif len(steps) == 2:
+                rows.setdefault(steps[0].index, {})[steps[1].key] = value
+            else:
+                patches.append((steps[0].index, steps[1].key, joinSteps(steps[2:]), value))
+
+        # Write all values in one transaction
+        try:
+            with self.__connect().transaction() as connection:
+                columns = self.__getColumns(table, connection)
+
+                # Apply the changes within JSON columns to their current data
+                for row, column, subtoken, value in patches:
+                    data = rows.setdefault(row, {})
+                    if column not in data:
+                        current = None
+                        if column in columns:
+                            result = connection.execute(getSelectStatement(table, column, True), (row,)).fetchone()
+                            current = self.__decode(result[1], columns[column]) if result else None
+                        data[column] = current if isinstance(current, (dict, list)) else {}
+                    holder = DataObject(value=data[column])
+                    if not holder.setValue(f'value.{subtoken}', value):
+                        raise UserWarning(f'Cannot set value "{row}.{column}.{subtoken}"')
+                    data[column] = holder['value']
+
+                # Upsert the rows grouped by their set of columns, so each statement is prepared once
+                statements: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+                for row, data in rows.items():
+                    self.__addColumns(connection, table, data)
+                    names = tuple(sorted(data))
+                    statements.setdefault(names, []).append((row, *[self.__encode(data[name]) for name in names]))
+                for names, parameters in statements.items():
+                    connection.executemany(getUpsertStatement(table, names), parameters)
+        except BaseException:
+            # The schema changes have been rolled back as well
+            with self.__schema_lock:
+                self.__schema.pop(table, None)
+            raise
+        return True
+
+    def _getRaw(self, domain: Type[DataObject], token: str) -> Any:
+        table = self.__getTable(domain)
+        steps = compileToken(token)
+        # "[].name" addresses the same values as "name"
+        if steps and steps[0].kind == COLLECTION:
+            steps = steps[1:]
+        columns = self.__getColumns(table)
+        if not columns:
+            raise LookupError(f'Table "{table}" does not exist')
+
+        # Select a row or a column of a row by its ID
+        if steps and steps[0].kind == INDEX:
+            column = steps[1].key if len(steps) > 1 else None
+            if column is not None and column not in columns:
+                raise LookupError(f'Column "{column}" does not exist in table "{table}"')
+            with self.__connect().connection() as connection:
+                cursor = connection.execute(getSelectStatement(table, column, True), (steps[0].index,))
+                names = [description[0] for description in cursor.description]
+                result = cursor.fetchone()
+            if result is None:
+                raise LookupError(f'Row "{steps[0].index}" does not exist in table "{table}"')
+            _row, data = self.__decodeRow(result, names, columns)
+            if column is None:
+                return data
+            return DataObject().getValue(joinSteps(steps[2:]), data=data.get(column))
+
+        # Select a column of all rows (as list) or all rows (by ID)
+        column = steps[0].key if steps and steps[0].kind != WILDCARD else None
+        if column is not None and column not in columns:
+            raise LookupError(f'Column "{column}" does not exist in table "{table}"')
+        with self.__connect().connection() as connection:
+            cursor = connection.execute(getSelectStatement(table, column))
+            names = [description[0] for description in cursor.description]
+            results = cursor.fetchall()
+        rows = dict(self.__decodeRow(result, names, columns) for result in results)
+        if column is None:
+            if not steps:
+                return {str(row): data for row, data in rows.items()}
+            subtoken = joinSteps(steps[1:])
+            values = {}
+            for row, data in rows.items():
+                try:
+                    values[str(row)] = DataObject().getValue(subtoken, data=data)
+                except LookupError:
+                    pass
+            return values
+        subtoken = joinSteps(steps[1:])
+        values = []
+        for data in rows.values():
+            if column in data:
+                try:
+                    values.append(DataObject().getValue(subtoken, data=data[column]))
+                except (LookupError, TypeError):
+                    pass
+        return values
+
+    def _query(self, domain: Type[DataObject], query: Query) -> Optional[List[QueryResult]]:
+        # Only queries of whole tables are run by the database
+        _domain, collection = splitToken(query.token)
+        if collection:
+            return None
+        table = self.__getTable(domain)
+        columns = self.__getColumns(table)
+        if not columns:
+            return None
+
+        # Translate the predicates into conditions. Predicates on JSON data or with values compared differently
+        # than in Python are not pushed down, but checked on the streamed rows (as all rows if changes are not yet synced)
+        tainted = bool(domain.getTainted())
+        conditions = []
+        parameters = []
+        complete = not tainted
+        for field, op, value in query.predicates if not tainted else ():
+            # The row ID is not part of the items
+            kind = columns.get(field.split('.', 1)[0]) if field != 'id' else None
+            if kind is None:
+                # Items without the key never match
+                return []
+            elif kind == 'JSON' or '.' in field:
+                complete = False
+            elif op == 'in':
+                values = list(value) if isinstance(value, (list, tuple, set)) else None
+                if not values or any(not isinstance(item, (str, int, float)) for item in values):
+                    complete = False
+                    continue
+                conditions.append((field, op, len(values)))
+                parameters.extend(self.__encode(item) for item in values)
+            elif op in ('startswith', 'endswith', 'contains'):
+                if kind != 'TEXT' or not isinstance(value, str) or not value:
+                    complete = False
+                    continue
+                conditions.append((field, op, 1))
+                parameters.extend([value] * CONDITIONS[op][1])
+            elif value is None or (kind == 'TEXT') != isinstance(value, str) or (kind == 'BLOB') != isinstance(value, bytes):
+                complete = False
+            else:
+                conditions.append((field, op, 1))
+                parameters.append(self.__encode(value))
+        complete = complete and all(columns.get(field, 'JSON') != 'JSON' for field, _descending in query.order)
+
+        # Sort, limit and project the rows in the database if all predicates were pushed down
+        order = ()
+        limited = False
+        selected = ()
+        if complete:
+            order = tuple(query.order)
+            limited = query.count is not None or bool(query.offset)
+            if limited:
+                parameters.extend([-1 if query.count is None else query.count, query.offset])
+            if query.fields:
+                selected = tuple(sorted({field.split('.', 1)[0] for field in query.fields} & set(columns) - {'id'}))
+        statement = getQueryStatement(table, selected, tuple(conditions), order, limited)
+        with self.__connect().connection() as connection:
+            cursor = connection.execute(statement, parameters)
+            names = [description[0] for description in cursor.description]
+            rows = (self.__decodeRow(result, names, columns) for result in cursor)
+            if complete:
+                return [QueryResult(f'{table}.{row}', query.project(data)) for row, data in rows]
+            elif tainted:
+                rows = self.__overlayRows(domain, rows)
+            return list(query.run(((str(row), data) for row, data in rows), table))
+
+    @staticmethod
+    def __overlayRows(domain: DataObject, rows: Iterator[Tuple[int, Dict[str, Any]]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
         '''
-        Opens the database and sets the fshandle
+        Merges the streamed rows with the (not yet synced) rows of a domain data object
         '''
+        stored = set()
+        for row, data in rows:
+            stored.add(str(row))
+            changed = domain.get(str(row))
+            yield row, {**data, **changed} if isinstance(changed, dict) else data
+        # Rows not yet written
+        for row, data in list(domain.items()):
+            if row not in stored and isinstance(data, dict) and str(row).isdigit():
+                yield int(row), data
+
+    # Implement domain loading and unloading
+    def _loadDomain(self, domain: str, path: str) -> None:
+        # Each domain is a table. In synced mode load the whole table, otherwise values are read through on access
+        rows = {}
+        if self.synced:
+            columns = self.__getColumns(domain)
+            if columns:
+                with self.__connect().connection() as connection:
+                    cursor = connection.execute(getSelectStatement(domain))
+                    names = [description[0] for description in cursor.description]
+                    for result in cursor:
+                        row, values = self.__decodeRow(result, names, columns)
+                        rows[str(row)] = values
+        return DataObject(backend=f'{self.database}#{domain}', **rows)
+
+    def _unloadDomain(self, domain: str, path: str) -> None:
+        # The table stays in the database
         pass
-        #self.fshandle = 
\ No newline at end of file
+
+    def _syncDomain(self, domain: Type[DataObject], path: str) -> None:
+        # Write all changed rows and columns in one transaction
+        tainted = domain.getTainted(reset=True)
+        values = {}
+        for token in tainted:
+            token = '' if token == '*' else token
+            steps = compileToken(token)
+            if steps and steps[0].kind != INDEX:
+                self.logger.warn(f'Cannot sync value "{token}" of data domain "{self.__getTable(domain)}" (Tokens must start with a row ID)')
+                continue
+            values[token] = domain.getValue(token)
+        try:
+            if values:
+                self._setRawBatch(domain, values)
+        except Exception:
+            # Keep the changes to be synced again
+            for token in values:
+                domain.setTainted(token)
+            raise
@@ -7,17 +7,32 @@ This module defines a generic data store
 import os
 import logging
 import asyncio
-import uvloop
+import threading
+import contextvars
+import concurrent.futures
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Union, Tuple, List, Dict, Any, Type
+from typing import Callable, Optional, Union, Tuple, List, Dict, Set, Any, Type, Iterable, Iterator
 from logging import Logger
 
 # free.dm Imports
 from freedm import models
 from freedm.data.object import DataObject
-from freedm.utils.aio import runConcurrently
+from freedm.data.token import splitToken
+from freedm.data.sync import SyncScheduler
+from freedm.data.cache import ValueCache
+from freedm.data.query import Query, QueryResult
+from freedm.data.notify import ChangeNotifier, Subscription
+from freedm.utils.aio import run_concurrently, get_io_executor, IOExecutor, IOExecutorGroup
+
+
+class StagedValues(dict):
+    '''
+    The values staged by a transaction by key token. Tasks created within the transaction share these values,
+    but once the transaction exits it is closed, so the values these tasks set later are not staged anymore.
+    '''
+    closed: bool = False
 
 
 class DataStore(object):
@@ -37,6 +52,20 @@ class DataStore(object):
     # Sync strategy
     _sync_parallel: bool = True       # Data domains should be simultaneously synced => True or sequentially => False
     _sync_max_threads: int = 10      # The max number of parallel sync operations/threads if parallel sync is enabled
+    _sync_delay: float = 1.0          # Write-behind: Sync a changed domain after this number of seconds without further changes
+    _sync_threshold: int = 100        # Write-behind: Sync a changed domain after this number of changes
+    _sync_staleness: float = 10.0     # Write-behind: Sync a changed domain at the latest this number of seconds after its first change
+    
+    # Validation strategy
+    _validate_strict: bool = False    # Validate each value read => True or only values which changed since their last validation => False
+    
+    # Read-through cache of raw backend values (if enabled)
+    _cache_ttl: float = 60.0          # Cache raw values for this number of seconds
+    _cache_size: int = 1024           # Cache at most this number of raw values (Evicting the least recently used value)
+    _cache_negative: bool = True      # Cache also tokens not found in the backend
+    
+    # Change notifications
+    _notify_max_threads: int = 4      # The max number of threads calling subscribers without asyncio loop (Apart from the backend IO threads)
     
     @property
     def path(self) -> Optional[Path]:
@@ -130,6 +159,17 @@ class DataStore(object):
     def synced(self, mode: bool):
         raise AttributeError('Set this attribute on instancing the store')
     
+    # Blocking backend IO (loading, syncing, releasing) runs in a shared executor. Set by the data manager, otherwise the process-wide IO executor
+    _executor: IOExecutor = None
+    @property
+    def executor(self) -> IOExecutorGroup:
+        '''The executor running the blocking backend IO of this store (At most "_sync_max_threads" calls at once)'''
+        return (self._executor or get_io_executor()).group(self.alias, self._sync_max_threads)
+    @executor.setter
+    def executor(self, executor: Optional[IOExecutor]):
+        if executor is None or isinstance(executor, IOExecutor):
+            self._executor = executor
+    
     @property
     def logger(self) -> Type[Logger]:
         '''The logger of this class'''
@@ -144,12 +184,29 @@ class DataStore(object):
     # An optional IO handle for stores with filesystem backends or persistent socket connections
     _iohandle: Dict[str, Any] = None
     
+    # The write-behind scheduler syncing changed domains in the background (if enabled)
+    _scheduler: SyncScheduler = None
+    
+    # The cache of raw values read from the backend (if enabled)
+    _cache: ValueCache = None
+    
+    # The subscriptions to changed values
+    _notifier: ChangeNotifier = None
+    
+    # The declared secondary indexes (collection token and indexed key) by domain
+    _indexes: Dict[str, Set[Tuple[str, str]]] = None
+    
+    # Transactions: The values staged by the transactions of the current context (Thread or asyncio task) by store
+    # and a lock serializing the changes of the data objects, so a rollback cannot undo concurrent changes
+    _transactions: contextvars.ContextVar = contextvars.ContextVar('transactions', default=None)
+    _transaction_lock: threading.RLock = None
+    
     # Representation
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.alias}>'
     
     # Init
-    def __init__(self, name: str=None, alias: str=None, description: str=None, path: Union[str, Path]=None, filetype: str=None, writable: bool=None, persistent: bool=None, synced: bool=False):
+    def __init__(self, name: str=None, alias: str=None, description: str=None, path: Union[str, Path]=None, filetype: str=None, writable: bool=None, persistent: bool=None, synced: bool=False, strict: bool=None, writebehind: bool=False, cache: Union[bool, float]=False):
         '''
         :param str name: An alphabetical name without whitespace characters (Used for setters/getters) 
         :param str alias: An optional alphabetical alias without whitespace characters (Used instead of the name for setters/getters) 
@@ -159,6 +216,9 @@ class DataStore(object):
         :param bool writable: ``True`` if the store is writable
         :param bool persistent: ``True`` if the store should save its data persistently
         :param bool synced: ``True`` if the store should auto-load and auto-sync its backends
+        :param bool strict: ``True`` if the store should validate each value read, even if it has been validated before
+        :param bool writebehind: ``True`` if the store should sync changed domains in the background (Instead of syncing each value if synced)
+        :param bool cache: ``True`` (or the time-to-live in seconds) if the store should cache the raw values read from its backend
         '''
         # Set up the store
         if name is not None:
@@ -174,6 +234,16 @@ class DataStore(object):
             self._persistent = persistent
         if isinstance(synced, bool):
             self._synced = synced
+        if isinstance(strict, bool):
+            self._validate_strict = strict
+        self._transaction_lock = threading.RLock()
+        self._indexes = {}
+        self._notifier = ChangeNotifier(max_workers=self._notify_max_threads, name=f'{self.alias}.notify')
+        if writebehind is True and self.persistent:
+            self._scheduler = SyncScheduler(self, delay=self._sync_delay, threshold=self._sync_threshold, staleness=self._sync_staleness)
+        if cache is not False and cache is not None:
+            ttl = self._cache_ttl if cache is True else float(cache)
+            self._cache = ValueCache(ttl=ttl, size=self._cache_size, negative=self._cache_negative)
         
         # Plausibility checks
         if not self.writable and self.persistent:
@@ -195,15 +265,15 @@ class DataStore(object):
          
         # Dissect
         try:
-            keys = token.split('.', 1)
+            name, key = splitToken(token)
             # Check if the token has a valid length
-            if len(keys) < 1 or keys[0].strip() == '':
+            if name.strip() == '':
                 self.logger.warning(f'Invalid data token "{token}" (Too few key tokens)')
             else:
                 # Make sure that we set a data object even it is empty (Empty dictionaries evaluate to "False" in Python)
-                domain = self.getDomain(keys[0])
-                domain = domain if isinstance(domain, DataObject) else keys[0]
-                tokens = keys[1] if len(keys) > 1 else ''
+                domain = self.getDomain(name)
+                domain = domain if isinstance(domain, DataObject) else name
+                tokens = key
         except Exception as e:
             self.logger.warning(f'Could not dissect data token "{token}" ({e})')
          
@@ -218,6 +288,13 @@ class DataStore(object):
         this method gets automatically called by the data manager to whom this store 
         instance is registered to.
         '''
+        # Sync all changes waiting for the write-behind scheduler
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        
+        # Stop the threads calling the subscribers
+        self._notifier.shutdown(wait=False)
+        
         if self._iohandle is not None:
             # Release the IO handle of the store
             try:
@@ -241,12 +318,51 @@ class DataStore(object):
                     # In case of filesystem observer
                     domain._iohandle.stop()
                 finally:
-                    del self._iohandle
-                    self._iohandle = None
+                    del domain._iohandle
+                    domain._iohandle = None
                     
         # Run concurrently
-        runConcurrently(domainReleaser, [domain for _, domain in self._data.items()])
+        run_concurrently(domainReleaser, [domain for _, domain in self._data.items()], executor=self.executor)
 
+    # Change notifications
+    def subscribe(self, prefix: str, callback: Callable[[List[str]], Any], synced: bool=False, loop: asyncio.AbstractEventLoop=None) -> Subscription:
+        '''
+        Subscribes to the changes of all values within a token prefix, so components do not need to poll values.
+        The callback receives the list of changed tokens, batched per py:function::setValues call (or per sync if
+        subscribed to synced changes) and merged while the callback is still busy. A changed parent token of the
+        prefix (e.g. a reloaded domain) is delivered as well. The callback is called on the given (or the running)
+        asyncio loop, otherwise in a worker thread of the store's notifier (Not in the threads running the backend IO).
+        
+        Example:
+        
+        subscription = store.subscribe('config.daemon', lambda tokens: print(tokens))
+        store.setValue('config.daemon.port', 80)    # Calls the callback with ['config.daemon.port']
+        subscription.cancel()
+        
+        :param str prefix: The token prefix (e.g. "config" or "config.daemon", an empty prefix subscribes to all changes)
+        :param callable callback: A function or coroutine function called with the list of changed tokens
+        :param bool synced: ``True`` if changes should be delivered only after they were synced to the backend
+        :param asyncio.AbstractEventLoop loop: The loop to call the callback on
+        :returns: The subscription
+        :rtype: py:class::freedm.data.notify.Subscription
+        '''
+        return self._notifier.subscribe(prefix, callback, synced=synced, loop=loop)
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        '''
+        Cancels a subscription (See py:function::subscribe)
+        :param py:class::freedm.data.notify.Subscription subscription: The subscription
+        '''
+        self._notifier.unsubscribe(subscription)
+    
+    def _notifyChanges(self, tokens: Iterable[str]) -> None:
+        '''
+        Notifies the subscribers about values changed in the backend (e.g. by a reloaded file). Stores should call
+        this method whenever their backend notifies them about changed data.
+        :param list tokens: The changed tokens
+        '''
+        self._notifier.notify(tokens, synced=True)
+    
     # Value getting and setting
     def setValue(self, token: str, value: Any) -> bool:
         '''
@@ -266,6 +382,12 @@ class DataStore(object):
             # Set the value
             self.logger.debug(f'Setting value "{token}={value}" in data store "{self}"')
             
+            # Stage the value if this context runs a transaction (The value gets validated on commit)
+            overlay = self.__getOverlay()
+            if overlay is not None and value is not None:
+                overlay[token] = value
+                return True
+            
             # Validate value before we proceed
             if value is not None and models.getValidatedValue(token, value) is None:
                 raise UserWarning('Validation error')
@@ -280,7 +402,7 @@ class DataStore(object):
         # Get the data domain object (quick lookup attempt, then auto-loading domain)
         try:
             # Try a fast 1st pass immediately accessing the data domain object
-            domain, key = token.split('.', 1)
+            domain, key = splitToken(token)
             dataobject = self._data[domain]
         except KeyError:
             # The previous fast attempt did not work. We will now auto-load the domain data backend
@@ -292,24 +414,35 @@ class DataStore(object):
             pass
         
         # Set the value
+        result = False
         if isinstance(dataobject, DataObject):
             # Set the new value for the key token to the domain data object
             try:
-                if dataobject.setValue(key, value):
+                with self._transaction_lock:
+                    # The key token set (With collection keys "[]" resolved to the actual item ID)
+                    key = dataobject.setValue(key, value)
                     result = True
-                    #TODO: We should emit a datachanged event that token "token" has been changed. BUT WAIT. WE SHOULD DO THIS ONLY AFTER WE SYNC IN THE NEXT STEP!!!
-                    print(f'TODO: Value "{dataobject._changed[-1]}" changed in store "{self}"')
+                    # The value has been validated before setting it
+                    dataobject.markValidated(key)
+                    # Cached raw values of the token are outdated
+                    if self._cache is not None:
+                        self._cache.invalidate(f'{domain}.{key}')
+                    # Notify the subscribers (Subscribers to synced changes get notified once the domain is synced)
+                    self._notifier.notify([f'{domain}.{key}' if key else domain])
             except Exception as e:
                 result = False
                 self.logger.warn(f'Setting value "{token}" to data domain "{domain}" failed ({e})')
             
+            # If this store syncs in the background, then schedule the domain to be synced
+            if result and self._scheduler is not None:
+                self._scheduler.notify(domain.lower())
             # If this store is synced, then also set the raw value immediately
-            if result and self.synced and self.persistent:
+            elif result and self.synced and self.persistent:
                 try:
                     # Write the new value back to its backend and reset the tainted status of the dataobject
                     if self._setRaw(dataobject, key, value):
-                        if key in dataobject._changed:
-                            dataobject._changed.remove(key)
+                        dataobject._changed.discard(key)
+                        self._notifier.flush(domain)
                 except Exception as e:
                     self.logger.warn(f'Syncing the new value "{token}" to the data object backend "{dataobject._backend}" failed ({e})')   
         else:
@@ -318,6 +451,150 @@ class DataStore(object):
             
         # Return the result
         return True if result else False
+    
+    def setValues(self, values: Dict[str, Any]) -> bool:
+        '''
+        Sets the values of several tokens at once like py:function::setValue. All values are validated 
+        before any value is set and the changed domains are rolled back if any value cannot be set, so either
+        all or none of the values are set. Each data domain is resolved only once and synced stores write the
+        new values of each domain as one batch to its backend. Within a transaction the values are staged.
+        :param dict values: The values by key token
+        :returns: ``True`` if all values could be set
+        :rtype: bool
+        '''
+        # Do some pre-checks (Can we write to store, Do we have values, Are the values valid, Are the domains available?)
+        domains = {}
+        try:
+            # Check if store is writeable
+            if not self.writable:
+                raise UserWarning(f'The {"persistent" if self.persistent else "ephemeral"} data store "{self}" is not writable')
+            
+            # Set the values
+            self.logger.debug(f'Setting {len(values)} values in data store "{self}"')
+            
+            # Stage the values if this context runs a transaction (The values get validated on commit)
+            overlay = self.__getOverlay()
+            if overlay is not None:
+                overlay.update(values)
+                return True
+            
+            # Validate all values before we proceed
+            for token, value in values.items():
+                if value is None:
+                    raise UserWarning(f'Value of "{token}" is "None"')
+                if models.getValidatedValue(token, value) is None:
+                    raise UserWarning(f'Validation error of "{token}"')
+                
+            # Get the data domain objects
+            for token in values:
+                domain, _key = splitToken(token)
+                if domain not in domains:
+                    dataobject = self.getDomain(domain) if domain.strip() != '' else None
+                    if not isinstance(dataobject, DataObject):
+                        raise UserWarning(f'Data domain "{domain}" unavailable')
+                    domains[domain] = dataobject
+        except Exception as e:
+            self.logger.warn(f'Setting {len(values)} values in data store "{self}" failed ({e})')
+            return False
+        
+        # Set the new values in the domain data objects (Atomically, so roll back all domains if any value cannot be set)
+        with self._transaction_lock:
+            snapshots = {}
+            for token in values:
+                domain, key = splitToken(token)
+                snapshots.setdefault(domain, []).append(key)
+            snapshots = {domain: domains[domain].getSnapshot(keys) for domain, keys in snapshots.items()}
+            batches = {}
+            for token, value in values.items():
+                domain, key = splitToken(token)
+                dataobject = domains[domain]
+                try:
+                    # The key token set (With collection keys "[]" resolved to the actual item ID)
+                    key = dataobject.setValue(key, value)
+                    # The value has been validated before setting it
+                    dataobject.markValidated(key)
+                    batches.setdefault(domain, {})[key] = value
+                except Exception as e:
+                    self.logger.warn(f'Setting value "{token}" to data domain "{domain}" failed ({e}). Rolling back {len(values)} values')
+                    for domain, snapshot in snapshots.items():
+                        domains[domain].restoreSnapshot(snapshot)
+                    return False
+        # Notify the subscribers about all changes at once (Subscribers to synced changes get notified once the domains are synced)
+        self._notifier.notify(f'{domain}.{key}' if key else domain for domain, batch in batches.items() for key in batch)
+        
+        # Cached raw values of the tokens are outdated
+        if self._cache is not None:
+            self._cache.invalidateMany(f'{domain}.{key}' for domain, batch in batches.items() for key in batch)
+        
+        # If this store syncs in the background, then schedule the domains to be synced
+        if self._scheduler is not None:
+            for domain, batch in batches.items():
+                self._scheduler.notify(domain.lower(), len(batch))
+        # If this store is synced, then also set the raw values immediately (One batch per domain)
+        elif self.synced and self.persistent:
+            for domain, batch in batches.items():
+                dataobject = domains[domain]
+                try:
+                    # Write the new values back to the backend and reset the tainted status of the dataobject
+                    if self._setRawBatch(dataobject, batch):
+                        for key in batch:
+                            dataobject._changed.discard(key)
+                        self._notifier.flush(domain)
+                except Exception as e:
+                    self.logger.warn(f'Syncing {len(batch)} new values to the data object backend "{dataobject._backend}" failed ({e})')
+        
+        # Return the result
+        return True
+    
+    @contextmanager
+    def transaction(self) -> Iterator['DataStore']:
+        '''
+        A context manager staging all values set by the current context (Thread or asyncio task, including the tasks
+        it creates while the transaction runs) in an overlay instead of setting them
+        in the data domains. Values set by these tasks after the transaction exited are set directly. When the context exits, the staged values are validated at once and applied
+        atomically by py:function::setValues, so synced stores write each domain by one backend write. If the
+        context exits with an exception the staged values are discarded. If any staged value cannot be set,
+        no value is set and a ``UserWarning`` is raised. Nested transactions join the outer transaction.
+        
+        Example:
+        
+        with store.transaction():
+            store.setValue('settings.port', 80)
+            store.setValue('settings.host', 'localhost')
+        
+        :returns: The data store
+        '''
+        # Join a running transaction
+        if self.__getOverlay() is not None:
+            yield self
+            return
+        
+        # Stage the values
+        overlay = StagedValues()
+        self._transactions.set({**(self._transactions.get() or {}), id(self): overlay})
+        try:
+            yield self
+        except BaseException:
+            self.logger.debug(f'Discarding {len(overlay)} staged values of transaction in data store "{self}"')
+            raise
+        finally:
+            # Tasks created within the transaction might outlive it
+            overlay.closed = True
+            self._transactions.set({store: staged for store, staged in (self._transactions.get() or {}).items() if store != id(self)})
+        
+        # Commit the values
+        if overlay and not self.setValues(overlay):
+            raise UserWarning(f'Transaction of {len(overlay)} values in data store "{self}" failed (Rolled back)')
+    
+    def __getOverlay(self) -> Optional[StagedValues]:
+        '''
+        Returns the values staged by the transaction of the current context or ``None`` if no transaction is running
+        :returns: The staged values by key token
+        :rtype: py:class::StagedValues
+        '''
+        transactions = self._transactions.get()
+        overlay = transactions.get(id(self)) if transactions else None
+        return overlay if overlay is not None and not overlay.closed else None
         
     def getValue(self, token: str, default: Any=None) -> Any:
         '''
@@ -331,6 +608,11 @@ class DataStore(object):
         # Log
         self.logger.debug(f'Getting value "{token}" from data store "{self}"')
         
+        # Values staged by a transaction of this context are returned as is (They get validated on commit)
+        overlay = self.__getOverlay()
+        if overlay and token in overlay:
+            return overlay[token]
+        
         # Set a default value
         value: Any = None
         
@@ -344,7 +626,7 @@ class DataStore(object):
         # Get the data domain object (quick lookup attempt, then auto-loading domain)
         try:
             # Try a fast 1st pass immediately accessing the data domain object
-            domain, key = token.split('.', 1)
+            domain, key = splitToken(token)
             dataobject = self._data[domain]
         except KeyError:
             # The previous fast attempt did not work. We will now auto-load the domain data backend
@@ -355,23 +637,176 @@ class DataStore(object):
         except:
             pass
 
+        # Get the value
+        return self.__getDomainValue(token, domain, dataobject, key, default)
+    
+    def getValues(self, tokens: Union[Iterable[str], Dict[str, Any]], default: Any=None) -> Dict[str, Any]:
+        '''
+        Looks up the values of several tokens at once like py:function::getValue, but resolves each data domain only once.
+        :param tokens: The key tokens or a dictionary of key tokens and their individual alternative default values
+        :param object default: An optional alternative value for all tokens (if no individual default values are provided)
+        :returns: The values by token
+        :rtype: dict
+        '''
+        # Log
+        defaults = tokens if isinstance(tokens, dict) else dict.fromkeys(tokens, default)
+        self.logger.debug(f'Getting {len(defaults)} values from data store "{self}"')
+        
+        # Get the values domain by domain
+        values = {}
+        domains = {}
+        for token, default in defaults.items():
+            lookup = token[:-3] if token.endswith('.[]') else token
+            domain, key = splitToken(lookup)
+            if domain not in domains:
+                domains[domain] = self.getDomain(domain) if domain.strip() != '' else None
+            values[token] = self.__getDomainValue(lookup, domain, domains[domain], key, default)
+        
+        # Return the values
+        return values
+    
+    # Secondary indexes
+    def createIndex(self, token: str, field: str) -> bool:
+        '''
+        Declares a secondary index of the items of a domain's collection by the value of one of their keys, so
+        items can be found by py:function::findByIndex without scanning the collection. The index is kept
+        up to date on changes and created again whenever the domain gets loaded.
+        :param str token: The token of the collection (e.g. "user.active" or "user.active.[]")
+        :param str field: The key token of the indexed value within each item (e.g. "name")
+        :returns: ``True`` if the index could be created
+        :rtype: bool
+        '''
+        domain, collection = splitToken(token)
+        domain = domain.lower()
+        self._indexes.setdefault(domain, set()).add((collection, field))
+        dataobject = self.getDomain(domain)
+        if not isinstance(dataobject, DataObject):
+            self.logger.warn(f'Creating index of "{token}" by "{field}" failed. Data domain "{domain}" unavailable')
+            return False
+        dataobject.createIndex(collection, field)
+        return True
+    
+    def dropIndex(self, token: str, field: str) -> None:
+        '''
+        Removes a secondary index
+        :param str token: The token of the collection
+        :param str field: The key token of the indexed value
+        '''
+        domain, collection = splitToken(token)
+        domain = domain.lower()
+        self._indexes.get(domain, set()).discard((collection, field))
+        dataobject = self._data.get(domain)
+        if isinstance(dataobject, DataObject):
+            dataobject.dropIndex(collection, field)
+    
+    def findByIndex(self, token: str, field: str, value: Any, values: bool=False) -> Union[List[str], Dict[str, Any]]:
+        '''
+        Finds the items of a collection having a value by its secondary index (See py:function::createIndex)
+        :param str token: The token of the collection (e.g. "user.active")
+        :param str field: The key token of the indexed value (e.g. "name")
+        :param value: The value
+        :param bool values: ``True`` to return the items instead of their tokens
+        :returns: The tokens of the items (or the items by token)
+        '''
+        index = self.__getIndex(token, field)
+        tokens = [f'{index[0]}.{item}' for item in index[1].find(value)] if index else []
+        return self.getValues(tokens) if values else tokens
+    
+    def findByRange(self, token: str, field: str, low: Any=None, high: Any=None, inclusive: bool=True, values: bool=False) -> Union[List[str], Dict[str, Any]]:
+        '''
+        Finds the items of a collection whose value lies within a range by its secondary index (See py:function::createIndex).
+        If only one bound is provided, the range is limited to the values of its type.
+        :param str token: The token of the collection (e.g. "user.active")
+        :param str field: The key token of the indexed value (e.g. "age")
+        :param low: The lower bound (By default the lowest value of the upper bound's type)
+        :param high: The upper bound (By default the highest value of the lower bound's type)
+        :param bool inclusive: ``True`` if items with a value equal to the upper bound should be included
+        :param bool values: ``True`` to return the items instead of their tokens
+        :returns: The tokens of the items ordered by value (or the items by token)
+        '''
+        index = self.__getIndex(token, field)
+        tokens = [f'{index[0]}.{item}' for item in index[1].range(low, high, inclusive)] if index else []
+        return self.getValues(tokens) if values else tokens
+    
+    def __getIndex(self, token: str, field: str) -> Optional[Tuple[str, Any]]:
+        '''
+        Returns the domain and the secondary index of a collection (Created if declared, but not yet created)
+        '''
+        domain, collection = splitToken(token)
+        domain = domain.lower()
+        dataobject = self.getDomain(domain)
+        if not isinstance(dataobject, DataObject):
+            self.logger.warn(f'Finding items of "{token}" failed. Data domain "{domain}" unavailable')
+            return None
+        index = dataobject.getIndex(collection, field)
+        if index is None:
+            if (collection, field) not in self._indexes.get(domain, ()):
+                self.logger.warn(f'Finding items of "{token}" failed. No index by "{field}" created')
+                return None
+            index = dataobject.createIndex(collection, field)
+        return domain, index
+    
+    # Queries
+    def query(self, query: Query) -> List[QueryResult]:
+        '''
+        Runs a query over the items of a domain's collection (See py:class::freedm.data.query.Query). Stores
+        able to run the query in their backend do so (See py:function::_query), otherwise the query runs over
+        the domain's data object, making use of its secondary indexes.
+        :param py:class::freedm.data.query.Query query: The query
+        :returns: The tokens and the (projected) values of the matching items
+        :rtype: list
+        '''
+        domain, _collection = splitToken(query.token)
+        domain = domain.lower()
+        dataobject = self.getDomain(domain)
+        if not isinstance(dataobject, DataObject):
+            self.logger.warn(f'Querying "{query.token}" failed. Data domain "{domain}" unavailable')
+            return []
+        try:
+            results = self._query(dataobject, query)
+            if results is None:
+                results = list(query.execute(dataobject))
+        except Exception as e:
+            self.logger.warn(f'Querying "{query.token}" failed ({e})')
+            return []
+        return results
+    
+    def __getDomainValue(self, token: str, domain: str, dataobject: Optional[DataObject], key: str, default: Any=None) -> Any:
+        '''
+        Looks up the value of a key token in a domain DataObject (or its backend) and validates the value
+        :param str token: The key token
+        :param str domain: The data domain
+        :param py:class::freedm.data.objects.DataObject dataobject: The domain data object
+        :param str key: The key token within the domain
+        :param object default: An optional alternative value (See py:function::getValue)
+        :returns: The value
+        '''
+        value: Any = None
+        
         # Get the value (First attempt from the domain's cache, then by trying to load the raw value
+        validated = None
         if isinstance(dataobject, DataObject):
             try:
                 # First try to get the value from the domain data object
                 value = dataobject.getValue(key)
+                validated = False if self._validate_strict else dataobject.isValidated(key)
             except LookupError as e:
-                # If this fails, then try to get/load the raw value (from the backend)
+                # If this fails, then try to get/load the raw value (from the backend or the store's cache of raw values)
+                # The raw values are cached (if enabled) apart from the DataObject, as they are validated only below
+                # and expire after their time-to-live, as the data might have changed in the backend meanwhile
+                cached, value = self._cache.get(token) if self._cache is not None else (False, None)
+                # Values changed while being read must not be cached
+                generation = self._cache.generation if self._cache is not None else None
                 try:
-                    value = self._getRaw(dataobject, key)
-                    
-                    # TODO: Should we cache any returned values in the related DataObject, if we receive a raw value from the backend?
-                    # if value: ...
-                    # !!! STOP!!! HIER NOCH NICHT CACHEN, DA WIR JA ERST SPÄTER mit getValidatedValue VALIDIEREN!
-                    # What if the data has changed in the data backend (e.g. database) and we return then the old cached value?
-                    # Should we handle this automatically for instance by checking the synced configuration of the store?
-                    # Should we be able to set a maximum TimeToLive for cached data and only then we retrieve the data again as rawValue?
-                    
+                    if not cached:
+                        value = self._getRaw(dataobject, key)
+                        if self._cache is not None:
+                            self._cache.put(token, value, generation)
+                except LookupError as e:
+                    # Cache the missing value as well
+                    if self._cache is not None:
+                        self._cache.put(token, None, generation)
+                    self.logger.warn(f'Getting value "{token}" from data domain "{domain}" failed ({e})')
                 except Exception as e:
                     self.logger.warn(f'Getting value "{token}" from data domain "{domain}" failed ({e})')
             except Exception as e:
@@ -379,9 +814,13 @@ class DataStore(object):
         else:
             self.logger.warn(f'Getting value "{token}" failed. Data domain "{domain}" unavailable')
 
-        # Use the retrieved value or the provided alternative default value and validate
-        if value is not None:
+        # Use the retrieved value or the provided alternative default value and validate (Unless validated before)
+        if value is not None and validated:
+            pass
+        elif value is not None:
             value = models.getValidatedValue(token, value)
+            if value is not None and validated is False:
+                dataobject.markValidated(key)
         elif value is None and default is not None:
             if default == token:
                 value = models.getDefaultValue(default)
@@ -406,6 +845,17 @@ class DataStore(object):
         '''
         raise NotImplementedError(f'Abstract method _setRaw not implemented in class "{self.__class__.__module__}.{self.__class__.__name__}"')
             
+    def _setRawBatch(self, domain: Type[DataObject], values: Dict[str, Any]) -> bool:
+        '''
+        Stores several raw values of a data object at once. By default each value is stored by py:function::_setRaw.
+        Stores whose backends support writing several values at once (e.g. in one transaction) should override this method.
+        :param py:class::freedm.data.objects.DataObject domain: The domain data object
+        :param dict values: The values by key token
+        :returns: ``True`` if all values could be set
+        :rtype: bool
+        '''
+        return all([self._setRaw(domain, token, value) for token, value in values.items()])
+            
     def _getRaw(self, domain: Type[DataObject], token: str) -> Any:
         '''
         Abstract method to retrieve the raw value from a DataObject.
@@ -415,6 +865,28 @@ class DataStore(object):
         '''
         raise NotImplementedError(f'Abstract method _getRaw not implemented in class "{self.__class__.__module__}.{self.__class__.__name__}"')
             
+    def _query(self, domain: Type[DataObject], query: Query) -> Optional[List[QueryResult]]:
+        '''
+        Runs a query in the backend. By default queries run over the domain data object. Stores whose backends
+        can filter, sort and limit items themselves (e.g. databases) should override this method.
+        :param py:class::freedm.data.objects.DataObject domain: The domain data object
+        :param py:class::freedm.data.query.Query query: The query
+        :returns: The query results or ``None`` if the backend cannot run the query
+        '''
+        return None
+            
+    def invalidateCache(self, tokens: Iterable[str]=None) -> None:
+        '''
+        Removes the cached raw values affected by changes of tokens (See py:class::freedm.data.cache.ValueCache).
+        Stores should call this method whenever their backend notifies them about changed data.
+        :param list tokens: The changed tokens (A domain name invalidates the whole domain, by default all values are removed)
+        '''
+        if self._cache is not None:
+            if tokens is None:
+                self._cache.invalidate()
+            else:
+                self._cache.invalidateMany(tokens)
+            
     # Data backend loading        
     def getDomain(self, domain: str) -> Optional[Type[DataObject]]:
         '''
@@ -453,18 +925,27 @@ class DataStore(object):
                 # 
                 if domain in self._data and not self._data[domain].syncing:
                     if domain in self._data:
-                        # Calculate the differences between currently set data object and the newly loaded one to emit "datachanged" events
-                        # diff = self.getDiff(dataobject)
-                        #TODO: Calculate difference
-                        print('TODO: DOMAIN ALREADY LOADED. CALCULATING DIFFERENCE!!!')
+                        # Calculate the differences between currently set data object and the newly loaded one to notify the subscribers
+                        current = self._data[domain]
+                        changed = [f'{domain}.{key}' for key in list(current) + [key for key in dataobject if key not in current] if current.get(key) != dataobject.get(key)] if len(self._notifier) else []
                         
                         # Update the existing data object with the new data
-                        self._data[domain].updateData(dataobject)
+                        current.updateData(dataobject)
+                        self._notifier.notify(changed, synced=True)
                     else:
                         self._data[domain] = dataobject
                 # Set the data object and return it
                 else:
                     self._data[domain] = dataobject
+                # The loaded sections have been validated by the domain's schema (If it covers them)
+                for section in models.getValidatedSections(domain, dataobject):
+                    self._data[domain].markValidated(section)
+                # Cached raw values of the domain might be outdated
+                self.invalidateCache([domain])
+                # Create the declared indexes
+                for collection, field in self._indexes.get(domain, ()):
+                    if self._data[domain].getIndex(collection, field) is None:
+                        self._data[domain].createIndex(collection, field)
                 # Return the domain object
                 return self._data[domain]
             else:
@@ -500,8 +981,10 @@ class DataStore(object):
                         del dataobject._iohandle
                         dataobject._iohandle = None
                 
-                # Remove domain from data
+                # Remove domain from data (Its unsynced changes will never be synced)
                 del self._data[domain]
+                self.invalidateCache([domain])
+                self._notifier.discard(domain)
             else:
                 self.logger.warn(f'Failed to unload data domain "{domain}" (Domain not loaded)')
         except KeyError:
@@ -537,44 +1020,38 @@ class DataStore(object):
                 for domain in domains:
                     self.syncDomain(domain, force)
             else:
-                # Get event loop
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
-                    asyncio.set_event_loop(loop)
-                
-                # Get or create a queue
+                # Get or create a queue (Shared by concurrent syncs of several threads)
                 try:
                     queue = self.__syncDomains
                 except AttributeError:
                     queue = self.__syncDomains = deque()
                     
-                # Add each domain to the queue
+                # Add each domain to the queue (unless it is already waiting to be synced)
                 for domain in domains:
-                    queue.append(domain)
+                    if domain not in queue:
+                        queue.append(domain)
                 
-                # Coroutine   
-                async def syncWorker(queue, loop, executor):
-                    while len(queue) != 0:
-                        domain = queue.popleft()
-                        await loop.run_in_executor(None, self.syncDomain, *[domain, force])
+                # Worker syncing domains until the queue is empty
+                def syncWorker():
+                    while True:
+                        try:
+                            domain = queue.popleft()
+                        except IndexError:
+                            return
+                        self.syncDomain(domain, force)
                 
-                # Create worker pool (Max number regulated by self._sync_max_threads)
-                workers = []
-                with ThreadPoolExecutor(max_workers=len(domains)) as executor:
-                    for domain in domains:
-                        if len(workers) <= self._sync_max_threads-1:
-                            workers.append(asyncio.create_task(syncWorker(queue, loop, executor)))
-                    
-                    # Run all workers asynchronously
-                    if workers:
-                        loop.run_until_complete(asyncio.wait(workers))
+                # Run the workers in the store's executor (Max number regulated by self._sync_max_threads) and wait for them
+                # Within a thread of the executor sync inline instead, as the workers might wait for this thread
+                executor = self.executor
+                if executor.is_worker_thread():
+                    syncWorker()
+                else:
+                    concurrent.futures.wait([executor.submit(syncWorker) for _ in range(min(len(domains), self._sync_max_threads))])
         else:
             # Reset the change logs of the ephemeral store's domains
             for domain in self.getSyncDomains():
                 self._data[domain].clearTainted()
+                self._notifier.flush(domain)
             self.logger.warn(f'Store "{self}" cannot be synced ("{self}" is not persistent)')
     
     def syncDomain(self, domain: str, force: bool=False) -> None:
@@ -612,15 +1089,107 @@ class DataStore(object):
                         # We must set the syncing status
                         dataobject.syncing = True
                         self._syncDomain(dataobject, self.path)
+                        # The changes reached the backend
+                        self._notifier.flush(domain)
                     except Exception as e:
                         self.logger.warn(f'Failed to sync data domain "{domain}" of "{self}" ({e})')
                     finally:
                         dataobject.syncing = False
         # Reset the change logs of the ephemeral store domains
         else:
-            dataobject.clearTainted()
+            domain = domain.lower() if isinstance(domain, str) else domain
+            if domain in self._data:
+                self._data[domain].clearTainted()
+                self._notifier.flush(domain)
             self.logger.warn(f'Data domain "{domain}" cannot be synced ("{self}" is not persistent)')
             
+    # Asynchronous value getting and setting, loading and syncing
+    async def aget(self, token: str, default: Any=None) -> Any:
+        '''
+        Asynchronous variant of py:function::getValue. Values already in memory (staged, in the domain DataObject
+        or in the cache of raw values) are returned immediately, while values which need to be read from the backend
+        (including domains which need to be loaded first) are read in the store's executor without blocking the running loop.
+        :param str token: The key token
+        :param object default: An optional alternative value (See py:function::getValue)
+        :returns: The value
+        '''
+        if self.__isInMemory(token):
+            return self.getValue(token, default)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.getValue, token, default)
+    
+    def __isInMemory(self, token: str) -> bool:
+        '''
+        Checks if the value of a token can be got without accessing the backend
+        :param str token: The key token
+        :returns: ``True`` if the value is staged, in the domain DataObject or in the cache of raw values
+        :rtype: bool
+        '''
+        overlay = self.__getOverlay()
+        if overlay and token in overlay:
+            return True
+        token = token[:-3] if token.endswith('.[]') else token
+        try:
+            domain, key = splitToken(token)
+            dataobject = self._data[domain]
+        except (KeyError, ValueError):
+            return False
+        if not isinstance(dataobject, DataObject):
+            return False
+        try:
+            dataobject.getValue(key)
+            return True
+        except LookupError:
+            return self._cache is not None and token in self._cache
+        except Exception:
+            return False
+    
+    async def aset(self, token: str, value: Any) -> bool:
+        '''
+        Asynchronous variant of py:function::setValue. Values are set in the store's executor if their domain 
+        needs to be loaded first or if the store immediately writes the values to its backend (synced stores).
+        Values set within a transaction of the calling context are staged immediately.
+        :param str token: The key token
+        :param object value: The value
+        :returns: ``True`` if the value could be set
+        :rtype: bool
+        '''
+        domain, _key = splitToken(token)
+        if self.__getOverlay() is not None or (domain in self._data and not (self.synced and self.persistent)):
+            return self.setValue(token, value)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.setValue, token, value)
+    
+    async def asyncLoadDomain(self, domain: str) -> Optional[Type[DataObject]]:
+        '''
+        Asynchronous variant of py:function::loadDomain loading the domain backend in the store's executor
+        :param str domain: The data domain
+        :returns: The domain DataObject
+        :rtype: py:class::freedm.data.objects.DataObject
+        '''
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.loadDomain, domain)
+    
+    async def asyncSync(self, force: bool=False) -> None:
+        '''
+        Asynchronous variant of py:function::sync which syncs the domains in the store's executor without 
+        blocking the running loop (At most "_sync_max_threads" domains at once if syncing in parallel)
+        :param bool force: Sync all domains regardless if their data has changed or not
+        '''
+        # Ephemeral stores have no backend to write to
+        if not self.persistent:
+            return self.sync(force)
+        self.logger.debug(f'Syncing persistent store "{self}"')
+        loop = asyncio.get_running_loop()
+        domains = self.getAllDomains() if force else self.getSyncDomains()
+        
+        # Do a sequential sync (One domain by one)
+        executor = self.executor
+        if not self._sync_parallel:
+            for domain in domains:
+                await loop.run_in_executor(executor, self.syncDomain, domain, force)
+        
+        # Do a parallel sync (The executor caps the number of parallel syncs)
+        elif domains:
+            await asyncio.gather(*[loop.run_in_executor(executor, self.syncDomain, domain, force) for domain in domains])
+            
     def getSyncDomains(self) -> List[DataObject]:
         '''
         Returns all domain DataObjects which are tainted and need to be synced
@@ -0,0 +1,177 @@
+'''
+This module defines a write-behind scheduler syncing the changed data domains of a data store in the background
+@author: Thomas Wanderer
+'''
+
+# Imports
+import os
+import time
+import logging
+import threading
+from typing import Callable, Optional, List, Dict, Any
+from logging import Logger
+
+# free.dm Imports
+from freedm.utils.aio import run_concurrently
+
+
+class SyncScheduler(object):
+    '''
+    A write-behind scheduler for persistent data stores. Instead of writing each changed value to the
+    backend, the store notifies the scheduler about changed domains and the scheduler syncs each domain
+    in the background once its changes settled. All changes of a domain since its last sync are coalesced
+    by the domain's change log (See py:function::freedm.data.objects.DataObject.getTainted) and written
+    by one sync. A domain gets synced:
+    - after no further change happened for "delay" seconds (Debounce)
+    - after "threshold" changes, even if changes are still happening
+    - at the latest "staleness" seconds after its first unsynced change
+    On stopping the scheduler all changed domains are synced. The times are measured by an exchangeable
+    clock (e.g. a fake clock in tests), and py:function::wait waits until all changed domains are synced.
+    '''
+
+    @property
+    def logger(self) -> Logger:
+        '''The logger of this class'''
+        return logging.getLogger(str(os.getpid()))
+
+    # Init
+    def __init__(self, store, delay: float=1.0, threshold: int=100, staleness: float=10.0, clock: Callable[[], float]=time.monotonic):
+        '''
+        :param py:class::freedm.data.objects.DataStore store: The data store
+        :param float delay: The number of seconds without changes after which a domain gets synced
+        :param int threshold: The number of changes after which a domain gets synced immediately
+        :param float staleness: The maximal number of seconds a change stays unsynced
+        :param callable clock: Returns the current time in seconds (Monotonic)
+        '''
+        self.store      = store
+        self.delay      = delay
+        self.threshold  = threshold
+        self.staleness  = max(staleness, delay)
+        self.clock      = clock
+        self.stats      = {'changes': 0, 'syncs': 0}
+        self.__domains: Dict[str, List[Any]] = {}
+        self.__syncing = 0
+        self.__condition = threading.Condition()
+        self.__thread: Optional[threading.Thread] = None
+        self.__running = False
+
+    # Representation
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: {self.store.alias} ({len(self.__domains)} pending)>'
+
+    @property
+    def pending(self) -> List[str]:
+        '''The domains waiting to be synced'''
+        with self.__condition:
+            return list(self.__domains)
+
+    def notify(self, domain: str, changes: int=1) -> None:
+        '''
+        Notifies the scheduler about changes of a domain
+        :param str domain: The data domain
+        :param int changes: The number of changes
+        '''
+        with self.__condition:
+            now = self.clock()
+            entry = self.__domains.get(domain)
+            if entry is None:
+                # The time of the first and the last change and the number of changes
+                self.__domains[domain] = [now, now, changes]
+            else:
+                entry[1] = now
+                entry[2] += changes
+            self.stats['changes'] += changes
+
+            # Start the scheduler on the first change
+            if not self.__running:
+                self.__running = True
+                self.__thread = threading.Thread(target=self.__run, name=f'{self.store.alias}.writebehind', daemon=True)
+                self.__thread.start()
+            self.__condition.notify_all()
+
+    def flush(self, domain: str=None) -> None:
+        '''
+        Syncs the changed domains immediately
+        :param str domain: The data domain to sync (By default all changed domains)
+        '''
+        with self.__condition:
+            if domain is None:
+                domains = list(self.__domains)
+                self.__domains.clear()
+            else:
+                domains = [domain] if self.__domains.pop(domain, None) else []
+            self.__syncing += 1
+        self.__sync(domains)
+
+    def wait(self, timeout: Optional[float]=None) -> bool:
+        '''
+        Waits until all changed domains are synced
+        :param float timeout: The maximal number of seconds to wait
+        :returns: ``True`` if no changed domain is waiting or being synced anymore
+        :rtype: bool
+        '''
+        with self.__condition:
+            return self.__condition.wait_for(lambda: not self.__domains and not self.__syncing, timeout)
+
+    def stop(self, flush: bool=True) -> None:
+        '''
+        Stops the scheduler
+        :param bool flush: Sync all changed domains before stopping
+        '''
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+            thread = self.__thread
+            self.__thread = None
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        if flush:
+            self.flush()
+
+    def __getDeadline(self, entry: List[Any]) -> float:
+        '''
+        Returns the time a domain is due to be synced
+        '''
+        first, last, changes = entry
+        if changes >= self.threshold:
+            return first
+        return min(last + self.delay, first + self.staleness)
+
+    def __run(self) -> None:
+        '''
+        Syncs the domains when they are due
+        '''
+        while True:
+            with self.__condition:
+                while True:
+                    if not self.__running:
+                        return
+                    now = self.clock()
+                    deadlines = {domain: self.__getDeadline(entry) for domain, entry in self.__domains.items()}
+                    due = [domain for domain, deadline in deadlines.items() if deadline <= now]
+                    if due:
+                        break
+                    self.__condition.wait(min(deadlines.values()) - now if deadlines else None)
+                for domain in due:
+                    del self.__domains[domain]
+                self.__syncing += 1
+            self.__sync(due)
+
+    def __sync(self, domains: List[str]) -> None:
+        '''
+        Syncs the domains (Several domains concurrently in the store's executor) and wakes up the waiting threads
+        '''
+        try:
+            if domains:
+                self.logger.debug(f'Write-behind syncing {len(domains)} data domains of store "{self.store}"')
+                if len(domains) == 1:
+                    self.store.syncDomain(domains[0])
+                else:
+                    run_concurrently(self.store.syncDomain, domains, executor=self.store.executor)
+                self.stats['syncs'] += len(domains)
+        except Exception as e:
+            self.logger.warn(f'Write-behind sync of store "{self.store}" failed ({e})')
+        finally:
+            with self.__condition:
+                self.__syncing -= 1
+                self.__condition.notify_all()
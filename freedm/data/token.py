@@ -0,0 +1,71 @@
+'''
+This module compiles the key tokens used to address values in data stores and data objects
+@author: Thomas Wanderer
+'''
+
+# Imports
+import functools
+from collections import namedtuple
+from typing import Tuple
+
+
+# The kinds of token steps
+KEY = 'key'                 # A regular key ("name")
+INDEX = 'index'             # A numeric ID or list index ("45")
+COLLECTION = 'collection'   # All elements of a collection ("[]")
+WILDCARD = 'wildcard'       # All sub data-structures ("+")
+
+
+TokenStep = namedtuple('TokenStep',
+    '''
+    kind
+    key
+    index
+    '''
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def compileToken(token: str) -> Tuple[TokenStep, ...]:
+    '''
+    Compiles a key token into its typed steps. Compiled tokens are cached, so the same
+    tokens are split and evaluated only once.
+    :param str token: The key token (e.g. "user.45.name")
+    :returns: The token steps (An empty tuple for the empty token addressing the whole data)
+    :rtype: tuple
+    '''
+    if token == '':
+        return ()
+    steps = []
+    for key in token.split('.'):
+        if key.isdigit():
+            steps.append(TokenStep(INDEX, key, int(key)))
+        elif key == '[]':
+            steps.append(TokenStep(COLLECTION, key, None))
+        elif key == '+':
+            steps.append(TokenStep(WILDCARD, key, None))
+        else:
+            steps.append(TokenStep(KEY, key, None))
+    return tuple(steps)
+
+
+@functools.lru_cache(maxsize=4096)
+def splitToken(token: str) -> Tuple[str, str]:
+    '''
+    Splits a store token into its domain and the key token within the domain
+    :param str token: The store token (e.g. "user.45.name")
+    :returns: The domain and the key token (e.g. "user" and "45.name")
+    :rtype: tuple
+    '''
+    domain, _, key = token.partition('.')
+    return domain, key
+
+
+def joinSteps(steps: Tuple[TokenStep, ...]) -> str:
+    '''
+    Rebuilds the key token of (a slice of) compiled token steps
+    :param tuple steps: The token steps
+    :returns: The key token
+    :rtype: str
+    '''
+    return '.'.join(step.key for step in steps)
@@ -7,10 +7,12 @@ and to validate values against their JSON schema.
 # Imports
 import logging
 import os
+import copy
 from pydoc import locate
+from collections import OrderedDict
 try:
-    from jsonschema import validate
-    from jsonschema.exceptions import ValidationError, SchemaError
+    from jsonschema.validators import validator_for
+    from jsonschema.exceptions import ValidationError, SchemaError, best_match
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
     raise freedmModuleImport(e)
@@ -18,7 +20,118 @@ except ImportError as e:
 # free.dm Imports
 from freedm.utils.formatters import ellipsis
 
+# Caches of the resolved sub-schemas and default values by token, of the root schemas by domain, of the
+# compiled validators by schema and of the domains without model (The least recently used sub-schemas,
+# validators and default values are evicted, as each item ID of a collection adds a token)
+__schemas = OrderedDict()
+__roots = {}
+__validators = OrderedDict()
+__defaults = OrderedDict()
+__missing = set()
+__maxSchemas = 1024
+__maxValidators = 256
+__maxDefaults = 1024
+
+# Model registration
+def registerModel(domain, model):
+    '''
+    Registers (or replaces) the model of a data domain and invalidates all cached
+    schemas, validators and default values.
+    :param str domain: The data domain
+    :param object model: The model (JSON schema dictionary, class or module)
+    '''
+    globals()[domain] = model
+    invalidateCache()
+
+def unregisterModel(domain):
+    '''
+    Removes the model of a data domain and invalidates all cached schemas,
+    validators and default values.
+    :param str domain: The data domain
+    '''
+    globals().pop(domain, None)
+    invalidateCache()
+
 # Utility methods
+def invalidateCache():
+    '''
+    Clears the cached sub-schemas, validators and default values. Call this after changing a
+    model schema in place (Replacing a model by a new object is detected automatically).
+    '''
+    __schemas.clear()
+    __roots.clear()
+    __validators.clear()
+    __defaults.clear()
+    __missing.clear()
+
+def __locateModel(domain):
+    '''
+    This private method returns the model (schema module, class or dictionary)
+    of a data domain. Already loaded models are returned without importing and
+    domains without model are only looked up once.
+    :param str domain: The data domain
+    :returns object: The model or ``None``
+    '''
+    model = globals().get(domain)
+    if model is None and domain not in __missing:
+        model = locate(f'{__package__}.{domain}')
+        if model is None:
+            __missing.add(domain)
+    return model
+
+def __getRevision(model):
+    '''
+    This private method returns the revision of a model cached entries are bound to: The model itself
+    and, for schema modules, their module spec (Which gets replaced when the module is reloaded).
+    :param object model: The model
+    :returns tuple: The revision
+    '''
+    return model, getattr(model, '__spec__', None)
+
+def __isCurrent(cached, model):
+    '''
+    This private method checks if a cached entry belongs to the current revision of its model.
+    :param tuple cached: The cached entry (Starting with the revision) or ``None``
+    :param object model: The model
+    :returns bool: ``True`` if the entry can be used
+    '''
+    return cached is not None and all(a is b for a, b in zip(cached[:2], __getRevision(model)))
+
+def __putCached(cache, key, entry, size):
+    '''
+    This private method caches an entry and evicts the least recently used entries beyond the cache size.
+    :param OrderedDict cache: The cache
+    :param key: The key of the entry
+    :param entry: The entry
+    :param int size: The maximal number of entries
+    '''
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+def __validate(value, schema):
+    '''
+    This private method validates a value against a JSON schema like "jsonschema.validate"
+    but checks each schema only once and reuses its compiled validator.
+    :param value: The value
+    :param dict schema: The JSON schema
+    '''
+    try:
+        cached, validator = __validators[id(schema)]
+        if cached is not schema:
+            raise KeyError
+        __validators.move_to_end(id(schema))
+    except KeyError:
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        validator = cls(schema)
+        # Keep a reference to the schema, so its id cannot be reused
+        __putCached(__validators, id(schema), (schema, validator), __maxValidators)
+    error = best_match(validator.iter_errors(value))
+    if error is not None:
+        raise error
+
 def __buildDefaultValue(schema):
     '''
     This private method builds a default data structure 
@@ -80,43 +193,29 @@ def __buildDefaultValue(schema):
     
 def __prepareCollectionObject(data):
     '''
-    This private option makes a copy of the provided data structure and
-    replaces collection objects (=dictionaries with numeric keys) in them
-    by a list representation. This is required to validate such data structures 
-    against a JSON schema which only knows the schema element type "array".
+    This private option replaces collection objects (=dictionaries with numeric keys)
+    in the provided data structure by a list representation. This is required to validate 
+    such data structures against a JSON schema which only knows the schema element type "array".
+    The provided data is never changed: Only containers which (indirectly) contain collection
+    objects are copied, any other data is returned as is.
     :param object data: The nested data structure
     '''
-    if isinstance(data, list) or isinstance(data, dict):
-        # Work on a copy of the provided data
-        dataobject = data.copy()
-        
-        # The recursive traverse option
-        def traverseDataObject(obj):
-            try:
-                # Transform in a list if is a "numerical dict" 
-                if isinstance(obj, dict) and len(obj.keys()) > 0 and all(k.isdigit() for k in obj.keys()):
-                    obj = [v for k,v in obj.items()]
-                # Traverse this object
-                if isinstance(obj, list):
-                    i = []
-                    for element in obj:
-                        i.append(traverseDataObject(element))
-                    obj = i
-                elif isinstance(obj, dict):
-                    for element in obj:
-                        obj[element] = traverseDataObject(obj[element])
-                else:
-                    pass
-                # Return the object
-                return obj
-            except:
-                pass
-                    
-        # Traverse the data
-        dataobject = traverseDataObject(dataobject)
-        
-        # Return the prepared data
-        return dataobject
+    if isinstance(data, dict):
+        # Transform in a list if is a "numerical dict" 
+        if len(data) > 0 and all(isinstance(k, str) and k.isdigit() for k in data):
+            return [__prepareCollectionObject(v) for v in data.values()]
+        # Copy the object only when one of its elements changed
+        prepared = None
+        for k, v in data.items():
+            element = __prepareCollectionObject(v)
+            if element is not v:
+                if prepared is None:
+                    prepared = dict(data)
+                prepared[k] = element
+        return data if prepared is None else prepared
+    elif isinstance(data, list):
+        prepared = [__prepareCollectionObject(v) for v in data]
+        return data if all(p is v for p, v in zip(prepared, data)) else prepared
     else:
         return data
     
@@ -143,9 +242,35 @@ def getDefaultValue(token):
     Returns a default value for the token if found in the model schema. Please refer to 
     http://json-schema.org/documentation.html or
     https://spacetelescope.github.io/understanding-json-schema for more insights on JSON schema.
+    The default values are built only once per token and model. Each call returns a copy,
+    so callers can safely change the returned value.
     :param str token: The key token default value if found
     :returns: The default value for this token or ``None`` if not found
     '''
+    # Get the cached default value (Unless the model changed)
+    model = __locateModel(str(token).split('.', 1)[0])
+    try:
+        cached = __defaults[token]
+        if not __isCurrent(cached, model):
+            raise KeyError
+        __defaults.move_to_end(token)
+        default = cached[2]
+    except (KeyError, TypeError):
+        default = __buildTokenDefaultValue(token)
+        try:
+            __putCached(__defaults, token, (*__getRevision(model), default), __maxDefaults)
+        except TypeError:
+            pass
+    
+    # Return a copy of mutable default values
+    return copy.deepcopy(default) if isinstance(default, (dict, list)) else default
+
+def __buildTokenDefaultValue(token):
+    '''
+    This private method looks up or builds the default value for the token from the model schema.
+    :param str token: The key token
+    :returns: The default value for this token or ``None`` if not found
+    '''
     try:
         # Get the domain and key from the provided token
         try:
@@ -155,7 +280,7 @@ def getDefaultValue(token):
             key = False
         
         # Get the default class
-        cls = locate(f'{__package__}.{domain}')
+        cls = __locateModel(domain)
         
         # Find a default value in the domain by key
         if cls and key:
@@ -249,6 +374,27 @@ def getDefaultValue(token):
     # If no default value has been returned so far, we finally return None
     return None
     
+def getValidatedSections(domain, value):
+    '''
+    Returns the sections (The first keys) of a domain's data which are covered by validating the data
+    against the domain's root schema (See "getValidatedValue" with the domain as token). Sections without
+    schema are not covered, neither are the sections of a schema module if the data does not define all of them.
+    :param str domain: The data domain
+    :param dict value: The domain's data
+    :returns list: The covered sections
+    '''
+    cls = __locateModel(domain)
+    if not cls or not isinstance(value, dict):
+        return []
+    # A dictionary schema covers its properties (and all sections if additional properties have a schema)
+    if isinstance(cls, dict):
+        properties = cls.get('properties') or {}
+        additional = isinstance(cls.get('additionalProperties'), dict)
+        return [key for key in value if key in properties or additional]
+    # A schema module is only applied to data defining exactly its schemas
+    schemas = {k for k in cls.__dict__.keys() if k[:1] != '_'}
+    return list(value) if set(value) == schemas else []
+
 def getValidatedValue(token, value, **kwargs):
     '''
     Returns the provided value if it passed a validation laboratory against the token's
@@ -274,7 +420,7 @@ def getValidatedValue(token, value, **kwargs):
             key = False
             
         # Get the default class
-        cls = locate(f'{__package__}.{domain}')
+        cls = __locateModel(domain)
         
         # Validate a value against a sub-schema (of a schema module in freedm.models)
         if cls and key:
@@ -297,8 +443,15 @@ def getValidatedValue(token, value, **kwargs):
             
             # In case of the following tokens: "model.property"
             elif len(tokens) >= 1 and tokens[0] in ((cls.get('properties') or cls) if isinstance(cls, dict) else cls.__dict__):
+                # Get the cached sub-schema of this token (Unless the model changed)
+                cached = __schemas.get((domain, key))
+                if __isCurrent(cached, cls):
+                    __schemas.move_to_end((domain, key))
+                    schema, tokens, cacheable = cached[2], [], False
                 # Get data schema
-                schema = (cls.get('properties') or cls)[tokens.pop(0)] if isinstance(cls, dict) else getattr(cls, tokens.pop(0))
+                else:
+                    schema = (cls.get('properties') or cls)[tokens.pop(0)] if isinstance(cls, dict) else getattr(cls, tokens.pop(0))
+                    cacheable = '+' not in tokens
                 
                 # Traverse through subschemas for each token
                 for i, t in enumerate(tokens):
@@ -395,6 +548,7 @@ def getValidatedValue(token, value, **kwargs):
 
                     # Or try using the last schema we found for the previous token
                     except:
+                        cacheable = False
                         if schema.__contains__('additionalProperties') and schema.get('additionalProperties') is False:
                             # We reset the value to None because new additional properties are not allowed
                             if exception:
@@ -410,21 +564,25 @@ def getValidatedValue(token, value, **kwargs):
                                 # Validate against the last schema we found
                                 raise ValidationError(f'Token "{t}" refers to invalid sub-element to property of type "{schema.get("type")}"')
                 
+                # Cache the found sub-schema
+                if cacheable:
+                    __putCached(__schemas, (domain, key), (*__getRevision(cls), schema), __maxSchemas)
+                
                 # Prepare the data (To get rid of dictionaries with numeric keys)
                 dataobject = __prepareCollectionObject(value)
                 
                 # Make sure that single members of a collection (=Token must contain a number) are properly packed for validation 
                 if schema.get('type') == 'array' and any(d in token for d in '0123456789') and not isinstance(dataobject, list):
                     # Value is a single collection element, we need to pack it in a list
-                    validate([dataobject], schema)
+                    __validate([dataobject], schema)
                 # Make sure that all single items in a collection are each individually checked against the schema
                 elif schema.get('type') != 'array' and '[]' in token and isinstance(dataobject, list):
                     # Validate each element individually   
                     for v in dataobject:
-                        validate(v, schema)
+                        __validate(v, schema)
                 # The normal case where a value is checked against its schema
                 else:
-                    validate(dataobject, schema)
+                    __validate(dataobject, schema)
             else:
                 raise UserWarning(f'No validation schema found for token "{domain}.{tokens[0]}.*". Define schema in "freedm.models.{domain}.py"')
 
@@ -432,13 +590,18 @@ def getValidatedValue(token, value, **kwargs):
         elif cls:
             # The dictionary is the schema
             if isinstance(cls, dict):
-                validate(value, cls)
+                __validate(value, cls)
             # Build a schema for each property we find in the class
             else:
-                # Build one JSON schema of all schema properties
-                schema = {}
-                for key in [k for k in cls.__dict__.keys() if k[:1] != '_']:
-                    schema.update({key: getattr(cls, key)})
+                # Build one JSON schema of all schema properties (Once per model, so its validator is cached as well)
+                cached = __roots.get(domain)
+                if __isCurrent(cached, cls):
+                    schema = cached[2]
+                else:
+                    schema = {}
+                    for key in [k for k in cls.__dict__.keys() if k[:1] != '_']:
+                        schema.update({key: getattr(cls, key)})
+                    __roots[domain] = (*__getRevision(cls), schema)
                 # We validate a data structure (object)
                 if isinstance(value, dict):
                     # Try validating the domain data with the found schemas
@@ -455,10 +618,10 @@ def getValidatedValue(token, value, **kwargs):
                             # Prepare the data (To get rid of dictionaries with numeric keys)
                             dataobject = __prepareCollectionObject(value[v])
                             # Validate
-                            validate(dataobject, schema[v])
+                            __validate(dataobject, schema[v])
                 # We validate just one single value
                 else:
-                    validate(value, schema)
+                    __validate(value, schema)
         # If no class is found at all, make sure we raise an exception and return "None"
         else:
             raise UserWarning(f'No validation schema found for token "{domain}.*". Define schema in "freedm.models.{domain}.py"')
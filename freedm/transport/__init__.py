@@ -10,4 +10,6 @@ from freedm.transport.server.tcp import TCPSocketServer
 from freedm.transport.client.tcp import TCPSocketClient
 from freedm.transport.message import Message
 from freedm.transport.protocol import Protocol
-from freedm.transport.connection import Connection, ConnectionType, ConnectionPool, AddressType
\ No newline at end of file
+from freedm.transport.connection import Connection, ConnectionType, ConnectionPool, AddressType
+from freedm.transport.heartbeat import Heartbeat
+from freedm.transport.shm import SharedMemoryChannel
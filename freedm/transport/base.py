@@ -9,10 +9,12 @@ template methods awaiting their implementation in a subclass.
 
 try:
     # Imports
+    import os
     import textwrap
     import time
+    import socket
     import asyncio
-    from typing import TypeVar, Optional, Union, Iterable
+    from typing import TypeVar, Optional, Union, Iterable, List
     
     # free.dm Imports
     from freedm.utils import logging
@@ -20,6 +22,9 @@ try:
     from freedm.transport.protocol import Protocol
     from freedm.transport.message import Message
     from freedm.transport.connection import Connection, ConnectionType
+    from freedm.transport.control import ControlFrame, FRAME_START, FRAME_END, decodeFrames, encodeFrame
+    from freedm.transport.heartbeat import Heartbeat
+    from freedm.transport.shm import SharedMemoryChannel
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
     raise freedmModuleImport(e)
@@ -42,23 +47,47 @@ class Transport(BlockingContextManager):
     # The default line separator used for reading lines
     line_separator: str='\n'
     
+    # An optional heartbeat surveilling persistent connections
+    heartbeat: Optional[Heartbeat]=None
+    
+    # An optional shared memory channel for large messages (Same host peers only)
+    shm: Optional[SharedMemoryChannel]=None
+    
+    # The transport methods handling received control frames by frame kind
+    _control_handlers: dict={
+        'PING': '_handleHeartbeatFrame',
+        'PONG': '_handleHeartbeatFrame',
+        'SHMOPEN': '_handleSharedMemoryFrame',
+        'SHMOK': '_handleSharedMemoryFrame',
+        'SHMNO': '_handleSharedMemoryFrame',
+        'SHMDATA': '_handleSharedMemoryFrame',
+        'SHMFREE': '_handleSharedMemoryFrame',
+        'FDS': '_handleFileDescriptorFrame',
+        'FDREADY': '_handleFileDescriptorFrame',
+        'FDNO': '_handleFileDescriptorFrame',
+        'FDDATA': '_handleFileDescriptorFrame'
+        }
+    
+    # The number of seconds to wait for the peer while passing file descriptors
+    fd_timeout: float=5
+    
+    # In-band control frames are only filtered from the received data if enabled (Implied by a heartbeat or a shared memory channel),
+    # as binary messages might contain the frame markers. Both endpoints must enable control frames (e.g. to pass file descriptors)
+    control_frames: bool=False
+    
     def __init__(
             self,
-            protocol: Optional[Protocol] = None
+            protocol: Optional[Protocol] = None,
+            heartbeat: Optional[Heartbeat] = None
             ) -> None:
         
         self.logger = logging.getLogger()
+        self.heartbeat = heartbeat
         if not self.name:
             self.name = self.__class__.__name__
         if protocol:
             self.setProtocol(protocol)
             
-    async def __await__(self) -> T:
-        '''
-        Template method: Makes this class awaitable
-        '''
-        return await self.__aenter__()
-    
     async def __aenter__(self) -> T:
         '''
         Template method: Make this class work like an async context manager
@@ -80,9 +109,12 @@ class Transport(BlockingContextManager):
         '''
         try:
             if not connection.writer.transport.is_closing():
-                # Dispatch message
-                connection.writer.write(message)
-                await connection.writer.drain()
+                # Pass large messages via shared memory if possible
+                if not (self.shm and await self.shm.dispatch(self, connection, message)):
+                    # Dispatch message (Writes are serialized as passing file descriptors spans several writes)
+                    async with self._getWriteLock(connection):
+                        connection.writer.write(message)
+                        await connection.writer.drain()
                 
                 # Close an ephemeral connection, immediately after sending the message
                 if connection.state['mode'] == ConnectionType.EPHEMERAL:
@@ -95,6 +127,248 @@ class Transport(BlockingContextManager):
         except:
             return False
     
+    @staticmethod
+    def _getWriteLock(connection: Connection) -> asyncio.Lock:
+        '''
+        Returns the lock serializing the writes to a connection
+        '''
+        lock = connection.state.get('lock')
+        if lock is None:
+            lock = connection.state['lock'] = asyncio.Lock()
+        return lock
+    
+    @staticmethod
+    def _getFileDescriptorLock(connection: Connection) -> asyncio.Lock:
+        '''
+        Returns the lock serializing the file descriptor transfers via a connection
+        '''
+        lock = connection.state.get('fds_lock')
+        if lock is None:
+            lock = connection.state['fds_lock'] = asyncio.Lock()
+        return lock
+    
+    async def _sendControlFrame(self, connection: Connection, kind: str, payload: str='') -> bool:
+        '''
+        Sends a control frame (e.g. a heartbeat) to the peer of the connection
+        '''
+        if connection.state['closed']:
+            return False
+        return await self._dispatchMessage(encodeFrame(kind, payload, self.line_separator if getattr(self, 'lines', False) else ''), connection)
+    
+    async def _handleControlFrames(self, connection: Connection, raw: bytes) -> bytes:
+        '''
+        Filters control frames from the received data and passes them to their handlers.
+        Returns the remaining message data.
+        '''
+        if not self._usesControlFrames():
+            return raw
+        partial = connection.state.get('control')
+        if not partial and FRAME_START[:1] not in raw:
+            return raw
+        data, frames, connection.state['control'] = decodeFrames(raw, partial or b'', self.line_separator if getattr(self, 'lines', False) else '')
+        for frame in frames:
+            handler = self._control_handlers.get(frame.kind)
+            if handler is None:
+                self.logger.debug(f'{self.name} received unsupported control frame "{frame.kind}"')
+                continue
+            try:
+                await getattr(self, handler)(connection, frame)
+            except Exception as e:
+                self.logger.error(f'{self.name} failed to handle control frame "{frame.kind}" ({e})')
+        return data
+    
+    def _usesControlFrames(self) -> bool:
+        '''
+        Checks if this transport exchanges in-band control frames with its peers
+        '''
+        return bool(self.control_frames or self.heartbeat or self.shm)
+    
+    async def _handleHeartbeatFrame(self, connection: Connection, frame: ControlFrame) -> None:
+        '''
+        Passes a ping/pong control frame to the heartbeat
+        '''
+        if self.heartbeat:
+            await self.heartbeat.handleFrame(self, connection, frame)
+    
+    async def _handleSharedMemoryFrame(self, connection: Connection, frame: ControlFrame) -> None:
+        '''
+        Passes a shared memory control frame to the shared memory channel
+        '''
+        if self.shm:
+            await self.shm.handleFrame(self, connection, frame)
+        elif frame.kind == 'SHMOPEN':
+            # Decline the peer's ring
+            await self._sendControlFrame(connection, 'SHMNO', frame.payload.rsplit(':', 1)[0])
+    
+    async def _handleFileDescriptorFrame(self, connection: Connection, frame: ControlFrame) -> None:
+        '''
+        Handles the control frames of a file descriptor transfer:
+        - FDS: The peer announces file descriptors
+        - FDREADY/FDNO: The peer is ready to receive (or declines) the announced file descriptors
+        - FDDATA: The message carrying the file descriptors (Already handled while receiving them)
+        '''
+        if frame.kind == 'FDS':
+            if self._supportsFileDescriptors(connection):
+                await self._receiveFileDescriptors(connection, int(frame.payload))
+            else:
+                await self._sendControlFrame(connection, 'FDNO', frame.payload)
+        elif frame.kind in ('FDREADY', 'FDNO'):
+            ready = connection.state.get('fds_ready')
+            if ready and not ready.done():
+                ready.set_result(frame.kind == 'FDREADY')
+    
+    @staticmethod
+    def _supportsFileDescriptors(connection: Connection) -> bool:
+        '''
+        Checks if file descriptors can be passed via the connection (Unencrypted UXD sockets only)
+        '''
+        return connection.socket is not None and connection.socket.family == socket.AF_UNIX and not connection.sslobj
+    
+    async def _receiveFileDescriptors(self, connection: Connection, count: int) -> None:
+        '''
+        Receives file descriptors announced by the peer. The socket is read directly (The stream
+        reader would drop the ancillary data) while the connection's transport stops reading.
+        Any other received data is passed back to the stream reader.
+        '''
+        loop = asyncio.get_running_loop()
+        transport = connection.writer.transport
+        transport.pause_reading()
+        sock = connection.socket.dup()
+        fds = []
+        try:
+            await self._sendControlFrame(connection, 'FDREADY', str(count))
+            deadline = loop.time() + self.fd_timeout
+            while not fds:
+                readable = loop.create_future()
+                loop.add_reader(sock.fileno(), lambda: readable.done() or readable.set_result(True))
+                try:
+                    await asyncio.wait_for(readable, max(0, deadline - loop.time()))
+                finally:
+                    loop.remove_reader(sock.fileno())
+                try:
+                    data, fds, _flags, _address = socket.recv_fds(sock, 65536, count)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                if data:
+                    connection.reader.feed_data(self._takeFileDescriptorAnswer(connection, data))
+                elif not fds:
+                    connection.reader.feed_eof()
+                    break
+        except asyncio.TimeoutError:
+            self.logger.warning(f'{self.name} did not receive announced file descriptors within {self.fd_timeout}s')
+        except Exception as e:
+            self.logger.error(f'{self.name} failed to receive file descriptors ({e})')
+        finally:
+            sock.close()
+            if not transport.is_closing():
+                transport.resume_reading()
+        if fds:
+            await self.handleFileDescriptors(connection, fds)
+    
+    def _takeFileDescriptorAnswer(self, connection: Connection, data: bytes) -> bytes:
+        '''
+        Takes the peer's answer (FDREADY/FDNO) to an own pending file descriptor transfer from data read while
+        receiving the peer's file descriptors, as both peers might pass file descriptors at the same time
+        '''
+        ready = connection.state.get('fds_ready')
+        if not ready or ready.done():
+            return data
+        separator = self.line_separator.encode() if getattr(self, 'lines', False) else b''
+        for kind in ('FDREADY', 'FDNO'):
+            start = data.find(FRAME_START + kind.encode() + b':')
+            end = data.find(FRAME_END, start + len(FRAME_START)) if start != -1 else -1
+            if end != -1:
+                end += len(FRAME_END)
+                if separator and data.startswith(separator, end):
+                    end += len(separator)
+                ready.set_result(kind == 'FDREADY')
+                return data[:start] + data[end:]
+        return data
+    
+    async def send_fds(self, fds: Iterable[int], connection: Optional[Connection]=None) -> bool:
+        '''
+        Passes open file descriptors (files, pipes, sockets, ...) to the peer of a UXD socket
+        connection (SCM_RIGHTS). The peer receives duplicates of the descriptors, the caller keeps
+        and still has to close its own. Returns ``True`` if the descriptors were sent.
+        Both endpoints must enable control frames ("control_frames").
+        :param fds: The file descriptors (or objects providing a "fileno" method)
+        :param Connection connection: The connection to the peer (Clients default to their connection)
+        '''
+        connection = connection or getattr(self, '_connection', None)
+        fds = [fd if isinstance(fd, int) else fd.fileno() for fd in fds]
+        if not fds or not connection or connection.state['closed']:
+            return False
+        if not self._supportsFileDescriptors(connection):
+            self.logger.error(f'{self.name} cannot pass file descriptors (Requires an unencrypted UXD socket)')
+            return False
+        separator = self.line_separator if getattr(self, 'lines', False) else ''
+        loop = asyncio.get_running_loop()
+        # Transfers are serialized, as each waits for the peer's answer. Other writes only pause while writing
+        async with self._getFileDescriptorLock(connection):
+            ready = connection.state['fds_ready'] = loop.create_future()
+            sock = connection.socket.dup()
+            try:
+                # Announce the descriptors and wait until the peer reads the socket directly
+                async with self._getWriteLock(connection):
+                    connection.writer.write(encodeFrame('FDS', str(len(fds)), separator))
+                    await connection.writer.drain()
+                if not await asyncio.wait_for(ready, self.fd_timeout):
+                    self.logger.debug(f'{self.name} peer declined file descriptors')
+                    return False
+                
+                # Flush any buffered data before passing the descriptors with a control frame
+                async with self._getWriteLock(connection):
+                    deadline = loop.time() + self.fd_timeout
+                    while connection.writer.transport.get_write_buffer_size():
+                        if loop.time() > deadline:
+                            raise asyncio.TimeoutError()
+                        await asyncio.sleep(.001)
+                    payload = encodeFrame('FDDATA', str(len(fds)), separator)
+                    while True:
+                        try:
+                            socket.send_fds(sock, [payload], fds)
+                            return True
+                        except (BlockingIOError, InterruptedError):
+                            if loop.time() > deadline:
+                                raise asyncio.TimeoutError()
+                            await asyncio.sleep(.001)
+            except asyncio.TimeoutError:
+                self.logger.warning(f'{self.name} peer did not accept file descriptors within {self.fd_timeout}s')
+                return False
+            except Exception as e:
+                self.logger.error(f'{self.name} failed to pass file descriptors ({e})')
+                return False
+            finally:
+                sock.close()
+                connection.state['fds_ready'] = None
+    
+    async def receive_fds(self, connection: Optional[Connection]=None, timeout: Optional[float]=None) -> List[int]:
+        '''
+        Returns the next file descriptors passed by the peer (See "handleFileDescriptors").
+        The caller owns the returned descriptors and has to close them.
+        :param Connection connection: The connection to the peer (Clients default to their connection)
+        :param float timeout: The optional number of seconds to wait for descriptors
+        '''
+        connection = connection or getattr(self, '_connection', None)
+        return await asyncio.wait_for(self._getFileDescriptorQueue(connection).get(), timeout)
+    
+    @staticmethod
+    def _getFileDescriptorQueue(connection: Connection) -> asyncio.Queue:
+        '''
+        Returns the queue of file descriptors received via a connection
+        '''
+        queue = connection.state.get('fds')
+        if queue is None:
+            queue = connection.state['fds'] = asyncio.Queue()
+        return queue
+    
+    def _startHeartbeat(self, connection: Connection) -> None:
+        '''
+        Starts the heartbeat of a persistent connection if this transport is configured with one
+        '''
+        if self.heartbeat:
+            self.heartbeat.start(self, connection)
+    
     async def close(self) -> None:
         '''
         Stop this transport endpoint
@@ -149,7 +423,9 @@ class Transport(BlockingContextManager):
         '''
         try:
             while not connection.reader.at_eof():
+                connection.state['updated'] = time.time()
                 raw = await connection.reader.read(self.limit or -1)
+                raw = await self._handleControlFrames(connection, raw)
                 if raw and not len(raw) == 0:
                     message = Message(
                         data=raw,
@@ -180,6 +456,18 @@ class Transport(BlockingContextManager):
         End and close an existing connection:
         Acknowledge or inform the peer about EOF, then close.
         '''
+        if connection and self.heartbeat:
+            self.heartbeat.stop(connection)
+        if connection and self.shm:
+            self.shm.close(connection)
+        if connection and connection.state.get('fds'):
+            # Close received file descriptors which were never claimed
+            while not connection.state['fds'].empty():
+                for fd in connection.state['fds'].get_nowait():
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
         if connection and not connection.writer.transport.is_closing():
             # Tell transport the reason
             if reason:
@@ -196,7 +484,7 @@ class Transport(BlockingContextManager):
                 await asyncio.sleep(.1)
                 connection.writer.close()
                 await connection.writer.wait_closed()
-            except:
+            except Exception:
                 pass
             finally:
                 # Make sure we set this in any case
@@ -221,6 +509,16 @@ class Transport(BlockingContextManager):
         except:
             self.logger.debug(f'{self.name} received: {textwrap.shorten(message.data.decode(), 50, placeholder="...")}')
     
+    async def handleFileDescriptors(self, connection: Connection, fds: List[int]) -> None:
+        '''
+        This method handles file descriptors passed by the peer. By default they are queued
+        until claimed via "receive_fds". Should be overwritten by a subclass or implemented by protocol.
+        '''
+        try:
+            await self.protocol.handleFileDescriptors(connection, fds)
+        except AttributeError:
+            await self._getFileDescriptorQueue(connection).put(fds)
+    
     async def handleConnectionFailure(self, connection: Connection) -> None:
         '''
         This method is called when a connection failed, for instance when the socket is dead.
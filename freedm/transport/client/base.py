@@ -17,6 +17,7 @@ try:
     from freedm.transport.message import Message
     from freedm.transport.protocol import Protocol
     from freedm.transport.connection import Connection, ConnectionType
+    from freedm.transport.heartbeat import Heartbeat
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
     raise freedmModuleImport(e)
@@ -59,7 +60,8 @@ class TransportClient(Transport):
             lines: Optional[bool]=False,
             chunksize: Optional[int]=None,
             mode: Optional[ConnectionType]=None,
-            protocol: Optional[Protocol] = None
+            protocol: Optional[Protocol] = None,
+            heartbeat: Optional[Heartbeat] = None
             ) -> None:
         
         self.logger     = logging.getLogger()
@@ -69,6 +71,7 @@ class TransportClient(Transport):
         self.chunksize  = chunksize
         self.mode       = mode
         self.lines      = lines
+        self.heartbeat  = heartbeat
         
         if not self.name:
             self.name = self.__class__.__name__
@@ -158,6 +161,7 @@ class TransportClient(Transport):
                         ),
                     loop=self.loop
                 )
+            self._startHeartbeat(self._connection)
         except Exception as e:
             self.logger.debug('Transport connection handler could not be initialized')
     
@@ -240,6 +244,9 @@ class TransportClient(Transport):
                     else:
                         raw = await connection.reader.read(self.limit or -1)
                     
+                    # Filter transport control frames (e.g. heartbeats)
+                    raw = await self._handleControlFrames(connection, raw)
+                    
                     # Handle the received message or message fragment by a new non-blocking task
                     if raw and not len(raw) == 0:
                         message = Message(
@@ -249,6 +256,7 @@ class TransportClient(Transport):
                         # Never launch another message handler while we're being disconnected (this task getting already cancelled)
                         if (self._handler and not self._handler.done()) and not connection.state['closed']:
                             reader = asyncio.ensure_future(self.handleMessage(message), loop=self.loop)
+                            reader.set_name(f'{self.name}.read_handler')
                             reader.add_done_callback(lambda task: connection.read_handlers.remove(task) if connection.read_handlers and task in connection.read_handlers else None)
                             connection.read_handlers.add(reader)
                 except asyncio.CancelledError:
@@ -289,7 +297,7 @@ class TransportClient(Transport):
             # Dispatch message as long as not we're being disconnected (this task getting cancelled)
             if self._connection and not self._handler.done() and not self._connection.state['closed']:
                 # Dispatch and store future with a callback
-                writer = asyncio.create_task(self._dispatchMessage(message, self._connection))
+                writer = asyncio.create_task(self._dispatchMessage(message, self._connection), name=f'{self.name}.write_handler')
                 writer.add_done_callback(lambda task: self._connection.write_handlers.remove(task) if self._connection and task in self._connection.write_handlers else None)
                 self._connection.write_handlers.add(writer)
                 
@@ -16,6 +16,7 @@ try:
     from freedm.transport.client.base import TransportClient
     from freedm.transport.exceptions import freedmSocketCreation, freedmSocketShutdown
     from freedm.transport.protocol import Protocol
+    from freedm.transport.heartbeat import Heartbeat
     from freedm.transport.connection import Connection, ConnectionType, AddressType
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
@@ -51,10 +52,11 @@ class TCPSocketClient(TransportClient):
             lines: Optional[bool]=False,
             chunksize: Optional[int]=None,
             mode: Optional[ConnectionType]=None,
-            protocol: Optional[Protocol]=None
+            protocol: Optional[Protocol]=None,
+            heartbeat: Optional[Heartbeat]=None
             ) -> None:
         
-        super().__init__(loop, timeout, limit, lines, chunksize, mode, protocol)
+        super().__init__(loop, timeout, limit, lines, chunksize, mode, protocol, heartbeat)
         self.address = address
         self.port = port
         self.family = family
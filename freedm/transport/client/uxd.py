@@ -17,6 +17,8 @@ try:
     from freedm.transport.client.base import TransportClient
     from freedm.transport.exceptions import freedmSocketCreation, freedmSocketShutdown
     from freedm.transport.protocol import Protocol
+    from freedm.transport.heartbeat import Heartbeat
+    from freedm.transport.shm import SharedMemoryChannel
     from freedm.transport.connection import Connection, ConnectionType
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
@@ -31,6 +33,9 @@ class UXDSocketClient(TransportClient):
     To secure the communication between the client and server, pass a pre-setup SSL
     context object as parameter. Be aware that you need to set an address for the server
     if you verify the host certificate via " SSLContext.check_hostname".
+    
+    File descriptors:
+    File descriptors passed by the server are received via "receive_fds" (Unencrypted connections only).
     '''
     
     # The UXD socket
@@ -47,13 +52,16 @@ class UXDSocketClient(TransportClient):
             lines: Optional[bool]=False,
             chunksize: Optional[int]=None,
             mode: Optional[ConnectionType]=None,
-            protocol: Optional[Protocol]=None
+            protocol: Optional[Protocol]=None,
+            heartbeat: Optional[Heartbeat]=None,
+            shm: Optional[SharedMemoryChannel]=None
             ) -> None:
         
-        super().__init__(loop, timeout, limit, lines, chunksize, mode, protocol)
+        super().__init__(loop, timeout, limit, lines, chunksize, mode, protocol, heartbeat)
         self.path = path
         self.address = address
         self.sslctx = sslctx
+        self.shm = shm
         
     async def _init_connect(self):
         if not self.path:
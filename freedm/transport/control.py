@@ -0,0 +1,88 @@
+'''
+This module defines control frames exchanged in-band between transport endpoints
+(heartbeats and other transport internal signalling) next to the regular messages
+@author: Thomas Wanderer
+'''
+
+# Imports
+import re
+import functools
+from collections import namedtuple
+from typing import Tuple, List
+
+
+# Control frames are enclosed by NUL bytes which never occur in encoded text messages
+FRAME_START = b'\x00FDM:'
+FRAME_END = b'\x00'
+
+# The pattern of a complete control frame: <START><KIND>:<PAYLOAD><END>
+FRAME_PATTERN = re.compile(rb'\x00FDM:([A-Z]+):([^\x00]*)\x00')
+
+
+ControlFrame = namedtuple('ControlFrame',
+    '''
+    kind
+    payload
+    '''
+    )
+
+
+def encodeFrame(kind: str, payload: str='', separator: str='') -> bytes:
+    '''
+    Encodes a control frame of the provided kind. Transports reading line by line
+    must pass their line separator, so the peer does not wait for the line to end.
+    :param str kind: The frame kind (uppercase letters only)
+    :param str payload: The optional frame payload (must not contain NUL bytes)
+    :param str separator: An optional line separator appended to the frame
+    :returns: The encoded frame
+    :rtype: bytes
+    '''
+    return FRAME_START + f'{kind}:{payload}'.encode() + FRAME_END + separator.encode()
+
+
+def decodeFrames(raw: bytes, partial: bytes=b'', separator: str='') -> Tuple[bytes, List[ControlFrame], bytes]:
+    '''
+    Extracts all control frames from received data. A frame which was cut off at the
+    end of the data is returned separately and must be passed as ``partial`` with the next
+    received data.
+    :param bytes raw: The received data
+    :param bytes partial: An incomplete frame left over from the previous read
+    :param str separator: The line separator the sender appended to each frame
+    :returns: The data without control frames, the decoded frames and an incomplete trailing frame
+    :rtype: tuple
+    '''
+    raw = partial + raw
+    pattern = __framePattern(separator)
+
+    # Collect the frames (including the line separator terminating them)
+    frames = []
+    tail = 0
+    for match in pattern.finditer(raw):
+        frames.append(ControlFrame(kind=match.group(1).decode(), payload=match.group(2).decode()))
+        tail = match.end()
+
+    # Keep an incomplete frame at the end of the data for the next read
+    rest = b''
+    start = raw.find(FRAME_START, tail)
+    if start != -1:
+        raw, rest = raw[:start], raw[start:]
+    else:
+        # The frame start itself might be cut off
+        for i in range(len(FRAME_START) - 1, 0, -1):
+            if len(raw) - i >= tail and raw.endswith(FRAME_START[:i]):
+                raw, rest = raw[:-i], raw[-i:]
+                break
+
+    # Remove the frames from the data
+    data = pattern.sub(b'', raw) if frames else raw
+    return data, frames, rest
+
+
+@functools.lru_cache(maxsize=8)
+def __framePattern(separator: str):
+    '''
+    Returns the compiled frame pattern optionally consuming a trailing line separator
+    '''
+    if not separator:
+        return FRAME_PATTERN
+    return re.compile(FRAME_PATTERN.pattern + b'(?:' + re.escape(separator.encode()) + b')?')
@@ -0,0 +1,202 @@
+'''
+This module defines a heartbeat which keeps persistent transport connections under surveillance
+by exchanging ping/pong control frames and by tuning the TCP keepalive of the connection socket
+@author: Thomas Wanderer
+'''
+
+try:
+    # Imports
+    import time
+    import socket
+    import asyncio
+    from typing import Optional, Dict, Any
+
+    # free.dm Imports
+    from freedm.utils import logging
+    from freedm.transport.control import ControlFrame
+    from freedm.transport.connection import Connection, ConnectionType
+except ImportError as e:
+    from freedm.utils.exceptions import freedmModuleImport
+    raise freedmModuleImport(e)
+
+
+class Heartbeat:
+    '''
+    A heartbeat periodically pings the peer of a persistent connection and measures the round trip
+    time (RTT) of each ping. A peer which neither answers the pings nor sends any other data for
+    several consecutive intervals is considered dead: The transport's "handleConnectionFailure"
+    handler is called and the connection gets closed. This detects half-open links within
+    ``interval * misses`` seconds instead of on the next failing write.
+
+    Both endpoints of a connection need to be configured with a heartbeat as the pings are sent as
+    in-band control frames which are filtered from the message stream (A heartbeat enables the
+    transport's control frames).
+
+    Statistics:
+    The RTT statistics of each connection are kept in the connection's state ("heartbeat"):
+    - rtt: The last measured round trip time (seconds)
+    - srtt: The smoothed round trip time
+    - jitter: The smoothed RTT variation
+    - min/max: The minimal and maximal measured round trip time
+    - sent/received/missed: The number of sent pings, received pongs and unanswered pings
+
+    Socket tuning:
+    TCP sockets are additionally configured with TCP_KEEPALIVE/TCP_USER_TIMEOUT derived from the
+    heartbeat settings, so the kernel detects dead peers as well (where supported by the platform).
+    '''
+
+    # Smoothing factors of the RTT estimation (See RFC 6298)
+    alpha: float=1/8
+    beta: float=1/4
+
+    def __init__(
+            self,
+            interval: float=5,
+            timeout: Optional[float]=None,
+            misses: int=3,
+            keepalive: bool=True
+            ) -> None:
+        '''
+        :param float interval: The number of seconds between two pings
+        :param float timeout: The number of seconds to wait for a pong (Default: The interval)
+        :param int misses: The number of consecutive missed pongs until the peer is considered dead
+        :param bool keepalive: ``True`` if TCP sockets should be configured with keepalive options
+        '''
+        self.logger     = logging.getLogger()
+        self.interval   = interval
+        self.timeout    = timeout or interval
+        self.misses     = max(1, misses)
+        self.keepalive  = keepalive
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.interval}s>'
+
+    @staticmethod
+    def getStats(connection: Connection) -> Optional[Dict[str, Any]]:
+        '''
+        Returns the heartbeat statistics of a connection or ``None`` if the connection has no heartbeat
+        '''
+        stats = connection.state.get('heartbeat')
+        return {k: v for k, v in stats.items() if not k.startswith('_')} if stats else None
+
+    def configureSocket(self, sock: socket.socket) -> None:
+        '''
+        Configures the TCP keepalive of a socket to detect dead peers at kernel level
+        '''
+        if not self.keepalive or sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+            return
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            idle = max(1, int(self.interval))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+            elif hasattr(socket, 'TCP_KEEPALIVE'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle)
+            if hasattr(socket, 'TCP_KEEPINTVL'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(self.timeout)))
+            if hasattr(socket, 'TCP_KEEPCNT'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, self.misses)
+            if hasattr(socket, 'TCP_USER_TIMEOUT'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, int((self.interval + self.timeout * self.misses) * 1000))
+        except OSError as e:
+            self.logger.debug(f'Cannot configure TCP keepalive of socket ({e})')
+
+    def start(self, transport, connection: Connection) -> Optional[asyncio.Task]:
+        '''
+        Starts the heartbeat of a persistent connection
+        '''
+        if connection.state['mode'] != ConnectionType.PERSISTENT or connection.state.get('heartbeat'):
+            return None
+        self.configureSocket(connection.socket)
+        connection.state['heartbeat'] = {
+            'rtt': None,
+            'srtt': None,
+            'jitter': None,
+            'min': None,
+            'max': None,
+            'sent': 0,
+            'received': 0,
+            'missed': 0,
+            '_sequence': 0,
+            '_pending': None,
+            '_streak': 0,
+            '_task': None
+            }
+        task = asyncio.ensure_future(self._beat(transport, connection), loop=transport.loop)
+        task.set_name(f'{transport.name}.heartbeat')
+        connection.state['heartbeat']['_task'] = task
+        return task
+
+    def stop(self, connection: Connection) -> None:
+        '''
+        Stops the heartbeat of a connection (Unless called by the heartbeat itself, e.g. closing the connection of a dead peer)
+        '''
+        stats = connection.state.get('heartbeat')
+        if stats and stats['_task'] and not stats['_task'].done() and stats['_task'] is not asyncio.current_task():
+            stats['_task'].cancel()
+
+    async def _beat(self, transport, connection: Connection) -> None:
+        '''
+        Pings the peer each interval and detects a dead peer
+        '''
+        stats = connection.state['heartbeat']
+        try:
+            while not connection.state['closed']:
+                await asyncio.sleep(self.interval if not stats['_pending'] else self.timeout)
+                if connection.state['closed']:
+                    return
+                now = time.time()
+
+                # Check if the pending ping was answered in time. Any other received data also proves the peer is alive
+                pending = stats['_pending']
+                if pending and now - pending[1] >= self.timeout:
+                    stats['_pending'] = None
+                    if connection.state['updated'] > pending[1]:
+                        stats['_streak'] = 0
+                    else:
+                        stats['_streak'] += 1
+                        stats['missed'] += 1
+                        self.logger.debug(f'{transport.name} missed heartbeat {stats["_streak"]}/{self.misses} of peer')
+                        if stats['_streak'] >= self.misses:
+                            self.logger.warning(f'{transport.name} detected a dead peer (No sign of life for {now - connection.state["updated"]:.1f}s)')
+                            await transport.handleConnectionFailure(connection)
+                            await transport.closeConnection(connection)
+                            return
+
+                # Send the next ping
+                if not stats['_pending']:
+                    stats['_sequence'] += 1
+                    stats['_pending'] = (stats['_sequence'], time.time())
+                    stats['sent'] += 1
+                    await transport._sendControlFrame(connection, 'PING', str(stats['_sequence']))
+        except asyncio.CancelledError:
+            return
+
+    async def handleFrame(self, transport, connection: Connection, frame: ControlFrame) -> None:
+        '''
+        Answers a ping or evaluates the pong of the peer
+        '''
+        if frame.kind == 'PING':
+            await transport._sendControlFrame(connection, 'PONG', frame.payload)
+        elif frame.kind == 'PONG':
+            stats = connection.state.get('heartbeat')
+            if not stats or not stats['_pending'] or str(stats['_pending'][0]) != frame.payload:
+                return
+            self._updateStats(stats, time.time() - stats['_pending'][1])
+            stats['_pending'] = None
+            stats['_streak'] = 0
+
+    def _updateStats(self, stats: Dict[str, Any], rtt: float) -> None:
+        '''
+        Updates the RTT statistics with a new measurement
+        '''
+        stats['received'] += 1
+        stats['rtt'] = rtt
+        stats['min'] = rtt if stats['min'] is None else min(stats['min'], rtt)
+        stats['max'] = rtt if stats['max'] is None else max(stats['max'], rtt)
+        if stats['srtt'] is None:
+            stats['srtt'] = rtt
+            stats['jitter'] = rtt / 2
+        else:
+            stats['jitter'] = (1 - self.beta) * stats['jitter'] + self.beta * abs(stats['srtt'] - rtt)
+            stats['srtt'] = (1 - self.alpha) * stats['srtt'] + self.alpha * rtt
@@ -19,6 +19,7 @@ try:
     from freedm.transport.message import Message
     from freedm.transport.protocol import Protocol
     from freedm.transport.connection import Connection, ConnectionType, ConnectionPool
+    from freedm.transport.heartbeat import Heartbeat
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
     raise freedmModuleImport(e)
@@ -79,7 +80,8 @@ class TransportServer(Transport):
             chunksize: Optional[int]=None,
             max_connections: Optional[int]=None,
             mode: Optional[ConnectionType]=None,
-            protocol: Optional[Protocol]=None
+            protocol: Optional[Protocol]=None,
+            heartbeat: Optional[Heartbeat]=None
             ) -> None:
         
         self.logger     = logging.getLogger()
@@ -88,6 +90,7 @@ class TransportServer(Transport):
         self.chunksize  = chunksize
         self.mode       = mode
         self.lines      = lines
+        self.heartbeat  = heartbeat
         
         if not self.name:
             self.name = self.__class__.__name__
@@ -183,8 +186,10 @@ class TransportServer(Transport):
             session = asyncio.ensure_future(self.rejectConnection(connection, 'Too many connections'), loop=self.loop)
         else:
             session = asyncio.ensure_future(self._handleConnection(connection), loop=self.loop)
+            session.set_name(f'{self.name}.session')
             self._connection_pool.add(session)
             session.add_done_callback(lambda task: self._connection_pool.remove(session))
+            self._startHeartbeat(connection)
         return session
     
     async def _init_server(self) -> Any:
@@ -267,6 +272,9 @@ class TransportServer(Transport):
                     # Default read (Respecting set limit)
                     else:
                         raw = await connection.reader.read(self.limit or -1)
+                    
+                    # Filter transport control frames (e.g. heartbeats)
+                    raw = await self._handleControlFrames(connection, raw)
                         
                     # Handle the received message or message fragment
                     if raw and not len(raw) == 0:
@@ -277,6 +285,7 @@ class TransportServer(Transport):
                         # Never launch another message handler while we're being shutdown (this task getting already cancelled)
                         if not self._shutdown and not connection.state['closed']:
                             reader = asyncio.ensure_future(self.handleMessage(message), loop=self.loop)
+                            reader.set_name(f'{self.name}.read_handler')
                             reader.add_done_callback(lambda task: connection.read_handlers.remove(task) if connection.read_handlers and task in connection.read_handlers else None)
                             connection.read_handlers.add(reader)
                 except asyncio.CancelledError:
@@ -18,6 +18,7 @@ try:
     from freedm.transport.exceptions import freedmSocketCreation
     from freedm.transport.connection import Connection, ConnectionType, AddressType
     from freedm.transport.protocol import Protocol
+    from freedm.transport.heartbeat import Heartbeat
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
     raise freedmModuleImport(e)
@@ -55,10 +56,11 @@ class TCPSocketServer(TransportServer):
             lines: Optional[bool]=False,
             max_connections: Optional[int]=None,
             mode: Optional[ConnectionType]=None,
-            protocol: Optional[Protocol]=None
+            protocol: Optional[Protocol]=None,
+            heartbeat: Optional[Heartbeat]=None
             ) -> None:
         
-        super().__init__(loop, limit, lines, chunksize, max_connections, mode, protocol)
+        super().__init__(loop, limit, lines, chunksize, max_connections, mode, protocol, heartbeat)
         self.address = address if isinstance(address, list) else [address]
         self.port = port
         self.family = family
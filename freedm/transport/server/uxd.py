@@ -20,6 +20,8 @@ try:
     from freedm.transport.exceptions import freedmSocketCreation, freedmSocketShutdown
     from freedm.transport.connection import Connection, ConnectionType
     from freedm.transport.protocol import Protocol
+    from freedm.transport.heartbeat import Heartbeat
+    from freedm.transport.shm import SharedMemoryChannel
 except ImportError as e:
     from freedm.utils.exceptions import freedmModuleImport
     raise freedmModuleImport(e)
@@ -39,6 +41,12 @@ class UXDSocketServer(TransportServer):
     from the same group (as the server). Set the respective optional boolean parameters "group_only"
     or "user_only". Any further user context restriction can be implemented in the "authenticateConnection"
     method. The connection object should be configured with user and group information.
+    
+    Performance:
+    Large messages can be exchanged via shared memory instead of the socket by passing a
+    "SharedMemoryChannel" (The clients need to be configured with a channel as well).
+    Open files, pipes or sockets can be handed over to a client via "send_fds" instead of
+    streaming their contents (Not available for SSL-secured connections).
     '''
     
     def __init__(
@@ -53,14 +61,17 @@ class UXDSocketServer(TransportServer):
             lines: Optional[bool]=False,
             max_connections: Optional[int]=None,
             mode: Optional[ConnectionType]=None,
-            protocol: Optional[Protocol]=None
+            protocol: Optional[Protocol]=None,
+            heartbeat: Optional[Heartbeat]=None,
+            shm: Optional[SharedMemoryChannel]=None
             ) -> None:
         
-        super().__init__(loop, limit, lines, chunksize, max_connections, mode, protocol)
+        super().__init__(loop, limit, lines, chunksize, max_connections, mode, protocol, heartbeat)
         self.path = path
         self.group_only = group_only
         self.user_only = user_only
         self.sslctx = sslctx
+        self.shm = shm
 
     async def _init_server(self) -> Any:
         if not self.path:
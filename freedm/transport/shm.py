@@ -0,0 +1,266 @@
+'''
+This module defines a shared memory channel allowing transport endpoints on the same host
+to exchange large messages via a shared memory ring buffer instead of the socket
+@author: Thomas Wanderer
+'''
+
+try:
+    # Imports
+    import asyncio
+    from collections import deque
+    from multiprocessing import shared_memory
+    from typing import Optional, Tuple, Dict, Any
+
+    # free.dm Imports
+    from freedm.utils import logging
+    from freedm.transport.message import Message
+    from freedm.transport.control import ControlFrame
+    from freedm.transport.connection import Connection, ConnectionType
+except ImportError as e:
+    from freedm.utils.exceptions import freedmModuleImport
+    raise freedmModuleImport(e)
+
+
+class SharedMemoryRing:
+    '''
+    A ring buffer in a shared memory segment written by a single producer. The consumer (peer)
+    attaches to the segment by its name and releases each region after reading it. Regions are
+    released in the order they were allocated.
+    '''
+
+    def __init__(self, size: int) -> None:
+        self.segment = shared_memory.SharedMemory(create=True, size=size)
+        self.size = size
+        self.regions = deque()
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.name} ({len(self.regions)} regions)>'
+
+    @property
+    def name(self) -> str:
+        return self.segment.name
+
+    def allocate(self, length: int) -> Optional[int]:
+        '''
+        Returns the offset of a free contiguous region of the provided length or ``None`` if the ring is full
+        '''
+        if length > self.size:
+            return None
+        if not self.regions:
+            offset = 0
+        else:
+            tail = self.regions[0][0]
+            head = self.regions[-1][0] + self.regions[-1][1]
+            # Free space at the end of the ring or, by wrapping around, at its start
+            if self.regions[-1][0] >= tail:
+                if head + length <= self.size:
+                    offset = head
+                elif length <= tail:
+                    offset = 0
+                else:
+                    return None
+            # The ring already wrapped around, so the free space lies between head and tail
+            elif head + length <= tail:
+                offset = head
+            else:
+                return None
+        self.regions.append((offset, length))
+        return offset
+
+    def write(self, offset: int, data: bytes) -> None:
+        '''
+        Copies the data into an allocated region
+        '''
+        self.segment.buf[offset:offset + len(data)] = data
+
+    def release(self, offset: int, length: int) -> bool:
+        '''
+        Releases the oldest region after the consumer read it
+        '''
+        if not self.regions or self.regions[0] != (offset, length):
+            return False
+        self.regions.popleft()
+        return True
+
+    def close(self) -> None:
+        '''
+        Closes and removes the shared memory segment
+        '''
+        self.regions.clear()
+        try:
+            self.segment.close()
+            self.segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedMemoryChannel:
+    '''
+    A shared memory fast path for transports whose endpoints run on the same host (UXD sockets).
+    Messages exceeding a threshold are copied into a shared memory ring buffer owned by the sender
+    while the socket only transports small control frames signalling the ring's regions:
+    - SHMOPEN: The sender announces its ring (name and size)
+    - SHMOK/SHMNO: The peer confirms (or declines) that it attached to the ring
+    - SHMDATA: A message is available in the ring (offset and length)
+    - SHMFREE: The peer read the message and the region can be reused
+
+    Until the peer confirmed the ring, and whenever the ring is full, messages are sent via the socket.
+    Regions signalled by the peer outside of the ring are rejected.
+    Only persistent connections use the ring as ephemeral ones are closed right after sending.
+    Both endpoints need to be configured with a channel. Peers run by another user cannot attach to
+    the ring (The segment is only accessible by its owner) and decline the offer.
+    '''
+
+    # The maximal size of the control frames of this channel in bytes (Smaller messages are always sent via the socket)
+    max_frame_size: int = 512
+
+    def __init__(self, size: int=4*1024*1024, threshold: int=64*1024) -> None:
+        '''
+        :param int size: The size of the ring buffer in bytes
+        :param int threshold: The minimal message size in bytes to use the shared memory instead of the socket
+        (Must exceed the size of the control frames, as these are sent like messages)
+        '''
+        if threshold <= self.max_frame_size:
+            raise ValueError(f'Shared memory threshold of {threshold} bytes does not exceed the control frame size of {self.max_frame_size} bytes')
+        self.logger     = logging.getLogger()
+        self.size       = size
+        self.threshold  = threshold
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.size} bytes>'
+
+    @staticmethod
+    def _getState(connection: Connection) -> Dict[str, Any]:
+        '''
+        Returns the shared memory state of a connection
+        '''
+        state = connection.state.get('shm')
+        if state is None:
+            state = connection.state['shm'] = {'ring': None, 'ready': False, 'peers': {}}
+        return state
+
+    @staticmethod
+    def _getRegion(payload: str, size: int) -> Optional[Tuple[int, int]]:
+        '''
+        Returns the offset and length of a region signalled by the peer or ``None`` if the region is malformed
+        or does not lie within the ring of the provided size
+        '''
+        offset, _, length = payload.partition(':')
+        if not (offset.isdigit() and length.isdigit()):
+            return None
+        offset, length = int(offset), int(length)
+        if length == 0 or offset + length > size:
+            return None
+        return offset, length
+
+    @staticmethod
+    def _attach(name: str) -> shared_memory.SharedMemory:
+        '''
+        Attaches to a peer's segment without letting the resource tracker of this process remove it
+        '''
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            segment = shared_memory.SharedMemory(name=name)
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(segment._name, 'shared_memory')
+            except Exception:
+                pass
+            return segment
+
+    async def dispatch(self, transport, connection: Connection, message: bytes) -> bool:
+        '''
+        Tries to send a message via shared memory. Returns ``False`` if the message must be
+        sent via the socket instead.
+        '''
+        if len(message) < self.threshold or connection.state['closed'] or connection.state['mode'] != ConnectionType.PERSISTENT:
+            return False
+        state = self._getState(connection)
+
+        # Offer a ring to the peer first
+        if state['ring'] is None:
+            try:
+                state['ring'] = SharedMemoryRing(self.size)
+                await transport._sendControlFrame(connection, 'SHMOPEN', f'{state["ring"].name}:{self.size}')
+            except Exception as e:
+                self.logger.debug(f'{transport.name} cannot create shared memory ring ({e})')
+                state['ring'] = False
+            return False
+        if not state['ready']:
+            return False
+
+        # Write the message into the ring and signal its region
+        ring = state['ring']
+        offset = ring.allocate(len(message))
+        if offset is None:
+            return False
+        ring.write(offset, message)
+        if not await transport._sendControlFrame(connection, 'SHMDATA', f'{offset}:{len(message)}'):
+            ring.release(offset, len(message))
+            return False
+        return True
+
+    async def handleFrame(self, transport, connection: Connection, frame: ControlFrame) -> None:
+        '''
+        Handles the shared memory control frames of the peer
+        '''
+        state = self._getState(connection)
+        if frame.kind == 'SHMOPEN':
+            name, _size = frame.payload.rsplit(':', 1)
+            try:
+                state['peers']['ring'] = self._attach(name)
+                await transport._sendControlFrame(connection, 'SHMOK', name)
+            except Exception as e:
+                self.logger.debug(f'{transport.name} cannot attach to shared memory ring of peer ({e})')
+                await transport._sendControlFrame(connection, 'SHMNO', name)
+        elif frame.kind == 'SHMOK':
+            if state['ring'] and state['ring'].name == frame.payload:
+                state['ready'] = True
+                self.logger.debug(f'{transport.name} uses shared memory ring "{frame.payload}" for large messages')
+        elif frame.kind == 'SHMNO':
+            if state['ring'] and state['ring'].name == frame.payload:
+                state['ring'].close()
+                state['ring'] = False
+        elif frame.kind == 'SHMDATA':
+            segment = state['peers'].get('ring')
+            if not segment:
+                return
+            region = self._getRegion(frame.payload, segment.size)
+            if region is None:
+                self.logger.warning(f'{transport.name} rejected malformed shared memory region "{frame.payload}" of peer')
+                return
+            offset, length = region
+            data = bytes(segment.buf[offset:offset + length])
+            await transport._sendControlFrame(connection, 'SHMFREE', frame.payload)
+            # Handle the message like any message received via the socket
+            reader = asyncio.ensure_future(transport.handleMessage(Message(data=data, sender=connection)), loop=transport.loop)
+            reader.set_name(f'{transport.name}.read_handler')
+            reader.add_done_callback(lambda task: connection.read_handlers.discard(task))
+            connection.read_handlers.add(reader)
+        elif frame.kind == 'SHMFREE':
+            if not state['ring']:
+                return
+            region = self._getRegion(frame.payload, state['ring'].size)
+            if region is None:
+                self.logger.warning(f'{transport.name} rejected malformed shared memory region "{frame.payload}" of peer')
+                return
+            state['ring'].release(*region)
+
+    def close(self, connection: Connection) -> None:
+        '''
+        Removes the own ring and detaches from the peer's ring
+        '''
+        state = connection.state.get('shm')
+        if not state:
+            return
+        if state['ring']:
+            state['ring'].close()
+        for segment in state['peers'].values():
+            try:
+                segment.close()
+            except Exception:
+                pass
+        state['peers'].clear()
+        state['ring'] = None
+        state['ready'] = False
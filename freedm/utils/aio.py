@@ -4,14 +4,20 @@ This module provides concurrency related utility methods based on asyncio
 '''
 
 # Imports
+import os
 import sys
+import time
 import signal
 import asyncio
+import threading
+import weakref
+from collections import deque, namedtuple, Counter
 try:
     import uvloop
 except ImportError:
     uvloop = None
-from typing import Iterable, Any, Callable, Coroutine, Tuple, Type, Optional
+from typing import Iterable, Any, Callable, Coroutine, Tuple, Type, Optional, Dict, List
+import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 
 # free.dm Imports
@@ -20,13 +26,14 @@ from freedm.utils.types import TypeChecker as checker
 from freedm.utils.exceptions import freedmBaseException
 
 
-def get_loop(policy: Optional[Type[asyncio.AbstractEventLoopPolicy]]=None) -> asyncio.AbstractEventLoop:
+def get_loop(policy: Optional[Type[asyncio.AbstractEventLoopPolicy]]=None, monitor: Optional['LoopMonitor']=None) -> asyncio.AbstractEventLoop:
     '''
     Returns the loop for the current context (thread/process).
     If a loop has been already created, it will return this one.
     In a new thread where where no loop yet exists it creates a new loop
     with the optionally passed loop policy. If no policy is provided this
     tries to create a fast uvloop (dependent on availability) or one with the default policy.
+    An optional loop monitor gets attached to the returned loop.
     '''
     try:
         preferred_policy = asyncio.get_event_loop_policy()
@@ -61,9 +68,299 @@ def get_loop(policy: Optional[Type[asyncio.AbstractEventLoopPolicy]]=None) -> as
             sys.excepthook(e_type, e_error, e_trace)
         if not loop.get_exception_handler():
             loop.set_exception_handler(handle_exception)
+        if monitor:
+            monitor.start(loop)
         return loop
 
 
+SlowCallback = namedtuple('SlowCallback',
+    '''
+    timestamp
+    duration
+    task
+    location
+    stack
+    '''
+    )
+
+
+class LoopMonitor:
+    '''
+    An opt-in health monitor for an asyncio loop:
+    - Lag: A timer measures how late the loop schedules it (The loop's responsiveness)
+    - Slow callbacks: A watchdog thread detects when the loop is blocked for longer than a threshold
+      and records the blocking code (The running task's coroutine and the innermost frame of the loop thread)
+    - Task leaks: The live tasks are counted by their origin (Their name or coroutine). An origin exceeding
+      a limit is reported as potential leak.
+
+    The measurements are available via "get_stats" (e.g. to be exported as metrics). The monitor is cheap
+    enough to run in production as it neither requires the loop's debug mode nor instruments callbacks.
+    '''
+
+    def __init__(
+            self,
+            interval: float=0.5,
+            threshold: float=0.1,
+            task_limit: int=1000,
+            history: int=100
+            ) -> None:
+        '''
+        :param float interval: The number of seconds between two lag measurements
+        :param float threshold: The number of seconds the loop might be blocked before recording the blocking code
+        :param int task_limit: The number of live tasks of the same origin considered to be leaking
+        :param int history: The number of recorded slow callbacks
+        '''
+        self.logger     = logging.getLogger()
+        self.interval   = interval
+        self.threshold  = threshold
+        self.task_limit = task_limit
+        self.loop       = None
+        self.slow       = deque(maxlen=history)
+        self.lag        = {'last': 0.0, 'mean': 0.0, 'max': 0.0, 'samples': 0}
+        self.tasks      = {}
+        self._leaking   = set()
+        self._beat      = None
+        self._stall     = None
+        self._paused    = None
+        self._thread_id = None
+        self._timer     = None
+        self._watchdog  = None
+        self._stopped   = threading.Event()
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {"running" if self.running else "stopped"}>'
+
+    @property
+    def running(self) -> bool:
+        return self._timer is not None and not self._timer.done()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop]=None) -> None:
+        '''
+        Starts monitoring the loop (The loop starts being measured once it runs)
+        '''
+        if self.running:
+            return
+        self.loop = loop or asyncio.get_event_loop()
+        # Each watchdog thread gets its own stop event, so a restart cannot revive the watchdog of a previous start
+        self._stopped = threading.Event()
+        self._timer = self.loop.create_task(self._measure())
+        self._timer.set_name(f'{self.__class__.__name__}.measure')
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stopped,), name=f'{self.__class__.__name__}.watchdog', daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        '''
+        Stops monitoring the loop
+        '''
+        self._stopped.set()
+        if self._timer and not self._timer.done():
+            self.loop.call_soon_threadsafe(self._timer.cancel)
+        self._timer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        '''
+        Returns the current measurements of the loop
+        '''
+        return {
+            'lag': dict(self.lag),
+            'slow': [entry._asdict() for entry in self.slow],
+            'tasks': dict(self.tasks),
+            'leaking': sorted(self._leaking)
+            }
+
+    @staticmethod
+    def get_task_origin(task: asyncio.Task) -> str:
+        '''
+        Returns the origin of a task: Its name if set explicitly, else its coroutine's name
+        '''
+        name = task.get_name()
+        if not name.startswith('Task-'):
+            return name
+        coro = task.get_coro()
+        return getattr(coro, '__qualname__', None) or repr(coro)
+
+    async def _measure(self) -> None:
+        '''
+        Measures the lag of the loop and counts its tasks
+        '''
+        stopped = self._stopped
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        try:
+            while not stopped.is_set():
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - self._beat - self.interval)
+
+                # The loop did not run meanwhile, so its pause is no lag
+                if self._paused == self._beat:
+                    self._beat = now
+                    continue
+
+                # Complete a slow callback recorded by the watchdog with its total duration
+                if self._stall == self._beat and self.slow:
+                    self.slow[-1] = self.slow[-1]._replace(duration=lag)
+                self._beat = now
+
+                # Update the lag statistics (Exponentially weighted mean)
+                self.lag['samples'] += 1
+                self.lag['last'] = lag
+                self.lag['max'] = max(self.lag['max'], lag)
+                self.lag['mean'] = lag if self.lag['samples'] == 1 else 0.9 * self.lag['mean'] + 0.1 * lag
+                self._count_tasks()
+        except asyncio.CancelledError:
+            return
+
+    def _count_tasks(self) -> None:
+        '''
+        Counts the live tasks of the loop by origin and reports origins exceeding the task limit
+        '''
+        self.tasks = dict(Counter(self.get_task_origin(task) for task in asyncio.all_tasks(self.loop)))
+        for origin, count in self.tasks.items():
+            if count >= self.task_limit and origin not in self._leaking:
+                self._leaking.add(origin)
+                self.logger.warning(f'Potential task leak: {count} live tasks of "{origin}"')
+        self._leaking.intersection_update(o for o, c in self.tasks.items() if c >= self.task_limit)
+
+    def _watch(self, stopped: threading.Event) -> None:
+        '''
+        Watchdog thread: Records the code blocking the loop for longer than the threshold
+        :param threading.Event stopped: The event stopping this thread
+        '''
+        while not stopped.wait(self.threshold / 2):
+            beat = self._beat
+            if beat is None or beat == self._stall or beat == self._paused:
+                continue
+            # A stopped loop (e.g. between two "run_until_complete" calls) is not blocked
+            if not self.loop.is_running():
+                self._paused = beat
+                continue
+            blocked = time.monotonic() - beat - self.interval
+            if blocked >= self.threshold:
+                self._stall = beat
+                self._record(blocked)
+
+    def _record(self, blocked: float) -> None:
+        '''
+        Records the code currently running in the loop thread
+        '''
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and len(stack) < 20:
+            code = frame.f_code
+            stack.append(f'{getattr(code, "co_qualname", code.co_name)} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        entry = SlowCallback(
+            timestamp=time.time(),
+            duration=blocked,
+            task=self.get_task_origin(task) if task else None,
+            location=stack[0],
+            stack=tuple(stack)
+            )
+        self.slow.append(entry)
+        self.logger.warning(f'Loop blocked for more than {blocked:.3f}s by {entry.task or "callback"} at {entry.location}')
+
+
+class SignalDeferral:
+    '''
+    Defers a signal on a loop as long as at least one blocking context of this loop is active.
+    All contexts of a loop share one deferral per signal (reference counted), so concurrent contexts
+    neither race on the process wide signal handlers nor overwrite each other's saved handlers.
+    The signal is caught via "loop.add_signal_handler" (or "signal.signal" if the loop does not support it)
+    and resumed with the original handler once the last context finished. A handler the loop had before
+    is reinstated afterwards.
+    '''
+
+    # The active deferrals by loop and signal
+    _registry = weakref.WeakKeyDictionary()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sig: signal.Signals) -> None:
+        self.logger     = logging.getLogger()
+        self.loop       = loop
+        self.signal     = sig
+        self.contexts   = 0
+        self.received   = None
+        self.handler    = None
+        self.previous   = None
+        self.native     = False
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {signal.Signals(self.signal).name} ({self.contexts} contexts)>'
+
+    @classmethod
+    def acquire(cls, loop: asyncio.AbstractEventLoop, signals: Iterable[signal.Signals]) -> List['SignalDeferral']:
+        '''
+        Starts deferring the signals on behalf of a context
+        '''
+        deferrals = []
+        for sig in signals:
+            deferral = cls._registry.setdefault(loop, {}).get(sig)
+            if deferral is None:
+                deferral = cls._registry[loop][sig] = cls(loop, sig)
+            if deferral.contexts == 0:
+                deferral._install()
+            deferral.contexts += 1
+            deferrals.append(deferral)
+        return deferrals
+
+    def release(self) -> None:
+        '''
+        Stops deferring the signal on behalf of a context. The last context resumes a received signal.
+        '''
+        self.contexts -= 1
+        if self.contexts > 0:
+            return
+        self._registry.get(self.loop, {}).pop(self.signal, None)
+        self._uninstall()
+
+    def _install(self) -> None:
+        self.received = None
+        self.handler = signal.getsignal(self.signal)
+        # The loop's own handler of the signal (If any) gets replaced by adding ours
+        self.previous = getattr(self.loop, '_signal_handlers', {}).get(self.signal)
+        try:
+            self.loop.add_signal_handler(self.signal, self._defer, self.signal, None)
+            self.native = True
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Signals are only delivered to the main thread
+            self.native = False
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(self.signal, self._defer)
+
+    def _uninstall(self) -> None:
+        previous, self.previous = self.previous, None
+        if self.native:
+            self.loop.remove_signal_handler(self.signal)
+        try:
+            if previous is not None and not previous.cancelled():
+                # Reinstate the loop's handler (Which also restores the loop's process wide handler)
+                self.loop.add_signal_handler(self.signal, previous._callback, *previous._args)
+            elif self.handler is not None:
+                signal.signal(self.signal, self.handler)
+        except (ValueError, TypeError, RuntimeError):
+            pass
+
+        # Resume a received signal with the original handler
+        if self.received:
+            self.logger.debug(f'Signal {signal.Signals(self.signal).name} resumed')
+            if previous is not None and not previous.cancelled():
+                previous._run()
+            elif self.handler == signal.SIG_DFL:
+                signal.raise_signal(self.signal)
+            elif callable(self.handler):
+                self.handler(*self.received)
+
+    def _defer(self, s, frame) -> None:
+        self.received = (s, frame)
+        self.logger.debug(f'Signal {signal.Signals(self.signal).name} delayed by {self.contexts} blocking context(s)')
+
+
 class BlockingContextManager:
     '''
     An async context manager which is safe from being
@@ -71,6 +368,9 @@ class BlockingContextManager:
     interupt) or SIGTERM. It will wait for the "with-block"
     to finish before resuming the SIGNAL by its original
     registered handler.
+
+    Awaiting an instance (instead of using it as context manager)
+    enters it without deferring any signals.
     '''
     # List of respected signals
     signals = (
@@ -81,63 +381,258 @@ class BlockingContextManager:
     # Logger
     logger = None
 
+    def __await__(self):
+        '''
+        Enters the context without deferring signals when being awaited
+        '''
+        return self.__awaited().__await__()
+
+    async def __awaited(self):
+        self._awaited = True
+        return await self.__aenter__()
+
     async def __aenter__(self):
         '''
         In case we don't call this context manager as awaitable,
-        then setup new temporary signal handlers, save the original handlers
-        and block any of the defined signals until the context finishes
+        then block any of the defined signals until the context finishes
         '''
         # Setup logger
         if not self.logger:
             self.logger = logging.getLogger()
 
-        # Check if we are awaited, thus not use as context manager (by checking the caller history
-        i = 1
-        caller = None
-        while i < 50 and (caller == '__aenter__' or not caller):
-            caller = sys._getframe(i).f_code.co_name
-            i += 1
-            if caller == '__await__':
-                return
-
-        self._signal_received = {}
-        self._old_handlers = {}
-
-        for sig in self.signals:
-            # Save original handlers while this context is running
-            self._signal_received[sig] = False
-            self._old_handlers[sig] = signal.getsignal(sig)
-
-            # Intermediate (safe) signal handler
-            def signal_context_handler(s, frame, sig=sig):
-                self._signal_received[sig] = (s, frame)
-                print()
-                self.logger.debug(f'Signal {signal.Signals(sig).name} delayed by blocking context "{self.__class__.__name__}"')
-
-            # Replace the original handler by the handler defined by this context manager
-            self._old_handlers[sig] = signal.getsignal(sig)
-            signal.signal(sig, signal_context_handler)
+        # Defer the signals unless we are awaited
+        if not self.__dict__.pop('_awaited', False):
+            self._signal_deferrals = SignalDeferral.acquire(asyncio.get_running_loop(), self.signals)
 
         # Return context
         return self
 
     async def __aexit__(self, *args):
         '''
-        If the __aenter__ has stored old signal handlers, then
-        reinstate them and resume with the caught signal
+        If the __aenter__ has deferred signals, then
+        stop deferring them and resume with the caught signals
         '''
         try:
-            self._old_handlers
-            for sig in self.signals:
-                # Reinstate the original handler and continue with the received frame
-                signal.signal(sig, self._old_handlers[sig])
-                if self._signal_received[sig] and self._old_handlers[sig]:
-                    self.logger.debug(f'Signal {signal.Signals(sig).name} resumed')
-                    self._old_handlers[sig](*self._signal_received[sig])
+            for deferral in self.__dict__.pop('_signal_deferrals', ()):
+                deferral.release()
         except Exception:
             return
 
 
+class IOExecutor(concurrent.futures.Executor):
+    '''
+    A bounded thread pool for blocking IO shared by several users (e.g. the data stores of a process),
+    so frequent operations reuse long-lived threads instead of creating a pool per call.
+    Each user submits its calls to a group ("group" returns an executor view of a group), whose
+    concurrency can be capped. Calls exceeding the cap of their group wait in the group's queue
+    until a call of the group finished, so a busy group cannot occupy all threads of the pool.
+    Calls running in the pool must not wait for further calls of the pool, as these might wait for
+    the caller's thread or group cap (See "is_worker_thread" to run such calls inline instead).
+
+    Statistics:
+    The queue depths are available via "get_stats" (e.g. to be exported as metrics):
+    - active: The number of calls currently running
+    - queued: The number of calls waiting for a free thread of the pool
+    - pending: The number of calls waiting for the cap of their group
+    - max_queued/max_pending: The maximal depths of both queues
+    - submitted/completed: The number of submitted and completed calls (Also per group)
+    '''
+
+    def __init__(self, max_workers: Optional[int]=None, name: str='io') -> None:
+        '''
+        :param int max_workers: The maximal number of threads (By default depending on the number of CPUs)
+        :param str name: The name prefix of the threads
+        '''
+        self.max_workers    = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.name           = name
+        self._pool          = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock          = threading.Lock()
+        self._groups        = {}
+        self._views         = {}
+        self._shutdown      = False
+        self._local         = threading.local()
+        self.stats          = {'active': 0, 'queued': 0, 'pending': 0, 'max_queued': 0, 'max_pending': 0, 'submitted': 0, 'completed': 0}
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.name} ({self.max_workers} threads)>'
+
+    def group(self, name: str, limit: Optional[int]=None) -> 'IOExecutorGroup':
+        '''
+        Returns an executor submitting its calls to a group of this executor (Usable with "loop.run_in_executor")
+        :param str name: The group name
+        :param int limit: The maximal number of concurrently running calls of the group (Keeps the current cap if not provided)
+        '''
+        with self._lock:
+            state = self._get_group(name)
+            if limit is not None:
+                state['limit'] = max(1, limit)
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = IOExecutorGroup(self, name)
+        return view
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> concurrent.futures.Future:
+        '''
+        Submits a call without a group (Only capped by the number of threads)
+        '''
+        return self.submit_to(None, fn, *args, **kwargs)
+
+    def submit_to(self, group: Optional[str], fn: Callable, /, *args, **kwargs) -> concurrent.futures.Future:
+        '''
+        Submits a call to a group
+        '''
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError(f'Cannot submit calls to {self} after shutdown')
+            state = self._get_group(group)
+            state['submitted'] += 1
+            self.stats['submitted'] += 1
+            if state['limit'] is not None and state['running'] >= state['limit']:
+                state['pending'].append((future, fn, args, kwargs))
+                self.stats['pending'] += 1
+                self.stats['max_pending'] = max(self.stats['max_pending'], self.stats['pending'])
+                return future
+            state['running'] += 1
+            self._queue()
+        self._pool.submit(self._run, group, future, fn, args, kwargs)
+        return future
+
+    def is_worker_thread(self) -> bool:
+        '''
+        Checks if the calling thread is a thread of the pool (Running a call of any group)
+        '''
+        return getattr(self._local, 'running', False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        '''
+        Returns the current queue depths and counters of the executor and its groups
+        '''
+        with self._lock:
+            stats = dict(self.stats)
+            stats['workers'] = self.max_workers
+            stats['groups'] = {
+                name: {
+                    'limit': state['limit'],
+                    'running': state['running'],
+                    'pending': len(state['pending']),
+                    'submitted': state['submitted'],
+                    'completed': state['completed']
+                    }
+                for name, state in self._groups.items() if name is not None
+                }
+        return stats
+
+    def shutdown(self, wait: bool=True, *, cancel_futures: bool=False) -> None:
+        '''
+        Shuts the executor down. Calls waiting for the cap of their group are cancelled.
+        '''
+        with self._lock:
+            self._shutdown = True
+            pending = [call for state in self._groups.values() for call in state['pending']]
+            for state in self._groups.values():
+                state['pending'].clear()
+            self.stats['pending'] = 0
+        for future, *_call in pending:
+            future.cancel()
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def _get_group(self, name: Optional[str]) -> Dict[str, Any]:
+        '''
+        Returns the state of a group (The lock must be held)
+        '''
+        state = self._groups.get(name)
+        if state is None:
+            state = self._groups[name] = {'limit': None, 'running': 0, 'pending': deque(), 'submitted': 0, 'completed': 0}
+        return state
+
+    def _queue(self) -> None:
+        '''
+        Counts a call handed to the pool (The lock must be held)
+        '''
+        self.stats['queued'] += 1
+        self.stats['max_queued'] = max(self.stats['max_queued'], self.stats['queued'])
+
+    def _run(self, group: Optional[str], future: concurrent.futures.Future, fn: Callable, args: Tuple, kwargs: Dict[str, Any]) -> None:
+        '''
+        Runs a call in a thread of the pool. Afterwards the thread continues with the next waiting call of the
+        group (if any), so waiting calls need not to be handed to the pool again.
+        '''
+        with self._lock:
+            self.stats['queued'] -= 1
+        self._local.running = True
+        while True:
+            with self._lock:
+                self.stats['active'] += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._lock:
+                    self.stats['active'] -= 1
+                    self.stats['completed'] += 1
+                    state = self._groups[group]
+                    state['completed'] += 1
+                    call = None
+                    if state['pending'] and not self._shutdown:
+                        call = state['pending'].popleft()
+                        self.stats['pending'] -= 1
+                    else:
+                        state['running'] -= 1
+            if call is None:
+                self._local.running = False
+                return
+            future, fn, args, kwargs = call
+
+
+class IOExecutorGroup(concurrent.futures.Executor):
+    '''
+    An executor view submitting all calls to a group of an py:class::IOExecutor
+    '''
+
+    def __init__(self, executor: IOExecutor, name: str) -> None:
+        self.executor   = executor
+        self.name       = name
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}: {self.name} of {self.executor.name}>'
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> concurrent.futures.Future:
+        return self.executor.submit_to(self.name, fn, *args, **kwargs)
+
+    def is_worker_thread(self) -> bool:
+        '''
+        Checks if the calling thread is a thread of the shared executor's pool
+        '''
+        return self.executor.is_worker_thread()
+
+    def shutdown(self, wait: bool=True, *, cancel_futures: bool=False) -> None:
+        '''
+        The shared executor is shut down by its owner
+        '''
+        pass
+
+
+_io_executor: Optional[IOExecutor] = None
+_io_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> IOExecutor:
+    '''
+    Returns the process-wide IO executor (Created on first use)
+    '''
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None or _io_executor._shutdown:
+            _io_executor = IOExecutor()
+        return _io_executor
+
+
 class freedmAsyncLoopCreation(freedmBaseException):
     '''
     Gets thrown when no asyncio loop can be created
@@ -154,34 +649,39 @@ class freedmAsyncLoopException(freedmBaseException):
         return f'Caught async loop exception "{error.__class__.__name__ if not isinstance(error, str) else error}" ({error})'
 
 
-def run_concurrently(function: Callable, tasks: Iterable[Any], *args, max_threads: int=None, timeout: int=None) -> None:
+def run_concurrently(function: Callable, tasks: Iterable[Any], *args, max_threads: int=None, timeout: int=None, executor: Optional[concurrent.futures.Executor]=None) -> None:
     '''
     This method runs a given non-coroutine function concurrently for each task item by the help
-    of the asyncio module and a concurrent executor. The executor creates a thread
+    of a concurrent executor and waits until all calls finished. The executor creates a thread
     for each task item if no max_threads is set and cleans up its resources afterwards.
+    It does not depend on an event loop, so it can also be called from within a running loop
+    (which gets blocked until all calls finished). If called from a thread of the IO executor passed, the
+    calls run one by one in the calling thread instead, as waiting for further calls of the executor might deadlock.
     :param func function: The function to run
     :param Iterable tasks: A list/tuple of items for each of them we run the function.
     The items will also serve as argument to the function. Each further *args parameter will be used for the function
     :param int max_threads: Limit the number of threads. By default we create a thread for each item
     :param int timeout: Limit the execution time by a timeout
+    :param Executor executor: An optional long-lived executor (e.g. a group of the IO executor) to use instead of a new pool
     '''
     # Check requirements: A function and a non-empty list
     if checker.is_function(function) and checker.is_iterable(tasks) and len(tasks) > 0:
-        # First get this threads loop or create a new one
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
-            asyncio.set_event_loop(loop)
-
-        # Create a worker pool for each "task" in the list (which are to be executed parallel
-        workers: List[Coroutine[ThreadPoolExecutor, Callable, Tuple]] = []
-        with ThreadPoolExecutor(max_workers=max_threads if checker.is_integer(max_threads) else len(tasks)) as executor:
-            # Create coroutine threads
+        # Run the calls inline within a thread of the IO executor (Failures are ignored like those of concurrent calls)
+        if isinstance(executor, (IOExecutor, IOExecutorGroup)) and executor.is_worker_thread():
             for t in tasks:
-                workers.append(loop.run_in_executor(executor, function, *tuple([t] + list(args))))
+                try:
+                    function(*tuple([t] + list(args)))
+                except Exception:
+                    pass
+            return
+
+        # Create a worker pool for each "task" in the list (which are to be executed parallel) unless we got an executor
+        pool = ThreadPoolExecutor(max_workers=max_threads if checker.is_integer(max_threads) else len(tasks)) if executor is None else None
+        try:
+            workers = [(executor or pool).submit(function, *tuple([t] + list(args))) for t in tasks]
 
-            # Run all release operations in parallel
-            if workers:
-                loop.run_until_complete(asyncio.wait(workers, timeout=timeout))
+            # Wait for all operations running in parallel
+            concurrent.futures.wait(workers, timeout=timeout)
+        finally:
+            if pool:
+                pool.shutdown(wait=timeout is None)
@@ -0,0 +1,160 @@
+'''
+This test checks the functionality of the free.dm utils.aio module
+@author: Thomas Wanderer
+'''
+
+# Imports
+import unittest
+import logging
+import asyncio
+import threading
+import time
+import signal
+import os
+import sys
+
+# Test imports
+import __init__
+
+# free.dm Imports
+from freedm.utils.aio import LoopMonitor, BlockingContextManager
+
+
+# Setup logger
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+if not logger.hasHandlers():
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def getWatchdogs(monitor: LoopMonitor):
+    '''
+    Returns the running watchdog threads of the loop monitors of a class
+    '''
+    return [thread for thread in threading.enumerate() if thread.name == f'{monitor.__class__.__name__}.watchdog']
+
+
+# Test the loop monitor
+class LoopMonitors(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info(f'Starting unittest: {cls.__name__}')
+
+    @classmethod
+    def tearDownClass(cls):
+        logger.info(f'Ending unittest: {cls.__name__}')
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.monitor = LoopMonitor(interval=0.05, threshold=0.05)
+
+    def tearDown(self):
+        self.monitor.stop()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        self.monitor._watchdog.join(1)
+
+    def testBlockingCallback(self):
+        async def block():
+            time.sleep(0.3)
+        self.monitor.start(self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        self.loop.run_until_complete(block())
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+
+        # Assert that the blocking code is reported with its duration
+        self.assertEqual(len(self.monitor.slow), 1, 'Blocking callback not reported once')
+        self.assertIn('block', self.monitor.slow[0].location, 'Blocking code not recorded')
+        self.assertGreaterEqual(self.monitor.slow[0].duration, 0.2, 'Wrong duration of blocking callback')
+
+    def testStoppedLoop(self):
+        self.monitor.start(self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        # The loop does not run between two "run_until_complete" calls
+        time.sleep(0.5)
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+
+        # Assert that a stopped loop is neither reported as blocked nor lagging
+        self.assertEqual(len(self.monitor.slow), 0, 'Stopped loop reported as blocked')
+        self.assertLess(self.monitor.lag['max'], 0.3, 'Pause of stopped loop measured as lag')
+
+    def testRestart(self):
+        # A monitor whose watchdog waits while recording until the monitor was restarted
+        recording, restarted = threading.Event(), threading.Event()
+        class RestartedMonitor(LoopMonitor):
+            def _record(self, blocked):
+                super()._record(blocked)
+                recording.set()
+                restarted.wait(5)
+        self.monitor = RestartedMonitor(interval=0.05, threshold=0.05)
+        async def restart():
+            recording.wait(5)
+            self.monitor.stop()
+            self.monitor.start(self.loop)
+            restarted.set()
+        watchdogs = len(getWatchdogs(self.monitor))
+        self.monitor.start(self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        self.loop.run_until_complete(restart())
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+
+        # Assert that only the watchdog of the last start keeps running
+        self.assertTrue(recording.is_set(), 'Blocked loop not recorded')
+        self.assertEqual(len(getWatchdogs(self.monitor)), watchdogs + 1, 'Watchdog of previous start still running')
+
+
+# Test deferring signals while a blocking context is active
+class SignalDeferrals(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info(f'Starting unittest: {cls.__name__}')
+
+    @classmethod
+    def tearDownClass(cls):
+        logger.info(f'Ending unittest: {cls.__name__}')
+
+    def testDeferredSignal(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            received = []
+            loop.add_signal_handler(signal.SIGTERM, received.append, 'SIGTERM')
+            try:
+                async with BlockingContextManager():
+                    os.kill(os.getpid(), signal.SIGTERM)
+                    await asyncio.sleep(0.05)
+                    deferred = list(received)
+                await asyncio.sleep(0.05)
+                resumed = list(received)
+                # The loop's handler receives further signals again
+                os.kill(os.getpid(), signal.SIGTERM)
+                await asyncio.sleep(0.05)
+                return deferred, resumed, list(received)
+            finally:
+                loop.remove_signal_handler(signal.SIGTERM)
+        deferred, resumed, received = asyncio.run(run())
+
+        # Assert that the signal is delivered after the context exited and that the loop's handler is reinstated
+        self.assertEqual(deferred, [], 'Signal delivered within blocking context')
+        self.assertEqual(resumed, ['SIGTERM'], 'Deferred signal not delivered after blocking context')
+        self.assertEqual(received, ['SIGTERM', 'SIGTERM'], 'Handler of loop not reinstated')
+
+    def testAwaitedContext(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            received = []
+            loop.add_signal_handler(signal.SIGTERM, received.append, 'SIGTERM')
+            try:
+                context = await BlockingContextManager()
+                os.kill(os.getpid(), signal.SIGTERM)
+                await asyncio.sleep(0.05)
+                await context.__aexit__(None, None, None)
+                return received
+            finally:
+                loop.remove_signal_handler(signal.SIGTERM)
+
+        # Assert that an awaited context does not defer signals
+        self.assertEqual(asyncio.run(run()), ['SIGTERM'], 'Signal deferred by awaited context')
+
+
+if __name__ == '__main__':
+    unittest.main()
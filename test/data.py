@@ -12,6 +12,11 @@ import string
 import random
 import logging
 import json
+import time
+import asyncio
+import threading
+import types
+import importlib
 from threading import Thread
 
 # Test imports
@@ -20,6 +25,7 @@ import __init__
 # free.dm Imports
 import freedm.data as data
 import freedm.models as models
+from freedm.utils.aio import run_concurrently
 
 
 # Setup schema and data for testing
@@ -551,6 +557,313 @@ class MemoryStore(unittest.TestCase):
         
         # Assert that store domains got synced
         self.assertEqual(len(self.store.getSyncDomains()), 0, 'The following store domains were not properly synced: ({})'.format(', '.join(self.store.getSyncDomains())))
+
+    def testTransactions(self):
+        models.transaction = {'type': 'object', 'properties': {'port': {'type': 'integer'}, 'host': {'type': 'string'}}}
+        store = data.MemoryStore(name='Transaction')
+        
+        # Assert that staged values are only visible in the transaction until they are committed
+        with store.transaction():
+            self.assertTrue(store.setValue('transaction.port', 22), 'Value not staged')
+            self.assertEqual(store.getValue('transaction.port'), 22, 'Staged value not visible in transaction')
+            thread = Thread(target=lambda: setattr(self, 'staged', store.getValue('transaction.port')))
+            thread.start()
+            thread.join()
+            self.assertEqual(self.staged, None, 'Staged value visible outside of transaction')
+        self.assertEqual(store.getValue('transaction.port'), 22, 'Transaction not committed')
+        
+        # Assert that invalid or failing transactions are rolled back
+        with self.assertRaises(UserWarning):
+            with store.transaction():
+                store.setValue('transaction.port', 23)
+                store.setValue('transaction.host', 1)
+        with self.assertRaises(RuntimeError):
+            with store.transaction():
+                store.setValue('transaction.port', 24)
+                raise RuntimeError('Discard')
+        self.assertEqual(store.getValue('transaction.port'), 22, 'Transaction not rolled back')
+        
+        # Assert that the transactions of concurrent asyncio tasks are isolated
+        async def stage(host, started):
+            with store.transaction():
+                store.setValue('transaction.host', host)
+                started.set()
+                await asyncio.sleep(0.01)
+                return store.getValue('transaction.host')
+        async def run():
+            first, second = asyncio.Event(), asyncio.Event()
+            tasks = asyncio.gather(stage('first', first), stage('second', second))
+            await first.wait()
+            await second.wait()
+            # Values staged by the tasks are not visible outside of their transactions
+            return store.getValue('transaction.host'), await tasks
+        outside, staged = asyncio.run(run())
+        self.assertEqual(outside, None, 'Staged value visible outside of task transaction')
+        self.assertEqual(staged, ['first', 'second'], 'Task transactions not isolated')
+        
+        # Assert that tasks outliving their transaction set their values directly
+        async def late(committed):
+            await committed.wait()
+            return store.setValue('transaction.port', 25)
+        async def outlive():
+            committed = asyncio.Event()
+            with store.transaction():
+                task = asyncio.create_task(late(committed))
+                store.setValue('transaction.host', 'outer')
+            committed.set()
+            return await task
+        self.assertTrue(asyncio.run(outlive()), 'Value of task not set')
+        self.assertEqual(store.getValue('transaction.port'), 25, 'Value of task set after transaction lost')
+        self.assertEqual(store.getValue('transaction.host'), 'outer', 'Transaction not committed')
+        store.unloadDomain('transaction')
+        
+    def testAsyncValues(self):
+        models.asynchronous = {'type': 'object', 'properties': {'port': {'type': 'integer'}}}
+        store = data.MemoryStore(name='Asynchronous')
+        
+        # Assert that values can be set, got and synced from within a running loop
+        async def run():
+            self.assertTrue(await store.aset('asynchronous.port', 22), 'Value not set asynchronously')
+            self.assertEqual(await store.aget('asynchronous.port'), 22, 'Value not got asynchronously')
+            self.assertEqual(await store.aget('unloaded.port', 23), 23, 'Default value not got asynchronously')
+            await store.asyncSync()
+            store.sync()
+        asyncio.run(run())
+        store.unloadDomain('asynchronous')
+        store.unloadDomain('unloaded')
+        
+    def testWriteBehind(self):
+        store = data.MemoryStore(name='Behind', persistent=True, writebehind=True)
+        store._scheduler.delay = 0.1
+        store._scheduler.threshold = 5
+        # A fake clock only advanced by the test
+        now = [0.0]
+        store._scheduler.clock = lambda: now[0]
+        
+        # Assert that changes are debounced
+        for port in range(3):
+            store.setValue('behind.port', port)
+        self.assertEqual(store._scheduler.pending, ['behind'], 'Changed domain not scheduled')
+        self.assertFalse(store._scheduler.wait(0.2), 'Domain synced before debounce delay')
+        self.assertTrue(store.getDomain('behind').tainted, 'Domain synced before debounce delay')
+        now[0] += 0.1
+        self.assertTrue(store._scheduler.wait(5), 'Domain not synced after debounce delay')
+        self.assertFalse(store.getDomain('behind').tainted, 'Domain not synced after debounce delay')
+        
+        # Assert that many changes are synced immediately and that pending changes are synced on stop
+        store.setValues({'behind.port{}'.format(port): port for port in range(5)})
+        self.assertTrue(store._scheduler.wait(5), 'Domain not synced after change threshold')
+        self.assertFalse(store.getDomain('behind').tainted, 'Domain not synced after change threshold')
+        store.setValue('behind.port', 1)
+        store._scheduler.stop()
+        self.assertFalse(store.getDomain('behind').tainted, 'Domain not synced on stop')
+        store.unloadDomain('behind')
+        
+    def testCachedValues(self):
+        # A store reading each value from its backend
+        class BackendStore(data.MemoryStore):
+            reads = 0
+            def _getRaw(self, domain, token):
+                self.reads += 1
+                if token == 'missing':
+                    raise LookupError('Not found')
+                if token == 'racing':
+                    # The value changes in the backend while being read
+                    self.invalidateCache(['cached.racing'])
+                return 'raw-' + token
+        store = BackendStore(name='Backend', cache=0.2)
+        store.loadDomain('cached')
+        try:
+            # Assert that raw values and missing values are read only once
+            for _ in range(3):
+                self.assertEqual(store.getValue('cached.name'), 'raw-name', 'Wrong raw value')
+                self.assertIsNone(store.getValue('cached.missing'), 'Missing value found')
+            self.assertEqual(store.reads, 2, 'Raw values not cached')
+            
+            # Assert that cached values expire or get invalidated
+            store.invalidateCache(['cached.name.first'])
+            self.assertEqual(store.getValue('cached.name'), 'raw-name')
+            self.assertEqual(store.reads, 3, 'Cached value not invalidated')
+            time.sleep(0.25)
+            self.assertIsNone(store.getValue('cached.missing'))
+            self.assertEqual(store.reads, 4, 'Cached value not expired')
+            
+            # Assert that values changed while being read are not cached
+            for _ in range(2):
+                self.assertEqual(store.getValue('cached.racing'), 'raw-racing')
+            self.assertEqual(store.reads, 6, 'Outdated value cached')
+            
+            # Assert that the domain case does not matter
+            self.assertEqual(store.getValue('Cached.name'), 'raw-name')
+            self.assertEqual(store.getValue('cached.name'), 'raw-name')
+            self.assertEqual(store.reads, 7, 'Value cached by domain case')
+            store.invalidateCache(['cached'])
+            self.assertEqual(store.getValue('CACHED.name'), 'raw-name')
+            self.assertEqual(store.reads, 8, 'Value of domain in other case not invalidated')
+        finally:
+            store.unloadDomain('cached')
+        
+        # Assert that a change invalidates the values which might contain it
+        from freedm.data.cache import ValueCache
+        cache = ValueCache(ttl=60, size=3)
+        for token in ('users.45', 'users.name', 'users.46.name', 'users.+.name'):
+            cache.put(token, 1)
+        self.assertEqual(len(cache), 3, 'Least recently used value not evicted')
+        cache.invalidate('users.46.name.first')
+        self.assertEqual([cache.get(token)[0] for token in ('users.name', 'users.46.name', 'users.+.name')], [False, False, False], 'Values not invalidated')
+    
+    def testIndexedValues(self):
+        store = data.MemoryStore(name='Indexed')
+        store.loadDomain('idxdevices')
+        try:
+            for index in range(100):
+                self.assertTrue(store.setValue('idxdevices.all.{}'.format(index), {'name': 'dev{:03d}'.format(index), 'port': index % 10}))
+            self.assertTrue(store.createIndex('idxdevices.all.[]', 'name'), 'Index not created')
+            self.assertTrue(store.createIndex('idxdevices.all', 'port'), 'Index not created')
+            self.assertEqual(store.findByIndex('idxdevices.all', 'name', 'dev042'), ['idxdevices.all.42'], 'Item not found')
+            
+            # Assert that the indexes are updated on changes
+            self.assertTrue(store.setValue('idxdevices.all.42.name', 'router'))
+            self.assertTrue(store.setValue('idxdevices.all.100', {'name': 'switch', 'port': 3}))
+            self.assertEqual(store.findByIndex('idxdevices.all', 'name', 'dev042'), [], 'Changed item found')
+            self.assertEqual(store.findByIndex('idxdevices.all', 'name', 'router', values=True), {'idxdevices.all.42': {'name': 'router', 'port': 2}}, 'Changed item not found')
+            self.assertEqual(len(store.findByIndex('idxdevices.all', 'port', 3)), 11, 'New item not found')
+            
+            # Assert that ranges of values are found in order
+            self.assertEqual(len(store.findByRange('idxdevices.all', 'port', 8, 9)), 20, 'Wrong items in range')
+            self.assertEqual(store.findByRange('idxdevices.all', 'name', 'dev097')[:2], ['idxdevices.all.97', 'idxdevices.all.98'], 'Wrong order of items in range')
+            
+            # Assert that booleans are not indexed as numbers
+            self.assertTrue(store.setValue('idxdevices.all.101', {'name': 'bridge', 'port': True}))
+            self.assertEqual(store.findByIndex('idxdevices.all', 'port', True), ['idxdevices.all.101'], 'Boolean item not found')
+            self.assertNotIn('idxdevices.all.101', store.findByIndex('idxdevices.all', 'port', 1), 'Boolean item found by number')
+            
+            # Assert that a single bound limits the range to values of its type
+            self.assertTrue(store.setValue('idxdevices.all.102', {'name': 'modem', 'port': 'serial'}))
+            self.assertEqual(len(store.findByRange('idxdevices.all', 'port', 8)), 20, 'Values of other types in range')
+            self.assertEqual(len(store.findByRange('idxdevices.all', 'port', high=1)), 20, 'Values of other types in range')
+            self.assertEqual(store.findByRange('idxdevices.all', 'port', 'a'), ['idxdevices.all.102'], 'Values of other types in range')
+        finally:
+            store.unloadDomain('idxdevices')
+    
+    def testQueriedValues(self):
+        store = data.MemoryStore(name='Queried')
+        store.loadDomain('qrydevices')
+        try:
+            for index in range(50):
+                self.assertTrue(store.setValue('qrydevices.all.{}'.format(index), {'name': 'dev{:02d}'.format(index), 'port': index % 5, 'site': {'city': 'Bern' if index % 2 else 'Basel'}}))
+            self.assertTrue(store.setValue('qrydevices.all.50', {'name': 'router'}))
+            
+            # Assert that items are filtered, sorted, limited and projected
+            query = data.Query('qrydevices.all').where('port', '>=', 3).where('site.city', '==', 'Bern').orderBy('name', descending=True).limit(3, offset=1).select('name', 'site.city')
+            self.assertEqual(store.query(query), [
+                ('qrydevices.all.43', {'name': 'dev43', 'site.city': 'Bern'}),
+                ('qrydevices.all.39', {'name': 'dev39', 'site.city': 'Bern'}),
+                ('qrydevices.all.33', {'name': 'dev33', 'site.city': 'Bern'})
+                ], 'Wrong query results')
+            self.assertEqual([result.token for result in store.query(data.Query('qrydevices.all.[]').where('name', 'startswith', 'r'))], ['qrydevices.all.50'], 'Wrong filtered items')
+            
+            # Assert that items missing a key are sorted last and that indexed queries find the same items
+            self.assertEqual(store.query(data.Query('qrydevices.all').orderBy('port', descending=True).select('name'))[-1].value, {'name': 'router'}, 'Item without value not sorted last')
+            query = data.Query('qrydevices.all').where('port', '==', 2).where('name', '!=', 'dev12')
+            unindexed = store.query(query)
+            self.assertTrue(store.createIndex('qrydevices.all', 'port'), 'Index not created')
+            self.assertEqual(sorted(store.query(query)), sorted(unindexed), 'Wrong indexed query results')
+            self.assertEqual(len(unindexed), 9, 'Wrong number of query results')
+            self.assertTrue(store.setValue('qrydevices.all.51', {'name': 'bridge', 'port': None}))
+            self.assertEqual([result.token for result in store.query(data.Query('qrydevices.all').where('port', '==', None))], ['qrydevices.all.51'], 'Value not held by index not found')
+            self.assertRaises(UserWarning, data.Query('qrydevices.all').where, 'port', '~', 2)
+        finally:
+            store.unloadDomain('qrydevices')
+    
+    def testSubscribedValues(self):
+        store = data.MemoryStore(name='Subscribed')
+        store.loadDomain('subdevices')
+        try:
+            received = []
+            threads = []
+            delivered = threading.Event()
+            def changed(tokens):
+                received.append(tokens)
+                threads.append(store.executor.is_worker_thread())
+                delivered.set()
+            
+            # Assert that changes within the prefix are delivered in batches (in a worker thread)
+            subscription = store.subscribe('subdevices.router', changed)
+            self.assertTrue(store.setValue('subdevices.switch.port', 1))
+            self.assertTrue(store.setValues({'subdevices.router.port': 22, 'subdevices.router.host': 'localhost', 'subdevices.switch.port': 2}))
+            self.assertTrue(delivered.wait(5), 'Changes not delivered')
+            self.assertEqual(received, [['subdevices.router.port', 'subdevices.router.host']], 'Wrong changes delivered')
+            self.assertEqual(threads, [False], 'Changes delivered by a backend IO thread')
+            
+            # Assert that subscribers to synced changes are notified after syncing
+            synced = []
+            flushed = threading.Event()
+            def syncedChanged(tokens):
+                synced.append(tokens)
+                flushed.set()
+            store.subscribe('subdevices', syncedChanged, synced=True)
+            self.assertTrue(store.setValue('subdevices.switch.port', 3))
+            self.assertFalse(flushed.wait(0.1), 'Unsynced changes delivered')
+            store.syncDomain('subdevices')
+            self.assertTrue(flushed.wait(5), 'Synced changes not delivered')
+            self.assertEqual(synced, [['subdevices.switch.port']], 'Wrong synced changes delivered')
+            
+            # Assert that cancelled subscriptions are not notified anymore
+            subscription.cancel()
+            delivered.clear()
+            self.assertTrue(store.setValue('subdevices.router.port', 23))
+            self.assertFalse(delivered.wait(0.1), 'Cancelled subscription notified')
+            
+            # Assert that subscribers are notified on their loop
+            async def subscriber():
+                queue = asyncio.Queue()
+                subscription = store.subscribe('subdevices.router.port', queue.put_nowait)
+                Thread(target=store.setValue, args=('subdevices.router', {'port': 24})).start()
+                return await asyncio.wait_for(queue.get(), 5), subscription
+            changes, subscription = asyncio.run(subscriber())
+            self.assertEqual(changes, ['subdevices.router'], 'Parent change not delivered on loop')
+            
+            # Assert that subscriptions of closed loops are cancelled
+            subscriptions = len(store._notifier)
+            self.assertTrue(store.setValue('subdevices.router.port', 25))
+            self.assertFalse(subscription.active, 'Subscription of closed loop not cancelled')
+            self.assertEqual(len(store._notifier), subscriptions - 1, 'Subscription of closed loop still registered')
+        finally:
+            store.unloadDomain('subdevices')
+    
+    def testBatchValues(self):
+        models.batch = {'type': 'object', 'properties': {'port': {'type': 'integer'}, 'host': {'type': 'string'}}}
+        store = data.MemoryStore(name='Batch')
+        
+        # Assert that either all or none of the values are set
+        self.assertFalse(store.setValues({'batch.port': 22, 'batch.host': 1}), 'Invalid batch values were set')
+        self.assertEqual(store.getValue('batch.port'), None, 'Value of invalid batch was set')
+        self.assertTrue(store.setValues({'batch.port': 22, 'batch.host': 'localhost'}), 'Valid batch values were not set')
+        
+        # Assert that all values are returned (also with individual alternative values)
+        self.assertEqual(store.getValues(['batch.port', 'batch.host', 'batch.user']), {'batch.port': 22, 'batch.host': 'localhost', 'batch.user': None}, 'Wrong batch values')
+        self.assertEqual(store.getValues({'batch.port': 23, 'batch.user': 'root'}), {'batch.port': 22, 'batch.user': 'root'}, 'Wrong batch values with alternatives')
+        store.unloadDomain('batch')
+    
+    def testConcurrentValues(self):
+        # A synced store recording the values written to its backend. Writing the first value sets another value meanwhile
+        class RecordingStore(data.MemoryStore):
+            def _setRaw(self, domain, token, value):
+                if value == 0:
+                    thread = Thread(target=self.setValue, args=('concurrent.items.[]', 1))
+                    thread.start()
+                    thread.join()
+                written.append((token, value))
+                return True
+        written = []
+        store = RecordingStore(name='Concurrent', persistent=True, synced=True)
+        
+        # Assert that concurrently added items are written and marked as synced under their own tokens
+        self.assertTrue(store.setValue('concurrent.items.[]', 0), 'Value not set')
+        self.assertEqual(sorted(written), [('items.0', 0), ('items.1', 1)], 'Values written under wrong tokens')
+        self.assertEqual(store.getDomain('concurrent').getTainted(), [], 'Wrong values marked as synced')
+        store.unloadDomain('concurrent')
         
 
 # Test the memory store
@@ -592,9 +905,566 @@ class IniFileStore(unittest.TestCase):
     def testSetValues(self):
         pass
     
+    def testLazyLoading(self):
+        path = os.path.join(self.testpath, 'lazy')
+        os.mkdir(path)
+        for domain in ('lazya', 'lazyb', 'lazyc'):
+            with open(os.path.join(path, '{}.lazy'.format(domain)), 'w') as f:
+                f.write('[section]\nname = {}\n'.format(domain))
+        store = data.IniFileStore(name='Lazy', filetype='.lazy', lazy=True, synced=True)
+        store.path = path
+        store.releaseHandle()
+        try:
+            # Assert that the files are indexed on startup, but only loaded on first access
+            self.assertEqual(sorted(store.getIndexedDomains()), ['lazya', 'lazyb', 'lazyc'], 'Files not indexed')
+            self.assertFalse(any(domain in store._data for domain in ('lazya', 'lazyb', 'lazyc')), 'Files loaded on startup')
+            self.assertEqual(store.getValue('lazyb.section.name'), 'lazyb', 'File not loaded on first access')
+            
+            # Assert that the warm-up loads the remaining files
+            self.assertEqual(sorted(store.warmup()), ['lazya', 'lazyc'], 'Wrong files warmed up')
+            self.assertEqual(store.getValue('lazyc.section.name'), 'lazyc', 'File not warmed up')
+        finally:
+            for domain in ('lazya', 'lazyb', 'lazyc'):
+                store.unloadDomain(domain)
+    
+    def testReloadValues(self):
+        # Use a store without file observer, so only the test reloads the domain
+        store = data.IniFileStore(name='Reload', path=self.testpath, filetype='.reload')
+        store.releaseHandle()
+        inifile = os.path.join(self.testpath, 'reload.reload')
+        with open(inifile, 'w') as f:
+            f.write('[server]\nport = 22\nhost = localhost\n\n[client]\nretries = 3\n')
+        self.assertEqual(store.loadDomain('reload')['server']['port'], 22, 'INI file not loaded')
+        
+        # Assert that unchanged files are not reloaded and that only changed values are updated
+        self.assertEqual(store.reloadDomain('reload'), [], 'Unchanged INI file reloaded')
+        client = store.getDomain('reload')['client']
+        with open(inifile, 'w') as f:
+            f.write('[server]\nport = 23\n\n[client]\nretries = 3\n')
+        self.assertEqual(sorted(store.reloadDomain('reload')), ['reload.server.host', 'reload.server.port'], 'Wrong changed values')
+        self.assertEqual(store.getDomain('reload')['server'], {'port': 23}, 'Changed values not updated')
+        self.assertIs(store.getDomain('reload')['client'], client, 'Unchanged section replaced')
+        store.unloadDomain('reload')
+
+    def testPartialValidation(self):
+        # A schema module is only applied to files defining all of its sections
+        module = types.ModuleType('partial')
+        module.server = {'type': 'object', 'properties': {'port': {'type': 'integer', 'maximum': 10000}}}
+        module.client = {'type': 'object', 'properties': {'retries': {'type': 'integer'}}}
+        models.partial = module
+        store = data.IniFileStore(name='Partial', path=self.testpath, filetype='.partial')
+        store.releaseHandle()
+        inifile = os.path.join(self.testpath, 'partial.partial')
+        with open(inifile, 'w') as f:
+            f.write('[server]\nport = 99999\n')
+        try:
+            # Assert that the sections not validated by the schema module are validated when read
+            store.loadDomain('partial')
+            self.assertEqual(store.getValue('partial.server.port'), None, 'Invalid value of loaded file not validated')
+            with open(inifile, 'w') as f:
+                f.write('[server]\nport = 99998\n')
+            store.reloadDomain('partial')
+            self.assertEqual(store.getValue('partial.server.port'), None, 'Invalid value of reloaded file not validated')
+        finally:
+            store.unloadDomain('partial')
+            del models.partial
+
+    def testWriteValues(self):
+        # Use a store without file observer, so only the test reloads the domain
+        store = data.IniFileStore(name='Write', path=self.testpath, filetype='.write')
+        store.releaseHandle()
+        inifile = os.path.join(self.testpath, 'write.write')
+        with open(inifile, 'w') as f:
+            f.write('[server]\nport = 22\n')
+        store.loadDomain('write')
+        tests = {
+                 # TOKEN, VALUE
+                 'write.server.port': 23,
+                 'write.server.offset': -5,
+                 'write.server.ratio': 0.5,
+                 'write.server.active': True,
+                 'write.server.code': '42',
+                 'write.server.format': '%d items',
+                 'write.server.motd': 'Hello\nWorld',
+                 'write.server.padded': ' x ',
+                 'write.client.nested': {'hosts': ['a', 'b']}
+                 }
+        for token, value in tests.items():
+            self.assertTrue(store.setValue(token, value), 'Value "{}" not set'.format(token))
+
+        # Assert that the file is replaced atomically and that the store does not reload its own changes
+        store.syncDomain('write')
+        self.assertEqual(store.getDomain('write').getTainted(), [], 'Changes not synced')
+        self.assertEqual([f for f in os.listdir(self.testpath) if f.startswith('.write')], [], 'Temporary file left')
+        self.assertEqual(store.reloadDomain('write'), [], 'Own changes reloaded')
+
+        # Assert that all values are read back from the written file
+        store.unloadDomain('write')
+        store.loadDomain('write')
+        for token, value in tests.items():
+            self.assertEqual(store.getValue(token), value, 'Value "{}" not written'.format(token))
+        store.unloadDomain('write')
+
+    def testWriteStrings(self):
+        # Only the snake_case type checks exist (See freedm.utils.types.TypeChecker)
+        from unittest import mock
+        from freedm.utils.types import TypeChecker
+        checker = types.SimpleNamespace(**{name: getattr(TypeChecker, name) for name in vars(TypeChecker) if name.startswith('is_')})
+        store = data.IniFileStore(name='Strings', path=self.testpath, filetype='.strings')
+        store.releaseHandle()
+        with open(os.path.join(self.testpath, 'strings.strings'), 'w') as f:
+            f.write('[server]\nhost = localhost\n')
+        with mock.patch.object(importlib.import_module('freedm.data.inifile'), 'checker', checker):
+            store.loadDomain('strings')
+            try:
+                # Assert that string values are written back and read again
+                for value in ('router', '1.5', '-2.5', 'v1.0'):
+                    self.assertTrue(store.setValue('strings.server.host', value), 'Value not set')
+                    store.syncDomain('strings')
+                    self.assertEqual(store.getDomain('strings').getTainted(), [], 'String value "{}" not written'.format(value))
+                    store.unloadDomain('strings')
+                    store.loadDomain('strings')
+                    self.assertEqual(store.getValue('strings.server.host'), value, 'String value "{}" not read back'.format(value))
+            finally:
+                store.unloadDomain('strings')
+
+    def testObservedWrites(self):
+        # A store observing its path, which reports the file events it handled
+        class ObservedStore(data.IniFileStore):
+            def reloadDomain(self, domain):
+                tokens = super().reloadDomain(domain)
+                if domain == 'observed':
+                    reloaded.append(tokens)
+                    handled.set()
+                return tokens
+        reloaded, handled = [], threading.Event()
+        path = os.path.join(self.testpath, 'observed')
+        os.mkdir(path)
+        with open(os.path.join(path, 'observed.observed'), 'w') as f:
+            f.write('[server]\nport = 22\n\n[client]\nretries = 3\n')
+        store = ObservedStore(name='Observed', filetype='.observed', synced=True)
+        store.path = path
+        try:
+            # Assert that the events of the store's own writes neither reload the file nor undo later changes
+            client = store.getDomain('observed')['client']
+            for port in range(23, 33):
+                handled.clear()
+                self.assertTrue(store.setValue('observed.server.port', port), 'Value not set')
+                self.assertTrue(handled.wait(5), 'File event not handled')
+                self.assertEqual(store.getValue('observed.server.port'), port, 'Value undone by file event')
+            self.assertEqual([tokens for tokens in reloaded if tokens], [], 'Own changes reloaded')
+            self.assertIs(store.getDomain('observed')['client'], client, 'Unchanged section replaced')
+        finally:
+            store.releaseHandle()
+            store.unloadDomain('observed')
+
+    def testSnapshotValues(self):
+        # Use a store without file observer, so only the test reloads the domain
+        store = data.IniFileStore(name='Snap', path=self.testpath, filetype='.snap', snapshot=True)
+        store.releaseHandle()
+        inifile = os.path.join(self.testpath, 'snap.snap')
+        with open(inifile, 'w') as f:
+            f.write('[server]\nport = 22\nhosts = ["a", "b"]\n')
+        try:
+            # Assert that the parsed file is kept as snapshot, which is used until the file changes
+            self.assertEqual(type(store.loadDomain('snap')), data.DataObject, 'INI file not parsed')
+            self.assertTrue(os.path.exists(os.path.join(self.testpath, '.snap.snap.snapshot')), 'No snapshot written')
+            store.unloadDomain('snap')
+            self.assertNotEqual(type(store.loadDomain('snap')), data.DataObject, 'Snapshot not loaded')
+            self.assertEqual(store.getValue('snap.server.hosts'), ['a', 'b'], 'Wrong snapshot value')
+            store.unloadDomain('snap')
+            with open(inifile, 'w') as f:
+                f.write('[server]\nport = 23\n')
+            self.assertEqual(type(store.loadDomain('snap')), data.DataObject, 'Outdated snapshot loaded')
+            self.assertEqual(store.getValue('snap.server.port'), 23, 'Changed INI file not parsed')
+        finally:
+            store.unloadDomain('snap')
+    
     def testGetValues(self):
         pass
 
+# Test the SQL store
+class SQLStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info('Starting unittest: {}'.format(cls.__name__))
+        cls.testpath = '/tmp/sql-' + getRandomString()
+        shutil.rmtree(cls.testpath, ignore_errors=True)
+        os.mkdir(cls.testpath)
+    
+    @classmethod    
+    def tearDownClass(cls):
+        logger.info('Ending unittest: {}'.format(cls.__name__))
+        shutil.rmtree(cls.testpath, ignore_errors=True)
+    
+    def testSetValues(self):
+        # A synced store writes each value immediately
+        store = data.SQLStore(name='Media', path=self.testpath, synced=True)
+        try:
+            self.assertEqual(store.database, os.path.join(self.testpath, 'media.sqlite'), 'Wrong database file')
+            self.assertTrue(store.setValue('sqlmovies.1.title', 'Alien'))
+            self.assertTrue(store.setValue('sqlmovies.2', {'title': 'Heat', 'seen': True, 'meta': {'year': 1995}}))
+            self.assertTrue(store.setValue('sqlmovies.2.meta.genre', 'Crime'))
+            self.assertFalse(store.getDomain('sqlmovies').tainted, 'Values not written')
+        finally:
+            store.unloadDomain('sqlmovies')
+            store.releaseHandle()
+        
+        # A store which is not synced reads the values through from the database
+        store = data.SQLStore(name='Reader', database=os.path.join(self.testpath, 'media.sqlite'))
+        try:
+            tests = {
+                     # TOKEN, VALUE
+                     'sqlmovies.1.title': 'Alien',
+                     'sqlmovies.2.seen': True,
+                     'sqlmovies.2.meta': {'year': 1995, 'genre': 'Crime'},
+                     'sqlmovies.2.meta.year': 1995,
+                     'sqlmovies.title': ['Alien', 'Heat'],
+                     'sqlmovies.1': {'title': 'Alien'}
+                     }
+            for token, check in tests.items():
+                self.assertEqual(store.getValue(token), check, 'Wrong value of token "{}"'.format(token))
+            self.assertEqual(store.getDomain('sqlmovies'), {}, 'Table loaded in memory')
+            with store._iohandle.connection() as connection:
+                self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal', 'No WAL journal')
+        finally:
+            store.unloadDomain('sqlmovies')
+            store.releaseHandle()
+    
+    def testAsyncValues(self):
+        # A store which is not synced and reports the threads reading from the database
+        class ReaderStore(data.SQLStore):
+            def _getRaw(self, domain, token):
+                threads.append(threading.current_thread())
+                return super()._getRaw(domain, token)
+        threads = []
+        store = data.SQLStore(name='Shows', path=self.testpath, synced=True)
+        try:
+            self.assertTrue(store.setValue('sqlshows.1', {'title': 'Lost'}))
+        finally:
+            store.unloadDomain('sqlshows')
+            store.releaseHandle()
+        store = ReaderStore(name='Viewer', database=os.path.join(self.testpath, 'shows.sqlite'), cache=True)
+        try:
+            store.loadDomain('sqlshows')
+            
+            # Assert that values read from the database are not read on the running loop, unless cached
+            async def run():
+                return [await store.aget('sqlshows.1.title') for _ in range(2)]
+            self.assertEqual(asyncio.run(run()), ['Lost', 'Lost'], 'Wrong values got asynchronously')
+            self.assertEqual(len(threads), 1, 'Cached value read from the database')
+            self.assertIsNot(threads[0], threading.main_thread(), 'Database read on the running loop')
+        finally:
+            store.unloadDomain('sqlshows')
+            store.releaseHandle()
+    
+    def testSyncValues(self):
+        store = data.SQLStore(name='Music', path=self.testpath)
+        try:
+            for index in range(1, 51):
+                self.assertTrue(store.setValue('sqlsongs.{}'.format(index), {'title': 'Song {}'.format(index), 'plays': index}))
+            self.assertTrue(store.setValue('sqlsongs.3.tags', ['rock', 'live']))
+            self.assertTrue(store.getDomain('sqlsongs').tainted, 'Values written before syncing')
+            
+            # Assert that all changes are written at once
+            store.syncDomain('sqlsongs')
+            self.assertFalse(store.getDomain('sqlsongs').tainted, 'Values not synced')
+            with store._iohandle.connection() as connection:
+                self.assertEqual(connection.execute('SELECT COUNT(*), SUM("plays") FROM "sqlsongs"').fetchone(), (50, 1275), 'Rows not synced')
+            store.unloadDomain('sqlsongs')
+            self.assertEqual(store.getValue('sqlsongs.3.tags'), ['rock', 'live'], 'JSON column not synced')
+            self.assertIsNone(store.getValue('sqlsongs.51.title'), 'Missing row found')
+        finally:
+            store.unloadDomain('sqlsongs')
+            store.releaseHandle()
+
+    def testQueryValues(self):
+        store = data.SQLStore(name='Jukebox', path=self.testpath)
+        try:
+            for index in range(1, 101):
+                self.assertTrue(store.setValue('sqlalbums.{}'.format(index), {'title': 'Album {:03d}'.format(index), 'year': 1950 + index % 40, 'tracks': [index]}))
+            store.syncDomain('sqlalbums')
+            store.unloadDomain('sqlalbums')
+            
+            # Assert that queries of whole tables are run by the database
+            query = data.Query('sqlalbums').where('year', 'in', [1960, 1961]).where('title', 'endswith', '0').orderBy('year', descending=True).orderBy('title').limit(2).select('title')
+            self.assertEqual(store.query(query), [('sqlalbums.10', {'title': 'Album 010'}), ('sqlalbums.50', {'title': 'Album 050'})], 'Wrong query results')
+            self.assertEqual(len(store.getDomain('sqlalbums')), 0, 'Rows loaded for query')
+            
+            # Assert that predicates not translatable to SQL (or all if changes are not yet synced) are checked on the streamed rows
+            self.assertTrue(store.setValue('sqlalbums.3.year', 2000))
+            self.assertEqual(store.query(data.Query('sqlalbums').where('year', '==', 2000).select('title', 'year')), [('sqlalbums.3', {'title': 'Album 003', 'year': 2000})], 'Unsynced changes not queried')
+            store.syncDomain('sqlalbums')
+            self.assertEqual([result.token for result in store.query(data.Query('sqlalbums').where('tracks', 'contains', 7))], ['sqlalbums.7'], 'Wrong JSON query results')
+            self.assertEqual(store.query(data.Query('sqlalbums').where('year', '>=', 2000).select('title')), [('sqlalbums.3', {'title': 'Album 003'})], 'Synced changes not queried')
+        finally:
+            store.unloadDomain('sqlalbums')
+            store.releaseHandle()
+
+# Test the log store
+class LogStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info('Starting unittest: {}'.format(cls.__name__))
+        cls.testpath = '/tmp/log-' + getRandomString()
+        shutil.rmtree(cls.testpath, ignore_errors=True)
+        os.mkdir(cls.testpath)
+    
+    @classmethod    
+    def tearDownClass(cls):
+        logger.info('Ending unittest: {}'.format(cls.__name__))
+        shutil.rmtree(cls.testpath, ignore_errors=True)
+    
+    def testReplayValues(self):
+        store = data.LogStore(name='State', path=self.testpath, synced=True, fsync=False)
+        logfile = os.path.join(self.testpath, 'logstate.log')
+        try:
+            # Assert that each value is appended to the log
+            self.assertTrue(store.setValue('logstate.sessions.abc', {'user': 'A'}))
+            for count in range(1, 4):
+                self.assertTrue(store.setValue('logstate.counter', count))
+                size = os.path.getsize(logfile)
+            self.assertTrue(store.setValue('logstate.sessions.abc.user', 'B'))
+            self.assertGreater(os.path.getsize(logfile), size, 'Value not appended')
+            self.assertFalse(store.getDomain('logstate').tainted, 'Values not written')
+            
+            # Assert that the values are replayed and that a torn record gets cut off
+            store.unloadDomain('logstate')
+            size = os.path.getsize(logfile)
+            with open(logfile, 'ab') as f:
+                f.write(b'\x20\x00\x00\x00\x00')
+            self.assertEqual(store.getValue('logstate.counter'), 3, 'Value not replayed')
+            self.assertEqual(store.getValue('logstate.sessions.abc'), {'user': 'B'}, 'Value not replayed')
+            self.assertEqual(os.path.getsize(logfile), size, 'Torn record not cut off')
+        finally:
+            store.unloadDomain('logstate')
+            store.releaseHandle()
+    
+    def testCompactValues(self):
+        store = data.LogStore(name='Counter', path=self.testpath, synced=True, compact=5)
+        logfile = os.path.join(self.testpath, 'logcounter.log')
+        try:
+            for count in range(1, 8):
+                self.assertTrue(store.setValue('logcounter.total', count))
+            
+            # Assert that the log got compacted into a snapshot after 5 records
+            self.assertTrue(os.path.exists(logfile + '.snapshot'), 'No snapshot written')
+            self.assertLess(os.path.getsize(logfile), os.path.getsize(logfile + '.snapshot') * 3, 'Log not compacted')
+            store.unloadDomain('logcounter')
+            self.assertEqual(store.getValue('logcounter.total'), 7, 'Compacted value not replayed')
+        finally:
+            store.unloadDomain('logcounter')
+            store.releaseHandle()
+
+# Test the data object
+class DataObject(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info('Starting unittest: {}'.format(cls.__name__))
+    
+    @classmethod   
+    def tearDownClass(cls):
+        logger.info('Ending unittest: {}'.format(cls.__name__))
+    
+    def testCompiledTokens(self):
+        from freedm.data.token import compileToken, splitToken, KEY, INDEX, COLLECTION, WILDCARD
+        tests = {
+                 # TOKEN, STEP KINDS
+                 '': (),
+                 'name': (KEY,),
+                 'active.0.name': (KEY, INDEX, KEY),
+                 'active.[].name': (KEY, COLLECTION, KEY),
+                 'settings.+.port': (KEY, WILDCARD, KEY)
+                 }
+        for token, check in tests.items():
+            self.assertEqual(tuple(step.kind for step in compileToken(token)), check, 'Token "{}" compiled to wrong steps'.format(token))
+        self.assertIs(compileToken('active.0.name'), compileToken('active.0.name'), 'Compiled token is not cached')
+        self.assertEqual(compileToken('active.12')[1].index, 12, 'Index step has no integer index')
+        self.assertEqual(splitToken('user.active.0'), ('user', 'active.0'), 'Token not split into domain and key')
+        self.assertEqual(splitToken('user'), ('user', ''), 'Token without key not split into domain and empty key')
+    
+    def testGetSetValues(self):
+        dataobject = data.DataObject()
+        self.assertEqual(dataobject.setValue('active.[].name', 'A'), 'active.0.name', 'Collection key not resolved')
+        self.assertEqual(dataobject.setValue('active.[].name', 'B'), 'active.1.name', 'Collection key not resolved')
+        self.assertTrue(dataobject.setValue('settings.samba.port', 1))
+        self.assertTrue(dataobject.setValue('settings.ssh.port', 22))
+        tests = {
+                 # TOKEN, VALUE
+                 'active.1.name': 'B',
+                 'active.[].name': ['A', 'B'],
+                 'settings.ssh': {'port': 22},
+                 '': dataobject
+                 }
+        for token, check in tests.items():
+            self.assertEqual(dataobject.getValue(token), check, 'Value of token "{}" is wrong'.format(token))
+        self.assertRaises(LookupError, dataobject.getValue, 'active.5.name')
+        self.assertRaises(LookupError, dataobject.getValue, 'settings.postfix')
+    
+    def testValidationTracking(self):
+        dataobject = data.DataObject()
+        dataobject.setValue('settings.ssh.port', 22)
+        dataobject.setValue('active.[].name', 'A')
+        self.assertFalse(dataobject.isValidated('settings.ssh.port'), 'Token validated without validation')
+        
+        # Validating a token also validates its sub tokens, but not its parents
+        dataobject.markValidated('settings')
+        self.assertTrue(dataobject.isValidated('settings.ssh.port'), 'Sub token of validated token not validated')
+        self.assertFalse(dataobject.isValidated(''), 'Parent of validated token validated')
+        
+        # A change voids the validations of its section only
+        dataobject.markValidated('active')
+        dataobject.setValue('settings.ssh.port', 23)
+        self.assertFalse(dataobject.isValidated('settings.ssh'), 'Token validated after change')
+        self.assertTrue(dataobject.isValidated('active.0.name'), 'Token of unchanged section not validated')
+        
+        # Replacing the data voids all validations
+        dataobject.markValidated('')
+        self.assertTrue(dataobject.isValidated('settings.ssh'), 'Token not validated by validated root')
+        dataobject.updateData(data.DataObject())
+        self.assertFalse(dataobject.isValidated('active'), 'Token validated after data replacement')
+    
+    def testSnapshots(self):
+        dataobject = data.DataObject()
+        dataobject.setValue('settings.port', 22)
+        dataobject.setValue('user', 'root')
+        snapshot = dataobject.getSnapshot(['settings.host', 'group'])
+        dataobject.setValue('settings.host', 'localhost')
+        dataobject.setValue('group', 'wheel')
+        dataobject.restoreSnapshot(snapshot)
+        self.assertEqual(dict(dataobject), {'settings': {'port': 22}, 'user': 'root'}, 'Snapshot not restored')
+        self.assertEqual(dataobject.getTainted(), ['settings.port', 'user'], 'Change log not restored')
+        
+        # Assert that only the changed values are restored
+        dataobject.setValue('settings.hosts', ['a'])
+        snapshot = dataobject.getSnapshot(['settings.port', 'settings.hosts.[]', 'group.name'])
+        self.assertEqual([entry[1:] for entry in snapshot[1]], [('port', 22), ('hosts', ['a']), ('group', data.object.MISSING)], 'Wrong values copied')
+        dataobject.setValue('settings.port', 23)
+        dataobject.setValue('settings.hosts.[]', 'b')
+        dataobject.setValue('group.name', 'wheel')
+        dataobject.setValue('settings.user', 'root')
+        dataobject.restoreSnapshot(snapshot)
+        self.assertEqual(dataobject['settings'], {'port': 22, 'hosts': ['a'], 'user': 'root'}, 'Unchanged value restored')
+        self.assertNotIn('group', dataobject, 'Added value not removed')
+    
+    def testChangeLog(self):
+        dataobject = data.DataObject()
+        for token in ('user.1', 'user.10.name', 'user.10', 'user.1.name', 'user.1', 'group.[].name', 'settings.+.port', 'settings.ssh.port'):
+            dataobject.setTainted(token)
+        
+        # Assert that tokens are recorded once and reduced to the minimal covering tokens
+        self.assertEqual(len(dataobject._changed), 7, 'Change log recorded duplicate tokens')
+        self.assertEqual(dataobject.getTainted(), ['group', 'settings', 'user.1', 'user.10'], 'Change log not properly reduced')
+        
+        # Assert that removed tokens uncover their sub tokens and that the log can be reset
+        dataobject._changed.discard('user.10')
+        self.assertEqual(dataobject.getTainted(reset=True), ['group', 'settings', 'user.1', 'user.10.name'], 'Change log not properly reduced after removal')
+        self.assertFalse(dataobject.tainted, 'Change log not reset')
+        dataobject.setTainted('')
+        self.assertEqual(dataobject.getTainted(), ['*'], 'Change of whole data not reduced')
+    
+    def testLazySnapshots(self):
+        from freedm.data.snapshot import writeSnapshot, readSnapshot
+        path = '/tmp/snapshot-' + getRandomString()
+        dataobject = data.DataObject(movies={'1': {'title': 'Alien', 'tags': ['scifi']}, '2': {'title': 'Heat'}}, count=2)
+        writeSnapshot(path, dataobject, 'source')
+        try:
+            self.assertIsNone(readSnapshot(path, source='other'), 'Snapshot of other source read')
+            lazy = readSnapshot(path, source='source')
+            
+            # Assert that only the accessed subtrees are deserialized
+            self.assertEqual(lazy.pending, 2, 'Values deserialized before access')
+            self.assertEqual(lazy.getValue('movies.1.tags'), ['scifi'], 'Wrong value')
+            self.assertEqual((lazy.pending, dict.get(lazy, 'movies').pending), (1, 1), 'Values deserialized without access')
+            
+            # Assert that the lazy data object behaves like the original one
+            self.assertEqual(json.dumps(lazy, sort_keys=True), json.dumps(dataobject, sort_keys=True), 'Data not serialized')
+            self.assertEqual(lazy, dataobject, 'Data not equal')
+            self.assertTrue(lazy.setValue('movies.2.year', 1995))
+            self.assertEqual(lazy.getValue('movies.2'), {'title': 'Heat', 'year': 1995}, 'Value not set')
+        finally:
+            os.remove(path)
+    
+    def testStrictValidation(self):
+        models.strict = {'type': 'object', 'properties': {'port': {'type': 'integer'}}}
+        for strict in (False, True):
+            store = data.MemoryStore(name='Strict', strict=strict)
+            self.assertTrue(store.setValue('strict.port', 22))
+            # Bypass the store to corrupt the stored value
+            store.getDomain('strict')['port'] = 'invalid'
+            self.assertEqual(store.getValue('strict.port'), None if strict else 'invalid', 'Strict mode {} not respected'.format(strict))
+            store.unloadDomain('strict')
+
+# Test the model schemas
+class Models(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info('Starting unittest: {}'.format(cls.__name__))
+    
+    @classmethod   
+    def tearDownClass(cls):
+        logger.info('Ending unittest: {}'.format(cls.__name__))
+        models.unregisterModel('registered')
+    
+    def testDefaultValues(self):
+        # Default values are returned as copies
+        default = models.getDefaultValue('person')
+        self.assertEqual(default, {'maidenname': 'Mädchenname', 'gender': 'female'}, 'Wrong default value for "person"')
+        default['gender'] = 'male'
+        self.assertEqual(models.getDefaultValue('person.gender'), 'female', 'Default value changed by caller')
+        self.assertEqual(models.getDefaultValue('person')['gender'], 'female', 'Cached default value changed by caller')
+        
+        # Registering a model replaces the cached default values
+        self.assertEqual(models.getDefaultValue('registered.port'), None, 'Default value for unregistered model')
+        models.registerModel('registered', {'type': 'object', 'properties': {'port': {'type': 'integer', 'default': 22}}})
+        self.assertEqual(models.getDefaultValue('registered.port'), 22, 'No default value for registered model')
+        models.registerModel('registered', {'type': 'object', 'properties': {'port': {'type': 'integer', 'default': 23}}})
+        self.assertEqual(models.getDefaultValue('registered.port'), 23, 'Default value of replaced model')
+        self.assertEqual(models.getValidatedValue('registered.port', 'invalid'), None, 'Invalid value validated by registered model')
+        
+        # The default values of the least recently used tokens are evicted
+        defaults = getattr(models, '__defaults')
+        for index in range(2 * getattr(models, '__maxDefaults')):
+            models.getDefaultValue('user.active.{}.name'.format(index))
+        self.assertLessEqual(len(defaults), getattr(models, '__maxDefaults'), 'Default value cache not bounded')
+        self.assertIn('user.active.{}.name'.format(index), defaults, 'Default value not cached')
+    
+    def testCachedSchemas(self):
+        validators = getattr(models, '__validators')
+        
+        # Validating a schema module repeatedly reuses its root schema and validator
+        models.getValidatedValue('daemon', {'rpc': {'port': 5000, 'address': 'localhost'}})
+        cached = len(validators)
+        for _ in range(10):
+            models.getValidatedValue('daemon', {'rpc': {'port': 5000, 'address': 'localhost'}})
+        self.assertEqual(len(validators), cached, 'Root schema validators not reused')
+        
+        # The validators of replaced schemas are evicted
+        for port in range(2 * getattr(models, '__maxValidators')):
+            models.evicted = {'type': 'object', 'properties': {'port': {'type': 'integer', 'maximum': port}}}
+            models.getValidatedValue('evicted', {'port': 0})
+        self.assertLessEqual(len(validators), getattr(models, '__maxValidators'), 'Validator cache not bounded')
+        
+        # The sub-schemas of the least recently used tokens are evicted
+        schemas = getattr(models, '__schemas')
+        for index in range(2 * getattr(models, '__maxSchemas')):
+            models.getValidatedValue('user.active.{}.name'.format(index), 'name')
+        self.assertLessEqual(len(schemas), getattr(models, '__maxSchemas'), 'Sub-schema cache not bounded')
+        self.assertIn(('user', 'active.{}.name'.format(index)), schemas, 'Sub-schema not cached')
+        
+        # Reloading a schema module replaces its cached sub-schemas and default values
+        module = types.ModuleType('reloaded')
+        module.__spec__ = importlib.machinery.ModuleSpec('reloaded', None)
+        module.rpc = {'type': 'object', 'properties': {'port': {'type': 'integer', 'maximum': 10, 'default': 1}}}
+        models.reloaded = module
+        self.assertEqual(models.getValidatedValue('reloaded.rpc.port', 20), None, 'Invalid value validated by module')
+        self.assertEqual(models.getDefaultValue('reloaded.rpc.port'), 1, 'No default value of module')
+        module.__spec__ = importlib.machinery.ModuleSpec('reloaded', None)
+        module.rpc = {'type': 'object', 'properties': {'port': {'type': 'integer', 'maximum': 100, 'default': 2}}}
+        self.assertEqual(models.getValidatedValue('reloaded.rpc.port', 20), 20, 'Sub-schema of reloaded module not used')
+        self.assertEqual(models.getDefaultValue('reloaded.rpc.port'), 2, 'Default value of reloaded module not used')
+        del models.reloaded, models.evicted
+
 # Test the data manager
 class DataManager(unittest.TestCase):
     @classmethod
@@ -647,6 +1517,66 @@ class DataManager(unittest.TestCase):
         # Assert that the unregistration does not work twice
         self.assertFalse(self.manager.unregisterStore(memorystore), 'Could unregister store "{}" twice'.format(memorystore))
         
+    def testBatchUpdate(self):
+        models.update = {'type': 'object', 'properties': {'port': {'type': 'integer'}, 'host': {'type': 'string'}}}
+        store = data.MemoryStore(name='Update', alias='update')
+        self.assertTrue(self.manager.registerStore(store), 'Store "{}" could not be registered'.format(store))
+        try:
+            # Assert that the updates are set at once when leaving the context
+            with self.manager.update('update') as values:
+                values['update.port'] = 22
+                values['update.host'] = 'localhost'
+                self.assertEqual(self.manager.getUpdate('update.port'), None, 'Value updated before leaving the context')
+            self.assertEqual(self.manager.getMany('update', ['update.port', 'update.host']), {'update.port': 22, 'update.host': 'localhost'}, 'Values not updated')
+            
+            # Assert that the updates are discarded on errors
+            with self.assertRaises(RuntimeError):
+                with self.manager.update('update') as values:
+                    values['update.port'] = 23
+                    raise RuntimeError('Discard')
+            self.assertEqual(self.manager.getUpdate('update.port'), 22, 'Value updated despite error')
+            self.assertTrue(self.manager.setMany('update', {'update.port': 24}), 'Values not set')
+            self.assertEqual(self.manager.getUpdate('update.port'), 24, 'Value not set')
+        finally:
+            store.unloadDomain('update')
+            self.manager.unregisterStore('update')
+        
+    def testExecutor(self):
+        store = data.MemoryStore(name='Executor', alias='executor')
+        self.assertTrue(self.manager.registerStore(store), 'Store "{}" could not be registered'.format(store))
+        try:
+            # Assert that the store uses the manager's executor capped by its sync threads
+            self.assertIs(store.executor.executor, self.manager.executor, 'Store does not use the executor of the manager')
+            futures = [store.executor.submit(time.sleep, 0.05) for _ in range(store._sync_max_threads * 2)]
+            stats = self.manager.executor.get_stats()['groups'][store.alias]
+            self.assertLessEqual(stats['running'], store._sync_max_threads, 'Store exceeds its concurrency cap')
+            self.assertEqual(stats['running'] + stats['pending'], len(futures) - stats['completed'], 'Wrong executor statistics')
+            for future in futures:
+                future.result()
+            self.assertEqual(self.manager.executor.get_stats()['groups'][store.alias]['completed'], len(futures), 'Not all calls completed')
+        finally:
+            self.manager.unregisterStore('executor')
+        
+    def testNestedExecutorCalls(self):
+        # A store whose executor group has room for one call only
+        store = data.MemoryStore(name='Nested', persistent=True)
+        store.executor = data.manager.IOExecutor(max_workers=1, name='nested')
+        store._sync_max_threads = 1
+        try:
+            # Assert that calls waiting for further calls of their group run inline instead of deadlocking
+            def nested():
+                results = []
+                run_concurrently(results.append, ['a', 'b'], executor=store.executor)
+                store.setValue('nested.port', 22)
+                store.sync()
+                return results, store.getDomain('nested').tainted
+            results, tainted = store.executor.submit(nested).result(timeout=5)
+            self.assertEqual(results, ['a', 'b'], 'Nested calls not run')
+            self.assertFalse(tainted, 'Domain not synced by nested call')
+        finally:
+            store.unloadDomain('nested')
+            store.executor.executor.shutdown()
+        
     def testStoreLookup(self):
         pass
     
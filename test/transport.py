@@ -0,0 +1,269 @@
+'''
+This test checks the functionality of the free.dm transport module
+@author: Thomas Wanderer
+'''
+
+# Imports
+import unittest
+import logging
+import asyncio
+import socket
+import time
+import os
+import sys
+
+# Test imports
+import __init__
+
+# free.dm Imports
+from freedm.transport.base import Transport
+from freedm.transport.message import Message
+from freedm.transport.heartbeat import Heartbeat
+from freedm.transport.shm import SharedMemoryChannel
+from freedm.transport.control import encodeFrame
+from freedm.transport.connection import Connection, ConnectionType
+
+
+# Setup logger
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+if not logger.hasHandlers():
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+
+
+# A transport endpoint of a socket pair
+class Endpoint(Transport):
+    mode = ConnectionType.PERSISTENT
+    limit = 65536
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = []
+        self.failed = asyncio.Event()
+
+    async def handleMessage(self, message: Message) -> None:
+        self.messages.append(message.data)
+
+    async def handleConnectionFailure(self, connection: Connection) -> None:
+        self.failed.set()
+
+    def close(self) -> None:
+        pass
+
+
+async def connect(host: Transport, peer: Transport):
+    '''
+    Connects two transports by a socket pair and returns their connections and reader tasks
+    '''
+    connections = []
+    for transport, sock in zip((host, peer), socket.socketpair()):
+        transport.loop = asyncio.get_running_loop()
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+        connection = Connection(
+            socket=sock, sslctx=None, sslobj=None, pid=None, uid=None, gid=None, peer_cert=None, peer_address=None, host_address=None,
+            reader=reader, writer=writer, read_handlers=set(), write_handlers=set(),
+            state={'mode': ConnectionType.PERSISTENT, 'created': time.time(), 'updated': time.time(), 'closed': None}
+            )
+        connections.append((connection, asyncio.ensure_future(transport._handleConnection(connection))))
+    return connections
+
+
+# Test the heartbeat
+class Heartbeats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info(f'Starting unittest: {cls.__name__}')
+
+    @classmethod
+    def tearDownClass(cls):
+        logger.info(f'Ending unittest: {cls.__name__}')
+
+    def testRoundTrips(self):
+        async def run():
+            host, peer = Endpoint(heartbeat=Heartbeat(interval=0.05)), Endpoint(heartbeat=Heartbeat(interval=0.05))
+            (connection, reader), (peer_connection, peer_reader) = await connect(host, peer)
+            try:
+                host._startHeartbeat(connection)
+                peer_connection.writer.write(b'hello')
+                await asyncio.sleep(0.3)
+                return Heartbeat.getStats(connection), host.messages, host.failed.is_set()
+            finally:
+                for task in (reader, peer_reader):
+                    task.cancel()
+                await host.closeConnection(connection)
+        stats, messages, failed = asyncio.run(run())
+
+        # Assert that pings are answered and filtered from the messages
+        self.assertGreater(stats['received'], 0, 'No pong received')
+        self.assertEqual(stats['missed'], 0, 'Pongs missed')
+        self.assertIsNotNone(stats['srtt'], 'No RTT measured')
+        self.assertEqual(b''.join(messages), b'hello', 'Control frames not filtered from messages')
+        self.assertFalse(failed, 'Alive peer considered dead')
+
+    def testDeadPeer(self):
+        async def run():
+            # The peer does not answer any ping
+            host, peer = Endpoint(heartbeat=Heartbeat(interval=0.05, misses=2)), Endpoint()
+            (connection, reader), (_peer_connection, peer_reader) = await connect(host, peer)
+            try:
+                host._startHeartbeat(connection)
+                await asyncio.wait_for(host.failed.wait(), 5)
+                # Wait for the connection to be closed by the heartbeat
+                await asyncio.wait_for(reader, 5)
+                return connection.state['closed'], connection.writer.transport.is_closing(), connection.state['heartbeat']['_task']
+            finally:
+                peer_reader.cancel()
+        closed, closing, heartbeat = asyncio.run(run())
+
+        # Assert that the connection of a dead peer gets closed
+        self.assertIsNotNone(closed, 'Connection of dead peer not closed')
+        self.assertTrue(closing, 'Writer of dead peer not closed')
+        self.assertTrue(heartbeat.done() and not heartbeat.cancelled(), 'Heartbeat cancelled while closing the connection')
+
+    def testControlFrames(self):
+        async def run(control, data):
+            host, peer = Endpoint(), Endpoint()
+            host.control_frames = control
+            (connection, reader), (peer_connection, peer_reader) = await connect(host, peer)
+            try:
+                peer_connection.writer.write(data)
+                await asyncio.sleep(0.1)
+                return b''.join(host.messages)
+            finally:
+                for task in (reader, peer_reader):
+                    task.cancel()
+
+        # Assert that control frames are only parsed if enabled
+        data = encodeFrame('PING', '1') + b'binary\x00'
+        self.assertEqual(asyncio.run(run(False, data)), data, 'Binary data altered without control frames')
+        self.assertEqual(asyncio.run(run(True, encodeFrame('PING', '1') + b'binary')), b'binary', 'Control frame not filtered')
+
+
+# Test passing file descriptors
+class FileDescriptors(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info(f'Starting unittest: {cls.__name__}')
+
+    @classmethod
+    def tearDownClass(cls):
+        logger.info(f'Ending unittest: {cls.__name__}')
+
+    def testConcurrentSends(self):
+        async def run():
+            host, peer = Endpoint(), Endpoint()
+            host.control_frames = peer.control_frames = True
+            (connection, reader), (peer_connection, peer_reader) = await connect(host, peer)
+            r, w = os.pipe()
+            try:
+                os.write(w, b'pipe')
+                # Both peers pass file descriptors at the same time
+                start = time.monotonic()
+                sent = await asyncio.gather(host.send_fds([r], connection), peer.send_fds([r], peer_connection), host.send_fds([r], connection))
+                duration = time.monotonic() - start
+                received = [await peer.receive_fds(peer_connection, timeout=2) for _ in range(2)] + [await host.receive_fds(connection, timeout=2)]
+                data = os.read(received[0][0], 100)
+                for fds in received:
+                    for fd in fds:
+                        os.close(fd)
+                return sent, duration, [len(fds) for fds in received], data
+            finally:
+                os.close(r)
+                os.close(w)
+                for task in (reader, peer_reader):
+                    task.cancel()
+        sent, duration, received, data = asyncio.run(run())
+
+        # Assert that no transfer waits for the peer's timeout
+        self.assertEqual(sent, [True, True, True], 'File descriptors not sent')
+        self.assertLess(duration, Endpoint.fd_timeout, 'Concurrent transfers stalled')
+        self.assertEqual(received, [1, 1, 1], 'File descriptors not received')
+        self.assertEqual(data, b'pipe', 'Wrong file descriptor received')
+
+
+async def waitFor(condition, timeout: float=5) -> bool:
+    '''
+    Waits until a condition is met
+    '''
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+# Test passing large messages via shared memory
+class SharedMemory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.info(f'Starting unittest: {cls.__name__}')
+
+    @classmethod
+    def tearDownClass(cls):
+        logger.info(f'Ending unittest: {cls.__name__}')
+
+    def testLargeMessages(self):
+        async def run():
+            host, peer = Endpoint(), Endpoint()
+            host.shm, peer.shm = SharedMemoryChannel(size=1024 * 1024, threshold=1024), SharedMemoryChannel()
+            (connection, reader), (peer_connection, peer_reader) = await connect(host, peer)
+            try:
+                # The first large message offers the ring and is sent via the socket
+                first, second = b'a' * 200000, b'b' * 200000
+                await host._dispatchMessage(first, connection)
+                ready = await waitFor(lambda: connection.state['shm']['ready'])
+                await waitFor(lambda: len(b''.join(peer.messages)) == len(first))
+                # Further large messages are passed via the ring and received at once
+                await host._dispatchMessage(second, connection)
+                await waitFor(lambda: second in peer.messages)
+                await waitFor(lambda: not connection.state['shm']['ring'].regions)
+                return ready, peer.messages, len(connection.state['shm']['ring'].regions)
+            finally:
+                for task in (reader, peer_reader):
+                    task.cancel()
+                await host.closeConnection(connection)
+                await peer.closeConnection(peer_connection)
+        ready, messages, regions = asyncio.run(run())
+
+        # Assert that the message over the threshold is passed via the ring and released by the peer
+        self.assertTrue(ready, 'Shared memory ring not accepted by peer')
+        self.assertEqual(b''.join(messages), b'a' * 200000 + b'b' * 200000, 'Messages not received')
+        self.assertIn(b'b' * 200000, messages, 'Message not passed via shared memory')
+        self.assertEqual(regions, 0, 'Ring region not released')
+
+    def testMalformedRegions(self):
+        async def run():
+            host, peer = Endpoint(), Endpoint()
+            host.shm, peer.shm = SharedMemoryChannel(size=4096, threshold=1024), SharedMemoryChannel()
+            (connection, reader), (peer_connection, peer_reader) = await connect(host, peer)
+            try:
+                await host._dispatchMessage(b'a' * 2048, connection)
+                await waitFor(lambda: connection.state['shm']['ready'])
+                await waitFor(lambda: len(b''.join(peer.messages)) == 2048)
+                peer.messages.clear()
+                # Regions outside of the ring or malformed regions are rejected
+                ring = connection.state['shm']['ring']
+                ring.allocate(1024)
+                for payload in (f'{ring.segment.size}:1', '0:0', '0', 'x:1', '-1:1'):
+                    await host._sendControlFrame(connection, 'SHMDATA', payload)
+                    await peer._sendControlFrame(peer_connection, 'SHMFREE', payload)
+                await peer._sendControlFrame(peer_connection, 'SHMFREE', f'0:{ring.size + 1}')
+                await asyncio.sleep(0.1)
+                return peer.messages, list(ring.regions), not (reader.done() or peer_reader.done())
+            finally:
+                for task in (reader, peer_reader):
+                    task.cancel()
+                await host.closeConnection(connection)
+                await peer.closeConnection(peer_connection)
+        messages, regions, running = asyncio.run(run())
+
+        # Assert that no data is read from malformed regions and that the connection survives them
+        self.assertEqual(messages, [], 'Data of malformed region received')
+        self.assertEqual(regions, [(0, 1024)], 'Region released by malformed frame')
+        self.assertTrue(running, 'Connection closed by malformed frames')
+
+    def testThreshold(self):
+        # Assert that control frames cannot exceed the threshold (They would be passed via shared memory again)
+        self.assertRaises(ValueError, SharedMemoryChannel, threshold=SharedMemoryChannel.max_frame_size)
+        self.assertEqual(SharedMemoryChannel(threshold=SharedMemoryChannel.max_frame_size + 1).threshold, SharedMemoryChannel.max_frame_size + 1)